@@ -0,0 +1,172 @@
+"""Drive the API with concurrent clients and record latency and throughput per scenario.
+
+Scenarios: ``auth`` (password login), ``dashboard`` (/api/dashboard/stats),
+``study-materials`` (first page of /api/study-materials), ``chat`` (/api/chat
+without a topic, so every request is answered by the model) and ``chat-resources``
+(/api/chat with a seeded topic, answered from its study materials without
+inference). Seed the database first with ``benchmarks.seed``.
+
+Without ``--base-url`` the app is imported and served in-process through httpx's
+ASGI transport, so no server or network sits in the measurement; ``--stub-model``
+then swaps GPT-2 for the stub backend to measure everything except inference.
+Results are written as JSON; pass a previous file as ``--baseline`` to print the
+change per scenario.
+
+Usage (from the backend directory):
+    MONGODB_DATABASE=rubberducker_bench python -m benchmarks.bench_api --stub-model \
+        --requests 2000 --concurrency 50 --output results.json
+    python -m benchmarks.bench_api --base-url http://127.0.0.1:8000 --baseline results.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import time
+from datetime import datetime
+
+import httpx
+
+from benchmarks.load_test import percentile
+from benchmarks.seed import SEED_EMAIL, TOPICS, WORDS
+
+
+SCENARIOS = ["auth", "dashboard", "study-materials", "chat", "chat-resources"]
+# Words that would make /api/chat treat the message as code and answer with code feedback
+CHAT_WORDS = [word for word in WORDS if word not in ("class", "import")]
+
+
+async def drive(name: str, send, requests: int, concurrency: int) -> dict:
+    """Run ``send(i)`` ``requests`` times with ``concurrency`` in flight."""
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies, statuses = [], {}
+
+    async def one(i: int):
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                code = str((await send(i)).status_code)
+            except httpx.HTTPError as e:
+                code = type(e).__name__
+            latencies.append(time.perf_counter() - started)
+            statuses[code] = statuses.get(code, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    elapsed = time.perf_counter() - started
+    return {
+        "scenario": name,
+        "requests": requests,
+        "concurrency": concurrency,
+        "statuses": statuses,
+        "failures": sum(count for code, count in statuses.items() if not code.startswith("2")),
+        "throughput_rps": round(requests / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+    }
+
+
+async def log_in(client: httpx.AsyncClient, users: int, password: str) -> list:
+    tokens = []
+    for i in range(users):
+        response = await client.post("/api/auth/login", json={"email": SEED_EMAIL.format(i), "password": password})
+        response.raise_for_status()
+        tokens.append(response.json()["token"])
+    return tokens
+
+
+async def run_scenarios(client: httpx.AsyncClient, args) -> list:
+    tokens = await log_in(client, args.users, args.password)
+    rng = random.Random(0)
+
+    def auth_headers(i: int) -> dict:
+        return {"Authorization": f"Bearer {tokens[i % len(tokens)]}"}
+
+    senders = {
+        "auth": lambda i: client.post(
+            "/api/auth/login", json={"email": SEED_EMAIL.format(i % args.users), "password": args.password}
+        ),
+        "dashboard": lambda i: client.get("/api/dashboard/stats", headers=auth_headers(i)),
+        "study-materials": lambda i: client.get("/api/study-materials", params={"limit": 20}, headers=auth_headers(i)),
+        "chat": lambda i: client.post(
+            "/api/chat", json={"message": " ".join(rng.choices(CHAT_WORDS, k=8))}, headers=auth_headers(i)
+        ),
+        "chat-resources": lambda i: client.post(
+            "/api/chat",
+            json={"message": " ".join(rng.choices(CHAT_WORDS, k=8)), "topic": rng.choice(TOPICS)},
+            headers=auth_headers(i),
+        ),
+    }
+    results = []
+    for name in args.scenarios:
+        result = await drive(name, senders[name], args.requests, args.concurrency)
+        print(json.dumps(result))
+        results.append(result)
+    return results
+
+
+async def run_in_process(args) -> list:
+    if args.stub_model:
+        os.environ["INFERENCE_BACKEND"] = "stub"
+    # Imported here so the environment above is seen by the app's configuration
+    import main
+
+    async with main.app.router.lifespan_context(main.app):
+        while not main.inference_pool.ready and not main.inference_pool.load_error:
+            await asyncio.sleep(0.1)
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=120) as client:
+            return await run_scenarios(client, args)
+
+
+async def run_remote(args) -> list:
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=120) as client:
+        return await run_scenarios(client, args)
+
+
+def compare(results: list, baseline_path: str):
+    with open(baseline_path) as f:
+        baseline = {result["scenario"]: result for result in json.load(f)["results"]}
+    for result in results:
+        before = baseline.get(result["scenario"])
+        if before is None:
+            continue
+        changes = ", ".join(
+            f"{field} {before[field]} -> {result[field]} ({(result[field] - before[field]) / (before[field] or 1):+.1%})"
+            for field in ("p50_ms", "p99_ms", "throughput_rps")
+        )
+        print(f"{result['scenario']}: {changes}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", help="benchmark a running server instead of the in-process app")
+    parser.add_argument("--stub-model", action="store_true", help="in-process only: replace the model with a stub")
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--requests", type=int, default=1000, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--users", type=int, default=100, help="seeded users to log in as")
+    parser.add_argument("--password", default="benchmark-password")
+    parser.add_argument("--output", default="bench_api_results.json")
+    parser.add_argument("--baseline", help="previous --output file to compare against")
+    args = parser.parse_args()
+
+    results = asyncio.run(run_remote(args) if args.base_url else run_in_process(args))
+    report = {
+        "timestamp": datetime.utcnow().isoformat(),
+        "target": args.base_url or "in-process",
+        "stub_model": args.stub_model and not args.base_url,
+        "python": platform.python_version(),
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"results written to {args.output}")
+    if args.baseline:
+        compare(results, args.baseline)
+
+
+if __name__ == "__main__":
+    main()
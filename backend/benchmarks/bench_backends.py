@@ -0,0 +1,117 @@
+"""Compare the inference backends on throughput, memory and output parity.
+
+Each backend is measured in its own subprocess so RSS figures are not polluted by
+the others. Parity is reported against the eager backend: the share of prompts whose
+greedy continuation is identical, and the mean share of matching leading tokens.
+tests/test_inference_backends.py asserts parity on a tiny model; this reports it
+for the real one.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_backends --backends eager int8 compile
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+
+PROMPTS = [
+    "User: What is a Python list comprehension?\nAI:",
+    "User: How do I reverse a string in JavaScript?\nAI:",
+    "User: Explain recursion with an example.\nAI:",
+    "User: What is the difference between a tuple and a list?\nAI:",
+    "Analyze this code and provide detailed feedback:\ndef add(a, b):\n    return a + b\n",
+]
+
+
+def rss_bytes() -> int:
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def measure(backend_name: str, model_name: str, max_length: int, rounds: int) -> dict:
+    from inference_backend import create_backend
+
+    rss_before = rss_bytes()
+    started = time.perf_counter()
+    backend = create_backend(backend_name, model_name, timeout=600)
+    load_seconds = time.perf_counter() - started
+
+    # One warm-up round so torch.compile is not billed for compilation
+    backend.generate_batch(PROMPTS, max_length, None)
+
+    generated_tokens = 0
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for prompt in PROMPTS:
+            output = backend.generate_batch([prompt], max_length, None)[0]
+            generated_tokens += len(backend.tokenizer(output)["input_ids"]) - len(backend.tokenizer(prompt)["input_ids"])
+    elapsed = time.perf_counter() - started
+
+    outputs = [backend.generate_batch([prompt], max_length, None)[0] for prompt in PROMPTS]
+    return {
+        "backend": backend_name,
+        "load_seconds": load_seconds,
+        "tokens_per_second": generated_tokens / elapsed,
+        "rss_bytes": rss_bytes(),
+        "model_rss_bytes": rss_bytes() - rss_before,
+        "token_ids": [backend.tokenizer(output)["input_ids"] for output in outputs],
+    }
+
+
+def parity(reference: list, candidate: list) -> dict:
+    exact = sum(1 for a, b in zip(reference, candidate) if a == b)
+    prefix_shares = []
+    for a, b in zip(reference, candidate):
+        matching = 0
+        for x, y in zip(a, b):
+            if x != y:
+                break
+            matching += 1
+        prefix_shares.append(matching / max(len(a), 1))
+    return {
+        "exact_match_rate": exact / len(reference),
+        "mean_matching_prefix": sum(prefix_shares) / len(prefix_shares),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="gpt2")
+    parser.add_argument("--backends", nargs="+", default=["eager", "int8", "compile"])
+    parser.add_argument("--max-length", type=int, default=150)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        print(json.dumps(measure(args.worker, args.model, args.max_length, args.rounds)))
+        return
+
+    results = {}
+    for name in dict.fromkeys(["eager"] + args.backends):
+        completed = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_backends", "--worker", name, "--model", args.model,
+             "--max-length", str(args.max_length), "--rounds", str(args.rounds)],
+            capture_output=True, text=True, check=True,
+        )
+        results[name] = json.loads(completed.stdout.strip().splitlines()[-1])
+
+    reference = results["eager"]["token_ids"]
+    report = []
+    for name, result in results.items():
+        report.append({
+            "backend": name,
+            "tokens_per_second": round(result["tokens_per_second"], 2),
+            "rss_mb": round(result["rss_bytes"] / 2 ** 20, 1),
+            "model_rss_mb": round(result["model_rss_bytes"] / 2 ** 20, 1),
+            "load_seconds": round(result["load_seconds"], 2),
+            **parity(reference, result["token_ids"]),
+        })
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Compare chat generation throughput with and without micro-batching.
+
+Each client holds a conversation: every turn sends the earlier turns plus a new
+question, as /api/chat does. The same conversations run three ways: one request at
+a time, micro-batched, and decoded one at a time against the per-user KV cache
+(``CHAT_KV_CACHE=true``), which only prefills what each turn appends.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_batching --requests 32 --concurrency 8
+"""
+import argparse
+import asyncio
+import time
+
+from inference import InferencePool
+from kv_cache import KVCache
+
+
+QUESTIONS = [
+    "What is a Python list comprehension, and when is it clearer than a plain for loop?",
+    "How do I reverse a string in JavaScript without changing the original variable?",
+    "Can you explain recursion with a small example that computes a factorial?",
+    "What is the difference between a tuple and a list in Python, and when should I use each?",
+]
+# A fixed reply keeps every configuration's prompts identical
+ANSWER = "AI: Here is a short explanation with an example."
+
+
+async def run(pool: InferencePool, requests: int, concurrency: int, max_length: int, kv_cached: bool) -> float:
+    async def conversation(client: int, turns: int):
+        history = []
+        for turn in range(turns):
+            history.append(f"User: {QUESTIONS[(client + turn) % len(QUESTIONS)]}")
+            prompt = "\n".join(history) + "\nAI:"
+            await pool.generate(prompt, max_length=max_length, cache_key=f"client-{client}" if kv_cached else None)
+            history.append(ANSWER)
+
+    turns = [requests // concurrency + (1 if client < requests % concurrency else 0) for client in range(concurrency)]
+    start = time.perf_counter()
+    await asyncio.gather(*(conversation(client, count) for client, count in enumerate(turns)))
+    return requests / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--model", default="gpt2")
+    parser.add_argument("--requests", type=int, default=32)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--max-length", type=int, default=150)
+    parser.add_argument("--max-batch-size", type=int, default=8)
+    parser.add_argument("--max-batch-wait-ms", type=float, default=10)
+    args = parser.parse_args()
+
+    results = {}
+    configurations = (
+        ("one-at-a-time", 1, False),
+        ("batched", args.max_batch_size, False),
+        ("kv-cached", args.max_batch_size, True),
+    )
+    for label, batch_size, kv_cached in configurations:
+        pool = InferencePool(
+            args.model,
+            workers=1,
+            max_queue=args.requests,
+            max_batch_size=batch_size,
+            max_batch_wait_ms=args.max_batch_wait_ms,
+            kv_cache=KVCache(),
+        )
+        pool.load()
+        results[label] = asyncio.run(run(pool, args.requests, args.concurrency, args.max_length, kv_cached))
+        print(f"{label:>14}: {results[label]:.2f} req/s")
+        if kv_cached:
+            print(f"{'':>14}  KV cache hits {pool.kv_cache.hits}, misses {pool.kv_cache.misses}")
+        pool.shutdown()
+
+    print(f"{'batched gain':>14}: {results['batched'] / results['one-at-a-time']:.2f}x")
+    print(f"{'kv-cached gain':>14}: {results['kv-cached'] / results['one-at-a-time']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
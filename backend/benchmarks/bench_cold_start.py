@@ -0,0 +1,67 @@
+"""Measure how long a fresh uvicorn worker takes to serve requests and to be chat-ready.
+
+Starts ``uvicorn main:app`` as a subprocess and polls two URLs:
+  * the serve probe (default /api/health) - first non-chat response
+  * the ready probe (default /api/ready)  - model loaded
+
+On revisions without /api/health and /api/ready (model loaded at import), pass
+``--serve-path /docs --ready-path /docs``; both times are then the same.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_cold_start --runs 3
+"""
+import argparse
+import json
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+
+def wait_for(url: str, started: float, timeout: float) -> float:
+    while time.perf_counter() - started < timeout:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == 200:
+                    return time.perf_counter() - started
+        except (urllib.error.URLError, ConnectionError, OSError):
+            pass
+        time.sleep(0.05)
+    raise TimeoutError(f"{url} did not become available within {timeout:.0f}s")
+
+
+def run_once(port: int, serve_path: str, ready_path: str, timeout: float) -> dict:
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+    )
+    try:
+        serve_seconds = wait_for(f"http://127.0.0.1:{port}{serve_path}", started, timeout)
+        ready_seconds = wait_for(f"http://127.0.0.1:{port}{ready_path}", started, timeout)
+        return {"serve_seconds": serve_seconds, "ready_seconds": ready_seconds}
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--serve-path", default="/api/health")
+    parser.add_argument("--ready-path", default="/api/ready")
+    parser.add_argument("--timeout", type=float, default=300)
+    args = parser.parse_args()
+
+    runs = [run_once(args.port, args.serve_path, args.ready_path, args.timeout) for _ in range(args.runs)]
+    summary = {
+        "runs": runs,
+        "serve_seconds_min": min(r["serve_seconds"] for r in runs),
+        "ready_seconds_min": min(r["ready_seconds"] for r in runs),
+    }
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""Measure sandboxed grading throughput for a burst of submissions.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_grading --submissions 300 --workers 8
+"""
+import argparse
+import asyncio
+import json
+import time
+
+from grading import grade
+
+
+SOLUTION = "a, b = map(int, input().split())\nprint(a + b)\n"
+TESTCASES = json.dumps([
+    {"input": "1 2", "output": "3"},
+    {"input": "10 -4", "output": "6"},
+    {"input": "0 0", "output": "0"},
+])
+
+
+async def run(submissions: int, workers: int) -> float:
+    queue: asyncio.Queue = asyncio.Queue()
+    for _ in range(submissions):
+        queue.put_nowait(SOLUTION)
+
+    async def worker():
+        while not queue.empty():
+            result = await grade(queue.get_nowait(), TESTCASES)
+            assert result["status"] == "success", result
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(workers)))
+    return submissions / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--submissions", type=int, default=300)
+    parser.add_argument("--workers", type=int, default=8)
+    args = parser.parse_args()
+
+    rate = asyncio.run(run(args.submissions, args.workers))
+    print(f"{args.submissions} submissions, {args.workers} workers: {rate:.1f} submissions/s")
+
+
+if __name__ == "__main__":
+    main()
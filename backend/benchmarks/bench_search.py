@@ -0,0 +1,46 @@
+"""Measure BM25 top-k query latency over a synthetic corpus.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_search --documents 50000 --queries 1000
+"""
+import argparse
+import random
+import statistics
+import time
+
+from search import BM25Index, tokenize
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--documents", type=int, default=50000)
+    parser.add_argument("--words", type=int, default=200, help="words per document")
+    parser.add_argument("--vocabulary", type=int, default=20000)
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--k", type=int, default=3)
+    args = parser.parse_args()
+
+    random.seed(0)
+    vocabulary = [f"term{i}" for i in range(args.vocabulary)]
+    # Zipf-like term frequencies, as in natural text
+    weights = [1 / (rank + 1) for rank in range(args.vocabulary)]
+
+    index = BM25Index()
+    start = time.perf_counter()
+    for key in range(args.documents):
+        index.add(key, tokenize(" ".join(random.choices(vocabulary, weights, k=args.words))))
+    print(f"indexed {args.documents} documents in {time.perf_counter() - start:.1f}s")
+
+    latencies = []
+    for _ in range(args.queries):
+        query = " ".join(random.choices(vocabulary, weights, k=6))
+        start = time.perf_counter()
+        index.search(query, args.k)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+    latencies.sort()
+    print(f"p50 {statistics.median(latencies):.2f} ms, p99 {latencies[int(len(latencies) * 0.99) - 1]:.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""Measure total model memory across N uvicorn workers.
+
+Starts ``uvicorn main:app --workers N``, waits until the model has loaded, then sums
+RSS and PSS over all worker processes from /proc. RSS counts shared pages once per
+process; PSS divides them between the processes that map them, so with
+INFERENCE_SHARED_WEIGHTS_PATH set the PSS total should stay close to one copy of
+the weights while RSS keeps growing with N.
+
+``--backend-only`` starts N plain processes that each load the inference backend
+the way a worker does, without the API around it, so no MongoDB is needed.
+
+Usage (from the backend directory):
+    python -m benchmarks.bench_worker_memory --workers 4
+    INFERENCE_SHARED_WEIGHTS_PATH=/dev/shm/gpt2.pt python -m benchmarks.bench_worker_memory --workers 4
+    python -m benchmarks.bench_worker_memory --workers 4 --backend-only --model gpt2
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+
+def children(pid: int) -> list:
+    pids = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as stat:
+                # The command name may contain spaces; the parent pid follows the closing parenthesis
+                parent = int(stat.read().rsplit(")", 1)[1].split()[1])
+        except (FileNotFoundError, ProcessLookupError, IndexError):
+            continue
+        if parent == pid:
+            pids.append(int(entry))
+    return pids
+
+
+def memory(pid: int) -> dict:
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as rollup:
+        for line in rollup:
+            parts = line.split()
+            if parts[0] in ("Rss:", "Pss:"):
+                values[parts[0][:-1].lower()] = int(parts[1]) * 1024
+    return values
+
+
+def wait_until_ready(port: int, workers: int, timeout: float):
+    started = time.perf_counter()
+    consecutive = 0
+    # Requests are spread over the workers, so require a run of ready answers
+    while consecutive < workers * 5:
+        if time.perf_counter() - started > timeout:
+            raise TimeoutError("Workers did not become ready in time")
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/api/ready", timeout=1) as response:
+                consecutive = consecutive + 1 if response.status == 200 else 0
+        except (urllib.error.URLError, ConnectionError, OSError):
+            consecutive = 0
+            time.sleep(0.2)
+
+
+# Loads the backend like the pool's warm-up does, then idles until killed
+BACKEND_ONLY = """
+import sys, time
+from inference import INFERENCE_BACKEND
+from inference_backend import create_backend
+backend = create_backend(INFERENCE_BACKEND, sys.argv[1], timeout=60)
+print("ready", flush=True)
+time.sleep(3600)
+"""
+
+
+def report(workers: dict):
+    print(json.dumps({
+        "workers": len(workers),
+        "shared_weights_path": os.getenv("INFERENCE_SHARED_WEIGHTS_PATH", ""),
+        "total_rss_mb": round(sum(w["rss"] for w in workers.values()) / 2 ** 20, 1),
+        "total_pss_mb": round(sum(w["pss"] for w in workers.values()) / 2 ** 20, 1),
+        "per_worker": {str(pid): {k: round(v / 2 ** 20, 1) for k, v in w.items()} for pid, w in workers.items()},
+    }, indent=2))
+
+
+def measure_backends(count: int, model: str):
+    processes = [
+        subprocess.Popen([sys.executable, "-c", BACKEND_ONLY, model], stdout=subprocess.PIPE, text=True)
+        for _ in range(count)
+    ]
+    try:
+        for process in processes:
+            if process.stdout.readline().strip() != "ready":
+                raise RuntimeError("A backend process failed to load the model")
+        time.sleep(2)
+        report({process.pid: memory(process.pid) for process in processes})
+    finally:
+        for process in processes:
+            process.kill()
+            process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--timeout", type=float, default=600)
+    parser.add_argument("--backend-only", action="store_true", help="load the backend in plain processes, no API")
+    parser.add_argument("--model", default="gpt2", help="model for --backend-only")
+    args = parser.parse_args()
+
+    if args.backend_only:
+        measure_backends(args.workers, args.model)
+        return
+
+    process = subprocess.Popen([
+        sys.executable, "-m", "uvicorn", "main:app",
+        "--workers", str(args.workers), "--port", str(args.port), "--log-level", "warning",
+    ])
+    try:
+        wait_until_ready(args.port, args.workers, args.timeout)
+        time.sleep(2)
+        report({pid: memory(pid) for pid in children(process.pid)})
+    finally:
+        process.terminate()
+        process.wait()
+
+
+if __name__ == "__main__":
+    main()
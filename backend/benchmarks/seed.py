@@ -0,0 +1,213 @@
+"""Seed a MongoDB database with synthetic data for benchmarks.
+
+``--documents`` is the total across collections, split roughly like production:
+chat logs and submissions dominate, users and content are smaller. Every seeded
+user has the password ``--password`` and an effectively unlimited chat quota, so
+benchmark clients can log in and chat without hitting limits.
+
+Point MONGODB_URL/MONGODB_DATABASE at a scratch database; ``--drop`` empties the
+seeded collections first.
+
+Usage (from the backend directory):
+    MONGODB_DATABASE=rubberducker_bench python -m benchmarks.seed --documents 100000 --drop
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+from datetime import datetime, timedelta
+
+from dotenv import load_dotenv
+
+import indexes
+from database import Database
+from passwords import pwd_context
+from stats import DashboardStats
+
+
+BATCH_SIZE = 5000
+SEED_EMAIL = "bench{}@example.com"
+TOPICS = [
+    "python", "javascript", "recursion", "sorting", "hash tables", "linked lists", "trees",
+    "graphs", "dynamic programming", "sql", "git", "testing", "async", "classes", "closures",
+]
+# As the API models spell them
+DIFFICULTIES = ["Beginner", "Intermediate", "Advanced"]
+CONTENT_TYPES = ["article", "video", "exercise"]
+STATUSES = ["success", "failed", "completed"]
+WORDS = (
+    "function variable loop list dictionary string integer return value class object method "
+    "module import error exception index array pointer memory stack queue heap tree node edge "
+    "graph search sort merge split recursion base case iterate compile interpret test assert"
+).split()
+
+# Share of the total per collection
+SHARES = {
+    "users": 0.05,
+    "chatbot_interactions": 0.05,
+    "code_submissions": 0.8,
+    "study_materials": 0.05,
+    "learning_paths": 0.01,
+    "coding_exercises": 0.04,
+}
+
+
+def sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choices(WORDS, k=words))
+
+
+def when(rng: random.Random, now: datetime) -> datetime:
+    return now - timedelta(minutes=rng.randrange(60 * 24 * 90))
+
+
+def user(i: int, rng: random.Random, now: datetime, password: str) -> dict:
+    return {
+        "email": SEED_EMAIL.format(i),
+        "username": f"bench{i}",
+        "password": password,
+        "verified": True,
+        "role": "user",
+        "status": "active",
+        "interactioncount": 0,
+        "maxdailyinteractions": 10 ** 9,
+        "created_at": when(rng, now),
+    }
+
+
+def chat(i: int, rng: random.Random, now: datetime, users: int) -> dict:
+    # One capped log per user, so there are never more logs than users
+    history = []
+    for _ in range(rng.randint(1, 5)):
+        history += [f"User: {sentence(rng, 8)}", f"AI: {sentence(rng, 20)}"]
+    return {
+        "user_id": f"seed-{i % max(users, 1)}",
+        "history": history[-10:],
+        "topic": rng.choice(TOPICS),
+        "difficulty_level": rng.choice(DIFFICULTIES),
+        "last_interaction": when(rng, now),
+    }
+
+
+def submission(i: int, rng: random.Random, now: datetime, users: int) -> dict:
+    return {
+        "user_id": f"seed-{rng.randrange(max(users, 1))}",
+        "exercise_id": f"seed-{rng.randrange(1000)}",
+        "code": "def solve(a, b):\n    return a + b\n",
+        "language": "python",
+        "status": rng.choice(STATUSES),
+        "score": rng.randint(0, 100),
+        "feedback": sentence(rng, 12),
+        "submission_date": when(rng, now),
+    }
+
+
+def study_material(i: int, rng: random.Random, now: datetime, users: int) -> dict:
+    return {
+        "title": f"{rng.choice(TOPICS).title()}: {sentence(rng, 4)}",
+        "description": sentence(rng, 25),
+        "content_text": sentence(rng, 300),
+        "type": rng.choice(CONTENT_TYPES),
+        "content_type": rng.choice(CONTENT_TYPES),
+        "url": f"https://example.com/materials/{i}",
+        "topic": rng.choice(TOPICS),
+        "category": rng.choice(TOPICS),
+        "difficulty_level": rng.choice(DIFFICULTIES),
+        "created_at": when(rng, now),
+    }
+
+
+def learning_path(i: int, rng: random.Random, now: datetime, users: int) -> dict:
+    return {
+        "title": f"Learning path {i}",
+        "description": sentence(rng, 20),
+        "topics": rng.sample(TOPICS, 4),
+        "difficulty_level": rng.choice(DIFFICULTIES),
+        "created_at": when(rng, now),
+    }
+
+
+def coding_exercise(i: int, rng: random.Random, now: datetime, users: int) -> dict:
+    return {
+        "title": f"Exercise {i}: {sentence(rng, 3)}",
+        "description": sentence(rng, 30),
+        "topic": rng.choice(TOPICS),
+        "difficulty_level": rng.choice(DIFFICULTIES),
+        "testcases": '[{"input": "1 2", "output": "3"}]',
+    }
+
+
+FACTORIES = {
+    "chatbot_interactions": chat,
+    "code_submissions": submission,
+    "study_materials": study_material,
+    "learning_paths": learning_path,
+    "coding_exercises": coding_exercise,
+}
+
+
+async def insert(collection, documents, count: int):
+    started = time.perf_counter()
+    batch = []
+    for document in documents:
+        batch.append(document)
+        if len(batch) == BATCH_SIZE:
+            await collection.insert_many(batch, ordered=False)
+            batch = []
+    if batch:
+        await collection.insert_many(batch, ordered=False)
+    print(f"{collection.name}: {count} documents in {time.perf_counter() - started:.1f}s")
+
+
+async def seed(database: Database, documents: int, password: str, drop: bool, seed_value: int):
+    rng = random.Random(seed_value)
+    now = datetime.utcnow()
+    counts = {name: max(1, int(documents * share)) for name, share in SHARES.items()}
+    counts["chatbot_interactions"] = min(counts["chatbot_interactions"], counts["users"])
+
+    if drop:
+        for name in SHARES:
+            await database.db[name].delete_many({})
+
+    # bcrypt is deliberately slow, so every seeded user shares one hash
+    password_hash = pwd_context.hash(password)
+    await insert(
+        database.users,
+        (user(i, rng, now, password_hash) for i in range(counts["users"])),
+        counts["users"],
+    )
+    for name, factory in FACTORIES.items():
+        await insert(
+            database.db[name],
+            (factory(i, rng, now, counts["users"]) for i in range(counts[name])),
+            counts[name],
+        )
+
+    await indexes.migrate(database)
+    await DashboardStats(database).rebuild()
+    print(f"indexes built, dashboard counters rebuilt; log in as {SEED_EMAIL.format(0)} .. {SEED_EMAIL.format(counts['users'] - 1)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=10000, help="total documents, e.g. 10000 to 10000000")
+    parser.add_argument("--password", default="benchmark-password")
+    parser.add_argument("--drop", action="store_true")
+    parser.add_argument("--seed", type=int, default=0, help="random seed, for reproducible data")
+    args = parser.parse_args()
+
+    load_dotenv()
+    database = Database(os.getenv("MONGODB_URL"))
+
+    async def run():
+        await database.ping()
+        try:
+            await seed(database, args.documents, args.password, args.drop, args.seed)
+        finally:
+            database.close()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+import asyncio
+import os
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import errors
+
+
+# MongoDB pool and timeout configuration
+MONGODB_DATABASE = os.getenv("MONGODB_DATABASE", "airubberduckerdb")
+MONGODB_MAX_POOL_SIZE = int(os.getenv("MONGODB_MAX_POOL_SIZE", "100"))
+MONGODB_MIN_POOL_SIZE = int(os.getenv("MONGODB_MIN_POOL_SIZE", "0"))
+MONGODB_MAX_IDLE_TIME_MS = int(os.getenv("MONGODB_MAX_IDLE_TIME_MS", "60000"))
+MONGODB_WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGODB_WAIT_QUEUE_TIMEOUT_MS", "2000"))
+MONGODB_SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGODB_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+MONGODB_CONNECT_TIMEOUT_MS = int(os.getenv("MONGODB_CONNECT_TIMEOUT_MS", "5000"))
+MONGODB_SOCKET_TIMEOUT_MS = int(os.getenv("MONGODB_SOCKET_TIMEOUT_MS", "10000"))
+
+# Error code for change streams on a standalone server
+CHANGE_STREAM_UNSUPPORTED = 40573
+
+
+class Database:
+    """Async (Motor) client and handles for every collection the API uses.
+
+    The client connects lazily; ``ping()`` is awaited from the application lifespan
+    to fail fast when MongoDB is unreachable.
+    """
+
+    def __init__(self, url: str, name: str = MONGODB_DATABASE, **client_options):
+        options = {
+            "maxPoolSize": MONGODB_MAX_POOL_SIZE,
+            "minPoolSize": MONGODB_MIN_POOL_SIZE,
+            "maxIdleTimeMS": MONGODB_MAX_IDLE_TIME_MS,
+            "waitQueueTimeoutMS": MONGODB_WAIT_QUEUE_TIMEOUT_MS,
+            "serverSelectionTimeoutMS": MONGODB_SERVER_SELECTION_TIMEOUT_MS,
+            "connectTimeoutMS": MONGODB_CONNECT_TIMEOUT_MS,
+            "socketTimeoutMS": MONGODB_SOCKET_TIMEOUT_MS,
+        }
+        options.update(client_options)
+        self.client = AsyncIOMotorClient(url, **options)
+        self.db = self.client[name]
+
+        self.users = self.db["users"]
+        self.subscription = self.db["subscription"]
+        self.chatbot_interactions = self.db["chatbot_interactions"]
+        self.coding_exercises = self.db["coding_exercises"]
+        self.user_feedback = self.db["user_feedback"]
+        self.code_submissions = self.db["code_submissions"]
+        self.study_materials = self.db["study_materials"]
+        self.learning_paths = self.db["learning_paths"]
+        self.response_cache = self.db["response_cache"]
+        self.dashboard_stats = self.db["dashboard_stats"]
+        self.rate_limits = self.db["rate_limits"]
+
+    async def ping(self):
+        try:
+            await self.client.admin.command("ping")
+        except errors.ServerSelectionTimeoutError:
+            raise Exception("Could not connect to MongoDB server")
+        except errors.ConnectionFailure:
+            raise Exception("MongoDB connection failed")
+
+    def close(self):
+        self.client.close()
+
+
+async def watch_changes(collection, on_change, reload, poll_seconds: float):
+    """Await ``on_change(event)`` for every change to ``collection`` until cancelled.
+
+    Change streams need a replica set; on a standalone server ``reload()`` is awaited
+    every ``poll_seconds`` instead. After an interrupted stream ``reload()`` catches up
+    on the changes that were missed.
+    """
+    while True:
+        try:
+            async with collection.watch(full_document="updateLookup") as stream:
+                async for change in stream:
+                    await on_change(change)
+        except errors.OperationFailure as e:
+            if e.code != CHANGE_STREAM_UNSUPPORTED:
+                raise
+            while True:
+                await asyncio.sleep(poll_seconds)
+                try:
+                    await reload()
+                except errors.PyMongoError as e:
+                    print(f"Error reloading {collection.name}: {str(e)}")
+        except errors.PyMongoError as e:
+            print(f"Change stream on {collection.name} interrupted: {str(e)}")
+            await asyncio.sleep(poll_seconds)
+            try:
+                await reload()
+            except errors.PyMongoError:
+                pass
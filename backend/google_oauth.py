@@ -0,0 +1,273 @@
+import asyncio
+import hashlib
+import json
+import os
+import random
+import re
+import time
+from typing import Any, Dict, List, Optional
+
+import httpx
+from jose import jwt, JWTError
+
+from cache import LRUCache
+
+
+# Google endpoints; override to point the API at a local stand-in server
+GOOGLE_AUTH_URL = os.getenv("GOOGLE_AUTH_URL", "https://accounts.google.com/o/oauth2/v2/auth")
+GOOGLE_TOKEN_URL = os.getenv("GOOGLE_TOKEN_URL", "https://oauth2.googleapis.com/token")
+GOOGLE_TOKENINFO_URL = os.getenv("GOOGLE_TOKENINFO_URL", "https://www.googleapis.com/oauth2/v3/tokeninfo")
+GOOGLE_USERINFO_URL = os.getenv("GOOGLE_USERINFO_URL", "https://www.googleapis.com/oauth2/v2/userinfo")
+# A file:// URL reads a local key set instead, e.g. for tests without network access
+GOOGLE_JWKS_URL = os.getenv("GOOGLE_JWKS_URL", "https://www.googleapis.com/oauth2/v3/certs")
+# Disk copy of the keys; off unless set, and only read back from a file private to this user
+GOOGLE_JWKS_CACHE_PATH = os.getenv("GOOGLE_JWKS_CACHE_PATH", "")
+GOOGLE_ID_TOKEN_ISSUERS = ["accounts.google.com", "https://accounts.google.com"]
+
+# Outbound HTTP configuration
+HTTP_TIMEOUT_SECONDS = float(os.getenv("HTTP_TIMEOUT_SECONDS", "5"))
+HTTP_CONNECT_TIMEOUT_SECONDS = float(os.getenv("HTTP_CONNECT_TIMEOUT_SECONDS", "2"))
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "2"))
+HTTP_RETRY_BACKOFF_SECONDS = float(os.getenv("HTTP_RETRY_BACKOFF_SECONDS", "0.2"))
+GOOGLE_VERIFY_CACHE_TTL_SECONDS = int(os.getenv("GOOGLE_VERIFY_CACHE_TTL_SECONDS", "60"))
+GOOGLE_VERIFY_CACHE_MAX_ENTRIES = int(os.getenv("GOOGLE_VERIFY_CACHE_MAX_ENTRIES", "10000"))
+JWKS_DEFAULT_MAX_AGE_SECONDS = int(os.getenv("JWKS_DEFAULT_MAX_AGE_SECONDS", "3600"))
+JWKS_MIN_REFRESH_INTERVAL_SECONDS = int(os.getenv("JWKS_MIN_REFRESH_INTERVAL_SECONDS", "60"))
+# Upper bound on how long fetched keys are trusted, whatever Cache-Control says
+JWKS_MAX_AGE_SECONDS = int(os.getenv("JWKS_MAX_AGE_SECONDS", "86400"))
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+try:
+    import h2  # noqa: F401  (enables HTTP/2 in httpx)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+def create_http_client() -> httpx.AsyncClient:
+    """Shared client: pooled keep-alive connections, HTTP/2 when h2 is installed."""
+    return httpx.AsyncClient(
+        http2=HTTP2_AVAILABLE,
+        timeout=httpx.Timeout(HTTP_TIMEOUT_SECONDS, connect=HTTP_CONNECT_TIMEOUT_SECONDS),
+        limits=httpx.Limits(
+            max_connections=HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        ),
+    )
+
+
+class InvalidIDToken(Exception):
+    pass
+
+
+def _max_age(cache_control: str) -> int:
+    match = re.search(r"max-age=(\d+)", cache_control or "")
+    return min(int(match.group(1)) if match else JWKS_DEFAULT_MAX_AGE_SECONDS, JWKS_MAX_AGE_SECONDS)
+
+
+class JWKSCache:
+    """Signing keys from a JWKS endpoint, kept in memory and in a file on disk.
+
+    Keys are refreshed when the max-age from the endpoint's Cache-Control header runs
+    out, or when a token names an unknown key id (at most once per
+    JWKS_MIN_REFRESH_INTERVAL_SECONDS, so forged key ids cannot trigger a fetch per
+    request). If a refresh fails the previous keys stay in use. The disk copy lets a
+    restarted worker verify tokens without fetching the keys again; since whoever can
+    write it can mint tokens, it is only read when owned by this user and not writable
+    by anyone else, and never trusted for longer than the max-age it was fetched with.
+    """
+
+    def __init__(self, http: httpx.AsyncClient, url: str = GOOGLE_JWKS_URL, cache_path: Optional[str] = GOOGLE_JWKS_CACHE_PATH):
+        self.http = http
+        self.url = url
+        self.cache_path = cache_path
+        self.keys: Dict[str, Dict[str, Any]] = {}
+        self.expires_at = 0.0
+        self._last_refresh = 0.0
+        self._lock = asyncio.Lock()
+        self._load_disk_cache()
+
+    def _set_keys(self, keys: List[Dict[str, Any]], expires_at: float):
+        self.keys = {key["kid"]: key for key in keys if "kid" in key}
+        self.expires_at = expires_at
+
+    def _load_disk_cache(self):
+        if not self.cache_path or self.url.startswith("file://"):
+            return
+        try:
+            fd = os.open(self.cache_path, os.O_RDONLY | os.O_NOFOLLOW)
+        except OSError:
+            return
+        with os.fdopen(fd) as f:
+            info = os.fstat(fd)
+            if info.st_uid != os.getuid() or info.st_mode & 0o022:
+                print(f"Ignoring JWKS cache {self.cache_path}: not private to this user")
+                return
+            try:
+                cached = json.load(f)
+                if cached.get("url") != self.url:
+                    return
+                max_age = min(float(cached["max_age"]), JWKS_MAX_AGE_SECONDS)
+                fetched_at = float(cached["fetched_at"])
+                now = time.time()
+                if fetched_at > now:
+                    return
+                self._set_keys(cached["keys"], min(fetched_at + max_age, now + max_age))
+            except (ValueError, KeyError, TypeError):
+                pass
+
+    def _write_disk_cache(self, keys: List[Dict[str, Any]], fetched_at: float, max_age: int):
+        if not self.cache_path:
+            return
+        tmp_path = f"{self.cache_path}.{os.getpid()}.tmp"
+        try:
+            fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_NOFOLLOW, 0o600)
+            with os.fdopen(fd, "w") as f:
+                json.dump({"url": self.url, "fetched_at": fetched_at, "max_age": max_age, "keys": keys}, f)
+            os.replace(tmp_path, self.cache_path)
+        except OSError as e:
+            print(f"Error writing JWKS cache: {str(e)}")
+
+    async def _fetch(self):
+        if self.url.startswith("file://"):
+            with open(self.url[len("file://"):]) as f:
+                keys = json.load(f)["keys"]
+            self._set_keys(keys, time.time() + JWKS_DEFAULT_MAX_AGE_SECONDS)
+            return
+        response = await self.http.get(self.url)
+        response.raise_for_status()
+        keys = response.json()["keys"]
+        max_age = max(0, _max_age(response.headers.get("cache-control")) - int(response.headers.get("age", 0)))
+        fetched_at = time.time()
+        self._set_keys(keys, fetched_at + max_age)
+        self._write_disk_cache(keys, fetched_at, max_age)
+
+    async def refresh(self, force: bool = False):
+        async with self._lock:
+            now = time.time()
+            # Another request may have refreshed while this one waited for the lock
+            if now < self.expires_at and not force:
+                return
+            if force and now - self._last_refresh < JWKS_MIN_REFRESH_INTERVAL_SECONDS:
+                return
+            self._last_refresh = now
+            try:
+                await self._fetch()
+            except (httpx.HTTPError, OSError, ValueError, KeyError) as e:
+                if not self.keys:
+                    raise
+                print(f"Error refreshing JWKS, keeping previous keys: {str(e)}")
+
+    async def get_key(self, kid: str) -> Optional[Dict[str, Any]]:
+        if time.time() >= self.expires_at:
+            await self.refresh()
+        if kid not in self.keys:
+            await self.refresh(force=True)
+        return self.keys.get(kid)
+
+
+class GoogleOAuthClient:
+    """Async calls to Google's OAuth endpoints over one pooled HTTP client.
+
+    Failed connections are retried with exponential backoff and full jitter; so are
+    GET requests answered with 429/5xx. The authorization-code POST is only retried
+    when the connection could not be opened, because a code can be redeemed once.
+    Raises ``httpx.HTTPError`` when Google cannot be reached or rejects the request.
+    """
+
+    def __init__(self, client_id: str, client_secret: str, redirect_uri: str, http_client: Optional[httpx.AsyncClient] = None):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.redirect_uri = redirect_uri
+        self.http = http_client or create_http_client()
+        self._verified = LRUCache(GOOGLE_VERIFY_CACHE_MAX_ENTRIES, ttl_seconds=GOOGLE_VERIFY_CACHE_TTL_SECONDS)
+        self.jwks = JWKSCache(self.http)
+
+    async def _request(self, method: str, url: str, **kwargs) -> Dict[str, Any]:
+        for attempt in range(HTTP_RETRIES + 1):
+            last_attempt = attempt == HTTP_RETRIES
+            try:
+                response = await self.http.request(method, url, **kwargs)
+            except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout):
+                if last_attempt:
+                    raise
+            else:
+                if method != "GET" or response.status_code not in RETRY_STATUS_CODES or last_attempt:
+                    response.raise_for_status()
+                    return response.json()
+            await asyncio.sleep(random.uniform(0, HTTP_RETRY_BACKOFF_SECONDS * 2 ** attempt))
+
+    async def exchange_code(self, code: str) -> Dict[str, Any]:
+        return await self._request("POST", GOOGLE_TOKEN_URL, data={
+            "code": code,
+            "client_id": self.client_id,
+            "client_secret": self.client_secret,
+            "redirect_uri": self.redirect_uri,
+            "grant_type": "authorization_code",
+        })
+
+    async def user_info(self, access_token: str) -> Dict[str, Any]:
+        return await self._request(
+            "GET", GOOGLE_USERINFO_URL, headers={"Authorization": f"Bearer {access_token}"}
+        )
+
+    async def verify_access_token(self, access_token: str) -> Dict[str, Any]:
+        """Validate an access token and return the user's profile.
+
+        Results are cached by token hash for at most GOOGLE_VERIFY_CACHE_TTL_SECONDS
+        and never beyond the token's own expiry.
+        """
+        key = hashlib.sha256(access_token.encode("utf-8")).hexdigest()
+        user_info = self._verified.get(key)
+        if user_info is not None:
+            return user_info
+
+        # tokeninfo and userinfo are independent, so both requests go out together
+        token_info, user_info = await asyncio.gather(
+            self._request("GET", GOOGLE_TOKENINFO_URL, params={"access_token": access_token}),
+            self.user_info(access_token),
+        )
+        expires_in = int(token_info.get("expires_in", GOOGLE_VERIFY_CACHE_TTL_SECONDS))
+        self._verified.set(key, user_info, ttl_seconds=min(expires_in, GOOGLE_VERIFY_CACHE_TTL_SECONDS))
+        return user_info
+
+    async def verify_id_token(self, id_token: str) -> Dict[str, Any]:
+        """Check an ID token's signature against the cached JWKS and return its profile.
+
+        No request reaches Google unless the signing keys need refreshing. Raises
+        ``InvalidIDToken`` for a bad signature, audience, issuer or expiry, or when
+        the email address is not verified.
+        """
+        try:
+            kid = jwt.get_unverified_header(id_token).get("kid")
+            key = await self.jwks.get_key(kid) if kid else None
+            if key is None:
+                raise InvalidIDToken("Unknown signing key")
+            claims = jwt.decode(
+                id_token,
+                key,
+                algorithms=["RS256"],
+                audience=self.client_id,
+                issuer=GOOGLE_ID_TOKEN_ISSUERS,
+                options={"verify_at_hash": False},
+            )
+        except JWTError as e:
+            raise InvalidIDToken(str(e))
+        if not claims.get("email"):
+            raise InvalidIDToken("Token has no email claim")
+        # Anyone can put an unverified address on a Google account; it must not sign in as that address
+        if claims.get("email_verified") not in (True, "true"):
+            raise InvalidIDToken("Email address is not verified")
+        return {"email": claims["email"], "name": claims.get("name", ""), "picture": claims.get("picture")}
+
+    async def verify_token(self, token: str) -> Dict[str, Any]:
+        """Verify either an ID token (a JWT, checked locally) or an opaque access token."""
+        if token.count(".") == 2:
+            return await self.verify_id_token(token)
+        return await self.verify_access_token(token)
+
+    async def aclose(self):
+        await self.http.aclose()
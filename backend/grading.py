@@ -0,0 +1,464 @@
+import asyncio
+import json
+import os
+import shutil
+import signal
+import sys
+import tempfile
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from pymongo import UpdateOne, errors
+
+
+# Grading configuration
+# Off by default: submitted code is untrusted and must not run without isolation
+GRADING_ENABLED = os.getenv("GRADING_ENABLED", "false").lower() == "true"
+# "bwrap" runs each job in a bubblewrap sandbox; "none" is only for trusted local development
+GRADING_ISOLATION = os.getenv("GRADING_ISOLATION", "bwrap")
+GRADING_BWRAP_PATH = os.getenv("GRADING_BWRAP_PATH", "bwrap")
+GRADING_SANDBOX_UID = int(os.getenv("GRADING_SANDBOX_UID", "65534"))
+GRADING_WORKERS = int(os.getenv("GRADING_WORKERS", str(os.cpu_count() or 2)))
+GRADING_MAX_QUEUE = int(os.getenv("GRADING_MAX_QUEUE", "1000"))
+GRADING_TIMEOUT_SECONDS = float(os.getenv("GRADING_TIMEOUT_SECONDS", "5"))
+GRADING_CPU_SECONDS = int(os.getenv("GRADING_CPU_SECONDS", "2"))
+GRADING_MEMORY_BYTES = int(os.getenv("GRADING_MEMORY_BYTES", str(256 * 1024 * 1024)))
+GRADING_MAX_OUTPUT_BYTES = int(os.getenv("GRADING_MAX_OUTPUT_BYTES", str(64 * 1024)))
+GRADING_FLUSH_INTERVAL_SECONDS = float(os.getenv("GRADING_FLUSH_INTERVAL_SECONDS", "0.5"))
+GRADING_FLUSH_BATCH_SIZE = int(os.getenv("GRADING_FLUSH_BATCH_SIZE", "100"))
+# A claimed submission is taken over by another process if not graded within the lease
+GRADING_LEASE_SECONDS = float(os.getenv("GRADING_LEASE_SECONDS", "300"))
+GRADING_RECOVER_INTERVAL_SECONDS = float(os.getenv("GRADING_RECOVER_INTERVAL_SECONDS", "60"))
+
+# Runs in the child before any submitted code: apply the limits, then replace itself
+# with an isolated interpreter (-I: no env vars or user site, -S: no site-packages).
+# The hard limits cannot be raised again by the submission.
+_SANDBOX = """
+import os, resource, sys
+cpu, memory, output, path = int(sys.argv[1]), int(sys.argv[2]), int(sys.argv[3]), sys.argv[4]
+resource.setrlimit(resource.RLIMIT_CPU, (cpu, cpu))
+resource.setrlimit(resource.RLIMIT_AS, (memory, memory))
+resource.setrlimit(resource.RLIMIT_FSIZE, (output, output))
+resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+resource.setrlimit(resource.RLIMIT_NPROC, (0, 0))
+os.execv(sys.executable, [sys.executable, "-I", "-S", path])
+"""
+
+
+class GradingQueueFull(Exception):
+    pass
+
+
+class GradingDisabled(Exception):
+    pass
+
+
+class OutputLimitExceeded(Exception):
+    pass
+
+
+def parse_testcases(testcases: Any) -> List[Dict[str, Any]]:
+    """Test cases are a JSON list of {"input", "output"} stdin/stdout pairs, or Python
+    code (typically asserts) run after the submission; that case passes on exit code 0.
+    """
+    if isinstance(testcases, list):
+        return testcases
+    try:
+        cases = json.loads(testcases)
+        if isinstance(cases, list):
+            return cases
+    except (TypeError, ValueError):
+        pass
+    return [{"script": testcases or ""}]
+
+
+def _normalize_output(text: str) -> str:
+    return "\n".join(line.rstrip() for line in text.strip().splitlines())
+
+
+async def _read_limited(stream, limit: int) -> bytes:
+    chunks = []
+    size = 0
+    while True:
+        chunk = await stream.read(65536)
+        if not chunk:
+            return b"".join(chunks)
+        size += len(chunk)
+        if size > limit:
+            raise OutputLimitExceeded()
+        chunks.append(chunk)
+
+
+def _bwrap_command(workdir: str) -> List[str]:
+    """bubblewrap arguments: a new user, network, PID and mount namespace as an
+    unprivileged uid, with the interpreter and system libraries read-only and the
+    job's directory as the only other visible path. The backend directory, its
+    ``.env`` and the network are out of reach.
+    """
+    python_prefix = os.path.realpath(sys.base_prefix)
+    command = [
+        GRADING_BWRAP_PATH,
+        "--unshare-all",
+        "--die-with-parent",
+        "--new-session",
+        "--cap-drop", "ALL",
+        "--uid", str(GRADING_SANDBOX_UID),
+        "--gid", str(GRADING_SANDBOX_UID),
+        "--clearenv",
+        "--setenv", "PATH", "/usr/bin:/bin",
+        "--ro-bind", "/usr", "/usr",
+        "--ro-bind-try", "/lib", "/lib",
+        "--ro-bind-try", "/lib64", "/lib64",
+        "--ro-bind-try", "/bin", "/bin",
+        "--proc", "/proc",
+        "--dev", "/dev",
+        "--tmpfs", "/tmp",
+        "--ro-bind", workdir, "/sandbox",
+        "--chdir", "/sandbox",
+    ]
+    if not python_prefix.startswith("/usr/"):
+        command += ["--ro-bind", python_prefix, python_prefix]
+    return command + ["--"]
+
+
+def isolation_error() -> Optional[str]:
+    """Why submissions cannot be graded safely here, or None."""
+    if not GRADING_ENABLED:
+        return "Automatic grading is disabled (GRADING_ENABLED=false)"
+    if GRADING_ISOLATION == "bwrap" and shutil.which(GRADING_BWRAP_PATH) is None:
+        return f"GRADING_ISOLATION=bwrap but {GRADING_BWRAP_PATH} is not installed"
+    if GRADING_ISOLATION not in ("bwrap", "none"):
+        return f"Unknown GRADING_ISOLATION '{GRADING_ISOLATION}'"
+    # RLIMIT_NPROC does not bind root, and root submissions could do anything else too
+    if GRADING_ISOLATION == "none" and os.geteuid() == 0:
+        return "GRADING_ISOLATION=none cannot be used while the API runs as root"
+    return None
+
+
+async def run_sandboxed(source: str, stdin: str, workdir: str) -> Tuple[Optional[int], str, str]:
+    """Run ``source`` in a resource-limited child; returns (exit code or None on timeout, stdout, stderr).
+
+    The rlimits bound CPU, memory, output and process creation. With
+    ``GRADING_ISOLATION=bwrap`` the child also runs as ``GRADING_SANDBOX_UID`` in
+    its own namespaces without network access or a view of the host filesystem;
+    with ``none`` it runs as the API's own user and can read everything the API can.
+
+    The job's directory is 0700 and its files 0600, so other local users cannot read
+    submissions. bwrap's user namespace maps the sandbox uid to the API's uid, so
+    inside the sandbox the child is still the owner of the bind-mounted directory.
+    """
+    os.chmod(workdir, 0o700)
+    path = os.path.join(workdir, "solution.py")
+    with os.fdopen(os.open(path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "w") as f:
+        f.write(source)
+    python = os.path.realpath(sys.executable)
+    if GRADING_ISOLATION == "bwrap":
+        prefix, cwd, path = _bwrap_command(workdir), None, "/sandbox/solution.py"
+    else:
+        prefix, cwd = [], workdir
+    process = await asyncio.create_subprocess_exec(
+        *prefix, python, "-I", "-c", _SANDBOX,
+        str(GRADING_CPU_SECONDS), str(GRADING_MEMORY_BYTES), str(GRADING_MAX_OUTPUT_BYTES), path,
+        stdin=asyncio.subprocess.PIPE,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        cwd=cwd,
+        env={"PATH": "/usr/bin:/bin"},
+        start_new_session=True,
+    )
+
+    async def communicate():
+        async def feed():
+            try:
+                process.stdin.write(stdin.encode("utf-8"))
+                await process.stdin.drain()
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+            finally:
+                process.stdin.close()
+
+        _, stdout, stderr = await asyncio.gather(
+            feed(),
+            _read_limited(process.stdout, GRADING_MAX_OUTPUT_BYTES),
+            _read_limited(process.stderr, GRADING_MAX_OUTPUT_BYTES),
+        )
+        return await process.wait(), stdout, stderr
+
+    try:
+        code, stdout, stderr = await asyncio.wait_for(communicate(), GRADING_TIMEOUT_SECONDS)
+    except asyncio.TimeoutError:
+        code, stdout, stderr = None, b"", b""
+    finally:
+        if process.returncode is None:
+            # The whole session, in case the submission managed to start children
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            await process.wait()
+    return code, stdout.decode("utf-8", "replace"), stderr.decode("utf-8", "replace")
+
+
+async def grade(code: str, testcases: Any) -> Dict[str, Any]:
+    """Run ``code`` against every test case; returns status, score (0-100) and feedback."""
+    cases = parse_testcases(testcases)
+    passed = 0
+    failures = []
+    with tempfile.TemporaryDirectory(prefix="grading-") as workdir:
+        for number, case in enumerate(cases, start=1):
+            script = case.get("script")
+            source = f"{code}\n\n{script}\n" if script is not None else code
+            try:
+                exit_code, stdout, stderr = await run_sandboxed(source, str(case.get("input", "")), workdir)
+            except OutputLimitExceeded:
+                failures.append(f"Test {number}: output limit exceeded")
+                continue
+            if exit_code is None:
+                failures.append(f"Test {number}: time limit exceeded")
+            elif exit_code < 0:
+                failures.append(f"Test {number}: killed by the CPU or memory limit")
+            elif exit_code != 0:
+                error = stderr.strip().splitlines()[-1] if stderr.strip() else f"exit code {exit_code}"
+                failures.append(f"Test {number}: {error}")
+            elif script is None and _normalize_output(stdout) != _normalize_output(str(case.get("output", ""))):
+                failures.append(f"Test {number}: expected {case.get('output')!r}, got {stdout.strip()!r}")
+            else:
+                passed += 1
+
+    total = len(cases)
+    feedback = f"Passed {passed}/{total} test cases."
+    if failures:
+        feedback += "\n" + "\n".join(failures[:5])
+    return {
+        "status": "success" if passed == total else "failed",
+        "score": round(100 * passed / total) if total else 0,
+        "feedback": feedback,
+    }
+
+
+class GradingEngine:
+    """Grades queued submissions in parallel sandboxed processes.
+
+    ``submit`` puts a job on a bounded queue and returns immediately; ``workers``
+    tasks each run one submission's test cases at a time in child processes, so up
+    to ``workers`` interpreters execute in parallel without the GIL. Results are
+    buffered and written to ``code_submissions`` with one bulk write per flush, and
+    the dashboard counters are updated in the same batch.
+
+    Every API process runs its own engine, so a job is graded only after its
+    submission is claimed atomically (``pending`` to ``grading``, with this engine
+    as owner and a lease). Claims whose lease ran out, because the owner died or
+    hung, can be taken over by any engine; results are only written by the owner
+    of the current claim.
+    """
+
+    def __init__(self, database, dashboard_stats, workers: int = GRADING_WORKERS, max_queue: int = GRADING_MAX_QUEUE):
+        self.database = database
+        self.dashboard_stats = dashboard_stats
+        self.workers = workers
+        self.max_queue = max_queue
+        self.owner = str(ObjectId())
+        self._queue: Optional[asyncio.Queue] = None
+        self._results: List[Dict[str, Any]] = []
+        self._results_ready: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+        self._queued: set = set()
+        self._completed_at: deque = deque()
+        self.in_flight = 0
+        self.graded = 0
+        self.errors = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self._queue is not None
+
+    def submit(self, job: Dict[str, Any]):
+        """``job`` holds the submission's ``_id``, ``code``, ``testcases`` and ``submission_date``."""
+        if self._queue is None:
+            raise GradingDisabled()
+        if job["_id"] in self._queued:
+            return
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise GradingQueueFull()
+        self._queued.add(job["_id"])
+
+    @staticmethod
+    def _claimable(now: datetime) -> Dict[str, Any]:
+        return {"$or": [
+            {"status": "pending"},
+            {"status": "grading", "lease_expires_at": {"$lt": now}},
+        ]}
+
+    async def _claim(self, job: Dict[str, Any]) -> bool:
+        now = datetime.utcnow()
+        try:
+            claimed = await self.database.code_submissions.find_one_and_update(
+                {"_id": job["_id"], **self._claimable(now)},
+                {"$set": {
+                    "status": "grading",
+                    "grading_owner": self.owner,
+                    "lease_expires_at": now + timedelta(seconds=GRADING_LEASE_SECONDS),
+                }},
+                projection={"_id": 1},
+            )
+        except errors.PyMongoError as e:
+            # Left for the next recovery pass
+            print(f"Error claiming submission {job['_id']}: {str(e)}")
+            return False
+        return claimed is not None
+
+    async def _work(self):
+        while True:
+            job = await self._queue.get()
+            self._queued.discard(job["_id"])
+            if not await self._claim(job):
+                # Graded or being graded by another process
+                self._queue.task_done()
+                continue
+            self.in_flight += 1
+            try:
+                result = await grade(job["code"], job["testcases"])
+            except Exception as e:
+                self.errors += 1
+                print(f"Error grading submission {job['_id']}: {str(e)}")
+                result = {"status": "failed", "score": 0, "feedback": "The submission could not be graded."}
+            finally:
+                self.in_flight -= 1
+                self._queue.task_done()
+            self._results.append({**result, "_id": job["_id"], "submission_date": job["submission_date"]})
+            self._completed_at.append(time.monotonic())
+            if len(self._results) >= GRADING_FLUSH_BATCH_SIZE:
+                self._results_ready.set()
+
+    async def _flush_loop(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._results_ready.wait(), GRADING_FLUSH_INTERVAL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._results_ready.clear()
+            await self.flush()
+
+    async def flush(self):
+        results, self._results = self._results, []
+        if not results:
+            return
+        now = datetime.utcnow()
+        token = str(ObjectId())
+        submissions = self.database.code_submissions
+        try:
+            written = await submissions.bulk_write([
+                UpdateOne(
+                    {"_id": result["_id"], "status": "grading", "grading_owner": self.owner},
+                    {
+                        "$set": {
+                            "status": result["status"],
+                            "score": result["score"],
+                            "feedback": result["feedback"],
+                            "graded_at": now,
+                            "grading_flush": token,
+                        },
+                        "$unset": {"grading_owner": "", "lease_expires_at": ""},
+                    }
+                )
+                for result in results
+            ], ordered=False)
+            if written.matched_count < len(results):
+                # Some claims were taken over after their lease ran out; their new
+                # owner records those results
+                saved = {
+                    submission["_id"]
+                    async for submission in submissions.find({"grading_flush": token}, {"_id": 1})
+                }
+                results = [result for result in results if result["_id"] in saved]
+        except errors.PyMongoError as e:
+            print(f"Error saving grading results, retrying: {str(e)}")
+            self._results = results + self._results
+            return
+        self.graded += len(results)
+        try:
+            await self.dashboard_stats.record_submission_statuses([
+                (result["submission_date"], "pending", result["status"]) for result in results
+            ])
+        except errors.PyMongoError as e:
+            # Not retried: the results are saved, so a retry would not match them again.
+            # `python manage.py rebuild-stats` recounts the dashboard.
+            print(f"Error updating dashboard counters: {str(e)}")
+
+    async def recover(self):
+        """Queue submissions left pending, or claimed by an engine whose lease ran out.
+
+        Every process may queue the same submission; only the first claim grades it.
+        """
+        submissions = self.database.code_submissions
+        pending = await submissions.find(
+            self._claimable(datetime.utcnow()), {"code": 1, "exercise_id": 1, "submission_date": 1}
+        ).limit(self.max_queue).to_list(length=self.max_queue)
+        if not pending:
+            return
+        exercise_ids = [
+            ObjectId(exercise_id)
+            for exercise_id in {str(submission["exercise_id"]) for submission in pending}
+            if ObjectId.is_valid(exercise_id)
+        ]
+        exercises = {
+            str(exercise["_id"]): exercise.get("testcases")
+            async for exercise in self.database.coding_exercises.find(
+                {"_id": {"$in": exercise_ids}}, {"testcases": 1}
+            )
+        }
+        for submission in pending:
+            testcases = exercises.get(str(submission["exercise_id"]))
+            if testcases is None:
+                continue
+            try:
+                self.submit({**submission, "testcases": testcases})
+            except GradingQueueFull:
+                break
+
+    async def _recover_loop(self):
+        while True:
+            try:
+                await self.recover()
+            except errors.PyMongoError as e:
+                print(f"Error recovering pending submissions: {str(e)}")
+            await asyncio.sleep(GRADING_RECOVER_INTERVAL_SECONDS)
+
+    def stats(self) -> Dict[str, Any]:
+        cutoff = time.monotonic() - 60
+        while self._completed_at and self._completed_at[0] < cutoff:
+            self._completed_at.popleft()
+        return {
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "max_queue": self.max_queue,
+            "workers": self.workers,
+            "in_flight": self.in_flight,
+            "graded": self.graded,
+            "errors": self.errors,
+            "unsaved_results": len(self._results),
+            "graded_last_minute": len(self._completed_at),
+        }
+
+    async def start(self):
+        error = isolation_error()
+        if error is not None:
+            print(f"Grading is off: {error}")
+            return
+        if GRADING_ISOLATION == "none":
+            print("Warning: grading without isolation; submissions can read the API's files and use the network")
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._results_ready = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._flush_loop()))
+        self._tasks.append(asyncio.create_task(self._recover_loop()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        await self.flush()
@@ -0,0 +1,365 @@
+import os
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Tuple
+
+from bson import ObjectId
+from pymongo import IndexModel, errors
+
+from response_cache import RESPONSE_CACHE_TTL_SECONDS
+from stats import COMPLETED_SUBMISSION_STATUSES
+
+
+# Dev mode: explain the route queries at startup and report collection scans
+QUERY_AUDIT = os.getenv("QUERY_AUDIT", "false").lower() == "true"
+
+# Index options that make two indexes on the same keys different
+COMPARED_OPTIONS = ("unique", "sparse", "expireAfterSeconds", "partialFilterExpression")
+
+# Every index the API relies on, per collection. ``python manage.py migrate`` makes the
+# database match; indexes found in the database but not listed here are reported.
+INDEXES: Dict[str, List[IndexModel]] = {
+    "users": [
+        IndexModel([("email", 1)], unique=True),
+        IndexModel([("username", 1)], unique=True),
+        # Admin user list: status filter, paged by _id
+        IndexModel([("status", 1), ("_id", 1)]),
+    ],
+    "subscription": [
+        # Active plan lookup for the chat quota
+        IndexModel([("user_id", 1), ("is_active", 1)]),
+        IndexModel([("plantype", 1)]),
+    ],
+    "chatbot_interactions": [
+        # One capped history document per user, so concurrent upserts cannot create duplicates
+        IndexModel([("user_id", 1)], unique=True),
+        # Popular topics and active sessions only look at recent turns
+        IndexModel([("last_interaction", 1)]),
+        # Dashboard topic count: distinct values straight from the index
+        IndexModel([("topic", 1)]),
+    ],
+    "coding_exercises": [
+        IndexModel([("material_category", 1)]),
+        IndexModel([("difficulty_level", 1)]),
+    ],
+    "user_feedback": [
+        IndexModel([("user_id", 1)]),
+        IndexModel([("feedback_timestamp", 1)]),
+    ],
+    "code_submissions": [
+        # Recent activity: a user's latest submissions first
+        IndexModel([("user_id", 1), ("submission_date", -1)]),
+        IndexModel([("exercise_id", 1)]),
+        IndexModel([("submission_date", 1)]),
+        # Pending submissions for the grader, completed counts for the dashboard
+        IndexModel([("status", 1), ("submission_date", 1)]),
+        # Which results of a grading flush were saved
+        IndexModel([("grading_flush", 1)], sparse=True),
+    ],
+    "study_materials": [
+        # Filter field first, then _id, so filtered pages are keyset range scans
+        IndexModel([("category", 1), ("_id", 1)]),
+        IndexModel([("difficulty_level", 1), ("_id", 1)]),
+        IndexModel([("content_type", 1), ("_id", 1)]),
+    ],
+    "learning_paths": [
+        IndexModel([("title", 1)], unique=True),
+        IndexModel([("difficulty_level", 1), ("_id", 1)]),
+    ],
+    "response_cache": [
+        IndexModel([("created_at", 1)], expireAfterSeconds=RESPONSE_CACHE_TTL_SECONDS),
+    ],
+    "rate_limits": [
+        IndexModel([("expires_at", 1)], expireAfterSeconds=0),
+    ],
+}
+
+# The queries behind each route, with representative values, for the query-plan audit.
+# Lookups by _id and the in-memory search and suggestions are not listed.
+ROUTE_QUERIES: List[Dict[str, Any]] = [
+    {"route": "auth: current user, login", "collection": "users", "filter": {"email": "user@example.com"}},
+    {
+        "route": "GET /api/admin/users",
+        "collection": "users",
+        "filter": {"status": "active", "_id": {"$gt": ObjectId("000000000000000000000000")}},
+        "sort": [("_id", 1)],
+    },
+    {"route": "POST /api/chat (quota)", "collection": "subscription", "filter": {"user_id": "user", "is_active": True}},
+    {"route": "POST /api/chat (history)", "collection": "chatbot_interactions", "filter": {"user_id": "user"}},
+    {"route": "GET /api/dashboard/recent-activity", "collection": "chatbot_interactions", "filter": {"user_id": "user"}},
+    {
+        "route": "GET /api/dashboard/recent-activity",
+        "collection": "code_submissions",
+        "filter": {"user_id": "user"},
+        "sort": [("submission_date", -1)],
+    },
+    {
+        "route": "GET /api/study-materials?category",
+        "collection": "study_materials",
+        "filter": {"category": "python"},
+        "sort": [("_id", 1)],
+    },
+    {
+        "route": "GET /api/study-materials?difficulty_level",
+        "collection": "study_materials",
+        "filter": {"difficulty_level": "beginner"},
+        "sort": [("_id", 1)],
+    },
+    {
+        "route": "GET /api/study-materials?content_type",
+        "collection": "study_materials",
+        "filter": {"content_type": "article"},
+        "sort": [("_id", 1)],
+    },
+    {
+        "route": "GET /api/learning-paths?difficulty_level",
+        "collection": "learning_paths",
+        "filter": {"difficulty_level": "beginner"},
+        "sort": [("_id", 1)],
+    },
+    {
+        "route": "grading recovery",
+        "collection": "code_submissions",
+        "filter": {"$or": [
+            {"status": "pending"},
+            {"status": "grading", "lease_expires_at": {"$lt": datetime(2024, 1, 1)}},
+        ]},
+    },
+    {"route": "grading results", "collection": "code_submissions", "filter": {"grading_flush": "token"}},
+    {
+        "route": "dashboard rebuild",
+        "collection": "code_submissions",
+        "filter": {"status": {"$in": COMPLETED_SUBMISSION_STATUSES}},
+    },
+    {
+        "route": "popular topics, GET /api/admin/stats (active sessions)",
+        "collection": "chatbot_interactions",
+        "filter": {"last_interaction": {"$gte": datetime(2024, 1, 1)}},
+    },
+]
+
+
+class MergeRequired(Exception):
+    """Building the unique chat history index first needs duplicates deleted."""
+
+    def __init__(self, duplicates: int):
+        super().__init__(
+            f"{duplicates} duplicate chat history documents must be removed before chatbot_interactions.user_id "
+            "can be unique; rerun with --merge-duplicates to keep only the newest one per user"
+        )
+        self.duplicates = duplicates
+
+
+def _options(document: Dict[str, Any], ttl: bool = True) -> Dict[str, Any]:
+    # unique/sparse set to false are the same as absent; expireAfterSeconds 0 is a real TTL
+    return {
+        option: document[option]
+        for option in COMPARED_OPTIONS
+        if option in document and (document[option] or option == "expireAfterSeconds")
+        and (ttl or option != "expireAfterSeconds")
+    }
+
+
+def _background(model: IndexModel) -> IndexModel:
+    document = model.document
+    options = {option: value for option, value in document.items() if option != "key"}
+    return IndexModel(list(document["key"].items()), background=True, **options)
+
+
+def _key(document: Dict[str, Any]) -> Tuple:
+    return tuple(document["key"].items())
+
+
+async def plan(database, count_duplicates: bool = True) -> List[Tuple[str, str, Any]]:
+    """Differences between ``INDEXES`` and the database as (action, collection, detail).
+
+    Actions: ``create`` (an IndexModel), ``ttl`` and ``rebuild`` (an (existing name,
+    IndexModel) pair) and ``extra`` (the name of an index not in the spec). When the
+    unique chat history index is to be built over duplicate documents, a ``merge``
+    action with the number of documents to delete comes first; counting them reads
+    the whole collection, which ``count_duplicates=False`` skips.
+    """
+    actions = []
+    for name, models in INDEXES.items():
+        existing = {_key(index): index async for index in database.db[name].list_indexes()}
+        wanted = set()
+        for model in models:
+            document = model.document
+            key = _key(document)
+            wanted.add(key)
+            current = existing.get(key)
+            if current is None:
+                actions.append(("create", name, model))
+            elif _options(current) != _options(document):
+                if (
+                    "expireAfterSeconds" in current and "expireAfterSeconds" in document
+                    and _options(current, ttl=False) == _options(document, ttl=False)
+                ):
+                    actions.append(("ttl", name, (current["name"], model)))
+                else:
+                    actions.append(("rebuild", name, (current["name"], model)))
+        for key, index in existing.items():
+            if key not in wanted and index["name"] != "_id_":
+                actions.append(("extra", name, index["name"]))
+
+    if count_duplicates and any(
+        kind in ("create", "rebuild") and collection == "chatbot_interactions"
+        and _key((detail if kind == "create" else detail[1]).document) == (("user_id", 1),)
+        for kind, collection, detail in actions
+    ):
+        duplicates = await count_duplicate_chat_logs(database)
+        if duplicates:
+            actions.insert(0, ("merge", "chatbot_interactions", duplicates))
+    return actions
+
+
+def describe(action: Tuple[str, str, Any]) -> str:
+    kind, collection, detail = action
+    if kind == "extra":
+        return f"{kind:8} {collection}.{detail}"
+    if kind == "merge":
+        return f"{kind:8} {collection}: delete {detail} duplicate history documents, keeping the newest per user"
+    model = detail if kind == "create" else detail[1]
+    document = model.document
+    options = _options(document)
+    return f"{kind:8} {collection} {dict(document['key'])}" + (f" {options}" if options else "")
+
+
+def _duplicate_chat_logs(database):
+    # Newest first within each group
+    return database.chatbot_interactions.aggregate([
+        {"$sort": {"last_interaction": -1}},
+        {"$group": {"_id": "$user_id", "ids": {"$push": "$_id"}}},
+        {"$match": {"ids.1": {"$exists": True}}},
+    ], allowDiskUse=True)
+
+
+async def count_duplicate_chat_logs(database) -> int:
+    """How many history documents ``merge_duplicate_chat_logs`` would delete."""
+    return sum([len(group["ids"]) - 1 async for group in _duplicate_chat_logs(database)])
+
+
+async def merge_duplicate_chat_logs(database) -> int:
+    """Keep only the most recent history document per user so ``user_id`` can be unique.
+
+    Duplicates come from concurrent upserts before the index existed; each holds a full
+    snapshot of the history, so the newest one already has the latest turns.
+    """
+    removed = 0
+    async for group in _duplicate_chat_logs(database):
+        result = await database.chatbot_interactions.delete_many({"_id": {"$in": group["ids"][1:]}})
+        removed += result.deleted_count
+    return removed
+
+
+async def migrate(
+    database, drop_extra: bool = False, dry_run: bool = False, merge_duplicates: bool = False
+) -> List[Tuple[str, str, Any]]:
+    """Reconcile the database with ``INDEXES`` and return the actions taken.
+
+    Missing indexes of a collection are built with one ``createIndexes`` command, so
+    the collection is scanned once. On MongoDB 4.2+ builds only lock the collection
+    briefly at the start and end; ``background`` keeps older servers available too.
+    Indexes whose options changed are dropped and rebuilt, except TTL changes, which
+    are applied in place. A pending ``merge`` deletes documents, so unless
+    ``merge_duplicates`` is set it raises ``MergeRequired`` before anything changes.
+    """
+    actions = await plan(database)
+    if dry_run:
+        return actions
+
+    for kind, _, detail in actions:
+        if kind == "merge" and not merge_duplicates:
+            raise MergeRequired(detail)
+
+    creates: Dict[str, List[IndexModel]] = {}
+    for kind, collection, detail in actions:
+        print(describe((kind, collection, detail)))
+        if kind == "merge":
+            removed = await merge_duplicate_chat_logs(database)
+            print(f"Removed {removed} duplicate chat history documents")
+        elif kind == "create":
+            creates.setdefault(collection, []).append(_background(detail))
+        elif kind == "ttl":
+            name, model = detail
+            await database.db.command("collMod", collection, index={
+                "name": name, "expireAfterSeconds": model.document["expireAfterSeconds"]
+            })
+        elif kind == "rebuild":
+            name, model = detail
+            await database.db[collection].drop_index(name)
+            creates.setdefault(collection, []).append(_background(model))
+        elif kind == "extra" and drop_extra:
+            await database.db[collection].drop_index(detail)
+
+    for collection, models in creates.items():
+        try:
+            await database.db[collection].create_indexes(models)
+        except errors.OperationFailure as e:
+            raise Exception(f"Failed to create indexes on {collection}: {str(e)}")
+    return actions
+
+
+async def check(database):
+    """Warn at startup about indexes that ``manage.py migrate`` still has to build."""
+    try:
+        pending = [action for action in await plan(database, count_duplicates=False) if action[0] != "extra"]
+    except errors.PyMongoError as e:
+        print(f"Could not check indexes: {str(e)}")
+        return
+    if pending:
+        print(f"{len(pending)} index changes are pending; run `python manage.py migrate`:")
+        for action in pending:
+            print(f"  {describe(action)}")
+
+
+def _winning_stages(explain: Any) -> Iterator[str]:
+    """Stage names of every winning plan in an explain result, rejected plans excluded."""
+    if isinstance(explain, list):
+        for item in explain:
+            yield from _winning_stages(item)
+    elif isinstance(explain, dict):
+        for key, value in explain.items():
+            if key == "winningPlan":
+                yield from _stages(value)
+            elif key != "rejectedPlans":
+                yield from _winning_stages(value)
+
+
+def _stages(plan: Any) -> Iterator[str]:
+    if isinstance(plan, list):
+        for item in plan:
+            yield from _stages(item)
+    elif isinstance(plan, dict):
+        if "stage" in plan:
+            yield plan["stage"]
+        for value in plan.values():
+            yield from _stages(value)
+
+
+async def audit_queries(database) -> List[Dict[str, Any]]:
+    """``explain()`` every query in ``ROUTE_QUERIES``; ``collscan`` marks full collection scans."""
+    results = []
+    for query in ROUTE_QUERIES:
+        cursor = database.db[query["collection"]].find(query["filter"]).limit(20)
+        if query.get("sort"):
+            cursor = cursor.sort(query["sort"])
+        stages = list(dict.fromkeys(_winning_stages(await cursor.explain())))
+        results.append({
+            "route": query["route"],
+            "collection": query["collection"],
+            "filter": str(query["filter"]),
+            "stages": stages,
+            "collscan": "COLLSCAN" in stages,
+        })
+    return results
+
+
+async def report_query_audit(database):
+    try:
+        results = await audit_queries(database)
+    except errors.PyMongoError as e:
+        print(f"Query audit failed: {str(e)}")
+        return
+    for result in results:
+        if result["collscan"]:
+            print(f"COLLSCAN: {result['route']} on {result['collection']} {result['filter']}")
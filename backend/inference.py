@@ -0,0 +1,380 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from kv_cache import KVCache
+from response_cache import ResponseCache
+
+
+# Inference configuration
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "1"))
+INFERENCE_MAX_QUEUE = int(os.getenv("INFERENCE_MAX_QUEUE", "16"))
+INFERENCE_TIMEOUT_SECONDS = float(os.getenv("INFERENCE_TIMEOUT_SECONDS", "60"))
+INFERENCE_RETRY_AFTER_SECONDS = int(os.getenv("INFERENCE_RETRY_AFTER_SECONDS", "5"))
+INFERENCE_MAX_BATCH_SIZE = int(os.getenv("INFERENCE_MAX_BATCH_SIZE", "8"))
+INFERENCE_MAX_BATCH_WAIT_MS = float(os.getenv("INFERENCE_MAX_BATCH_WAIT_MS", "10"))
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "eager")
+
+
+class InferenceQueueFull(Exception):
+    """Raised when the inference queue cannot accept another request."""
+
+    def __init__(self, retry_after: int):
+        super().__init__("Inference queue is full")
+        self.retry_after = retry_after
+
+
+class InferenceTimeout(Exception):
+    """Raised when a generation does not finish within the configured timeout."""
+
+
+class InferenceWarmingUp(Exception):
+    """Raised when a generation is requested before the model has finished loading."""
+
+    def __init__(self, retry_after: int, error: Optional[str] = None):
+        super().__init__(error or "Model is still loading")
+        self.retry_after = retry_after
+        self.error = error
+
+
+class _PendingGeneration:
+    __slots__ = ("prompt", "future")
+
+    def __init__(self, prompt: str, future: asyncio.Future):
+        self.prompt = prompt
+        self.future = future
+
+
+class InferencePool:
+    """Owns the model backend and runs generations on dedicated worker threads.
+
+    The model is not loaded on construction: ``warm_up()`` imports torch/transformers
+    and loads the weights on a worker thread, and until it has finished every
+    generation is rejected with ``InferenceWarmingUp``.
+
+    The event loop only awaits the result, so auth, dashboard and other routes keep
+    being served while a generation is running. Requests beyond the worker count wait
+    in a bounded queue; once that is full new requests are rejected immediately.
+
+    Concurrent requests with the same generation parameters are micro-batched: the
+    scheduler collects prompts for up to ``max_batch_wait_ms`` (or until
+    ``max_batch_size`` is reached) and runs a single left-padded ``generate`` call.
+    Streaming generations bypass batching and occupy a worker on their own.
+
+    Requests that carry a ``cache_key`` (a user id) are decoded one at a time against
+    the per-user KV cache instead, so each conversation turn only prefills the tokens
+    appended since the previous turn, but is never batched with other requests.
+
+    With a ``response_cache``, identical greedy generations are answered from the
+    cache without being admitted at all.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        workers: int = INFERENCE_WORKERS,
+        max_queue: int = INFERENCE_MAX_QUEUE,
+        timeout: float = INFERENCE_TIMEOUT_SECONDS,
+        retry_after: int = INFERENCE_RETRY_AFTER_SECONDS,
+        max_batch_size: int = INFERENCE_MAX_BATCH_SIZE,
+        max_batch_wait_ms: float = INFERENCE_MAX_BATCH_WAIT_MS,
+        kv_cache: Optional[KVCache] = None,
+        response_cache: Optional[ResponseCache] = None,
+        backend_name: str = INFERENCE_BACKEND,
+    ):
+        self.model_name = model_name
+        self.backend_name = backend_name
+        self.workers = workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.retry_after = retry_after
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_batch_wait = max_batch_wait_ms / 1000
+        self.backend = None
+        self.load_error: Optional[str] = None
+        self.load_seconds: Optional[float] = None
+        self.kv_cache = kv_cache if kv_cache is not None else KVCache()
+        self.response_cache = response_cache
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="inference")
+        self._pending = 0
+        self._queues: Dict[Tuple[int, Optional[int]], List[_PendingGeneration]] = {}
+        self._wakeup: Optional[asyncio.Event] = None
+        self._batch_full: Optional[asyncio.Event] = None
+        self._scheduler: Optional[asyncio.Task] = None
+        self._free_workers: Optional[asyncio.Semaphore] = None
+        self._running_batches = set()
+
+    @property
+    def pending(self) -> int:
+        """Number of generations currently running or waiting for a worker."""
+        return self._pending
+
+    @property
+    def ready(self) -> bool:
+        return self.backend is not None
+
+    def load(self):
+        """Import the model runtime and load the weights; blocks the calling thread."""
+        started = time.perf_counter()
+        if self.backend_name == "stub":
+            from stub_backend import StubBackend
+
+            self.backend = StubBackend(self.model_name, timeout=self.timeout)
+        else:
+            from inference_backend import create_backend
+
+            self.backend = create_backend(self.backend_name, self.model_name, timeout=self.timeout)
+        self.load_seconds = time.perf_counter() - started
+
+    async def warm_up(self):
+        try:
+            await asyncio.get_running_loop().run_in_executor(self._executor, self.load)
+        except Exception as e:
+            self.load_error = str(e)
+            print(f"Error loading model {self.model_name}: {self.load_error}")
+
+    def _check_admission(self):
+        if self.backend is None:
+            raise InferenceWarmingUp(self.retry_after, self.load_error)
+        if self._pending >= self.workers * self.max_batch_size + self.max_queue:
+            raise InferenceQueueFull(self.retry_after)
+
+    def _ensure_scheduler(self):
+        if self._scheduler is None or self._scheduler.done():
+            self._wakeup = asyncio.Event()
+            self._batch_full = asyncio.Event()
+            self._free_workers = asyncio.Semaphore(self.workers)
+            self._scheduler = asyncio.get_running_loop().create_task(self._schedule())
+
+    async def _schedule(self):
+        while True:
+            await self._wakeup.wait()
+            # Hold off collecting while every worker is busy so waiting prompts form larger batches
+            await self._free_workers.acquire()
+            try:
+                await asyncio.wait_for(self._batch_full.wait(), timeout=self.max_batch_wait)
+            except asyncio.TimeoutError:
+                pass
+
+            key = next((k for k, queue in self._queues.items() if queue), None)
+            if key is None:
+                self._wakeup.clear()
+                self._free_workers.release()
+                continue
+
+            # Re-insert the key at the end so other generation parameters are not starved
+            queue = self._queues.pop(key)
+            batch = [item for item in queue[:self.max_batch_size] if not item.future.done()]
+            del queue[:self.max_batch_size]
+            self._queues[key] = queue
+            if not any(len(q) >= self.max_batch_size for q in self._queues.values()):
+                self._batch_full.clear()
+            if not any(self._queues.values()):
+                self._wakeup.clear()
+            if not batch:
+                self._free_workers.release()
+                continue
+
+            task = asyncio.get_running_loop().create_task(self._run_batch(key, batch))
+            self._running_batches.add(task)
+            task.add_done_callback(self._running_batches.discard)
+
+    async def _run_batch(self, key: Tuple[int, Optional[int]], batch: List[_PendingGeneration]):
+        max_length, truncate_prompt_to = key
+        try:
+            results = await asyncio.wrap_future(self._executor.submit(
+                self.backend.generate_batch, [item.prompt for item in batch], max_length, truncate_prompt_to
+            ))
+            for item, result in zip(batch, results):
+                if not item.future.done():
+                    item.future.set_result(result)
+        except Exception as e:
+            for item in batch:
+                if not item.future.done():
+                    item.future.set_exception(e)
+        finally:
+            self._free_workers.release()
+
+    async def _submit_exclusive(self, fn, *args):
+        """Wait for a free worker and run ``fn`` on it outside of the batch scheduler."""
+        try:
+            await asyncio.wait_for(self._free_workers.acquire(), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            raise InferenceTimeout(f"No inference worker became free within {self.timeout:.0f}s")
+
+        loop = asyncio.get_running_loop()
+        try:
+            future = self._executor.submit(fn, *args)
+        except RuntimeError:
+            self._free_workers.release()
+            raise
+        future.add_done_callback(lambda f: loop.call_soon_threadsafe(self._free_workers.release))
+        return future
+
+    def _response_key(self, prompt: str, max_length: int, truncate_prompt_to: Optional[int]) -> Optional[str]:
+        if self.response_cache is None:
+            return None
+        params = {"max_length": max_length, "truncate_prompt_to": truncate_prompt_to}
+        return ResponseCache.key(self.model_name, self.backend_name, params, prompt)
+
+    async def generate(
+        self,
+        prompt: str,
+        max_length: int,
+        truncate_prompt_to: Optional[int] = None,
+        cache_key: Optional[str] = None,
+    ) -> str:
+        response_key = self._response_key(prompt, max_length, truncate_prompt_to)
+        if response_key is not None:
+            cached = await self.response_cache.get(response_key)
+            if cached is not None:
+                return cached
+
+        self._check_admission()
+
+        self._ensure_scheduler()
+        self._pending += 1
+        try:
+            started = time.perf_counter()
+            response = await self._generate(prompt, max_length, truncate_prompt_to, cache_key)
+            elapsed = time.perf_counter() - started
+        finally:
+            self._pending -= 1
+
+        # A generation cut short by max_time is not the deterministic result
+        if response_key is not None and elapsed < self.timeout:
+            await self.response_cache.put(response_key, response, elapsed)
+        return response
+
+    async def _generate(
+        self,
+        prompt: str,
+        max_length: int,
+        truncate_prompt_to: Optional[int],
+        cache_key: Optional[str],
+    ) -> str:
+        if cache_key is not None and self.kv_cache.enabled:
+            future = await self._submit_exclusive(
+                self.backend.generate_cached,
+                prompt,
+                max_length,
+                truncate_prompt_to,
+                self.kv_cache,
+                cache_key,
+            )
+            try:
+                return await asyncio.wait_for(asyncio.wrap_future(future), timeout=self.timeout)
+            except asyncio.TimeoutError:
+                raise InferenceTimeout(f"Generation exceeded {self.timeout:.0f}s")
+
+        future = asyncio.get_running_loop().create_future()
+        queue = self._queues.setdefault((max_length, truncate_prompt_to), [])
+        queue.append(_PendingGeneration(prompt, future))
+        self._wakeup.set()
+        if len(queue) >= self.max_batch_size:
+            self._batch_full.set()
+        try:
+            return await asyncio.wait_for(future, timeout=self.timeout)
+        except asyncio.TimeoutError:
+            # The scheduler skips cancelled entries that have not been batched yet
+            raise InferenceTimeout(f"Generation exceeded {self.timeout:.0f}s")
+
+    async def stream(
+        self,
+        prompt: str,
+        max_length: int,
+        truncate_prompt_to: Optional[int] = None,
+        cache_key: Optional[str] = None,
+    ) -> AsyncIterator[str]:
+        """Check admission for a streaming generation and return an iterator over its decoded text.
+
+        The check happens here so that a full queue can still be reported to the client
+        as an error status. The slot is only taken when iteration starts, so an iterator
+        that is never consumed holds nothing; admission is checked again at that point
+        and ``InferenceQueueFull`` can also be raised from the first iteration.
+        """
+        response_key = self._response_key(prompt, max_length, truncate_prompt_to)
+        if response_key is not None:
+            cached = await self.response_cache.get(response_key)
+            if cached is not None:
+                return self._replay(cached)
+
+        self._check_admission()
+
+        self._ensure_scheduler()
+        return self._stream(prompt, max_length, truncate_prompt_to, cache_key, response_key)
+
+    async def _replay(self, response: str) -> AsyncIterator[str]:
+        yield response
+
+    async def _stream(
+        self,
+        prompt: str,
+        max_length: int,
+        truncate_prompt_to: Optional[int],
+        cache_key: Optional[str],
+        response_key: Optional[str],
+    ) -> AsyncIterator[str]:
+        self._check_admission()
+        self._pending += 1
+        loop = asyncio.get_running_loop()
+        chunks: asyncio.Queue = asyncio.Queue()
+        cancelled = threading.Event()
+        streamer = self.backend.make_streamer(loop, chunks)
+        parts = []
+        started = time.perf_counter()
+        try:
+            if cache_key is not None and self.kv_cache.enabled:
+                future = await self._submit_exclusive(
+                    self.backend.generate_cached,
+                    prompt,
+                    max_length,
+                    truncate_prompt_to,
+                    self.kv_cache,
+                    cache_key,
+                    streamer,
+                    cancelled,
+                )
+            else:
+                future = await self._submit_exclusive(
+                    self.backend.generate_streaming, prompt, max_length, truncate_prompt_to, streamer, cancelled
+                )
+            future.add_done_callback(lambda f: loop.call_soon_threadsafe(chunks.put_nowait, None))
+
+            while True:
+                chunk = await chunks.get()
+                if chunk is None:
+                    break
+                parts.append(chunk)
+                yield chunk
+            future.result()
+        finally:
+            # Also reached when the client disconnects mid-stream
+            cancelled.set()
+            self._pending -= 1
+
+        # Only reached when the stream ran to completion
+        elapsed = time.perf_counter() - started
+        if response_key is not None and elapsed < self.timeout:
+            await self.response_cache.put(response_key, "".join(parts), elapsed)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "backend": self.backend_name,
+            "load_seconds": self.load_seconds,
+            "pending": self._pending,
+            "workers": self.workers,
+            "max_queue": self.max_queue,
+            "max_batch_size": self.max_batch_size,
+            "kv_cache": self.kv_cache.stats(),
+            "response_cache": self.response_cache.stats() if self.response_cache is not None else None,
+        }
+
+    def shutdown(self):
+        if self._scheduler is not None:
+            self._scheduler.cancel()
+        self._executor.shutdown(wait=False, cancel_futures=True)
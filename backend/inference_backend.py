@@ -0,0 +1,314 @@
+import asyncio
+import fcntl
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Type
+
+import torch
+from transformers import AutoConfig, AutoModelForCausalLM, AutoTokenizer, StoppingCriteria, StoppingCriteriaList, TextStreamer
+from transformers.pytorch_utils import Conv1D
+
+from kv_cache import KVCache
+from metrics import observe_generation
+
+
+class QueueStreamer(TextStreamer):
+    """Forwards decoded text from a worker thread to an asyncio queue."""
+
+    def __init__(self, tokenizer, loop: asyncio.AbstractEventLoop, queue: asyncio.Queue):
+        super().__init__(tokenizer, skip_prompt=False, skip_special_tokens=True)
+        self.loop = loop
+        self.queue = queue
+
+    def on_finalized_text(self, text: str, stream_end: bool = False):
+        if text:
+            self.loop.call_soon_threadsafe(self.queue.put_nowait, text)
+
+
+class _CancelledCriteria(StoppingCriteria):
+    """Stops a generation once its client has gone away."""
+
+    def __init__(self, cancelled: threading.Event):
+        self.cancelled = cancelled
+
+    def __call__(self, input_ids, scores, **kwargs) -> bool:
+        return self.cancelled.is_set()
+
+
+class _TimingCriteria(StoppingCriteria):
+    """Notes when prefill ends (the first call, after the first token) and counts steps."""
+
+    def __init__(self):
+        self.prefill_done: Optional[float] = None
+        self.steps = 0
+
+    def __call__(self, input_ids, scores, **kwargs) -> bool:
+        if self.prefill_done is None:
+            self.prefill_done = time.perf_counter()
+        self.steps += 1
+        return False
+
+    def observe(self, mode: str, started: float, tokenized: float, rows: int = 1):
+        finished = time.perf_counter()
+        prefill_done = self.prefill_done or finished
+        observe_generation(mode, tokenized - started, prefill_done - tokenized, finished - prefill_done, self.steps * rows)
+
+
+# Inference backend configuration
+INFERENCE_TORCH_THREADS = int(os.getenv("INFERENCE_TORCH_THREADS", "0"))
+INFERENCE_SHARED_WEIGHTS_PATH = os.getenv("INFERENCE_SHARED_WEIGHTS_PATH", "")
+
+
+def export_shared_weights(model_name: str, path: str) -> None:
+    """Write the model state dict to ``path`` once, even with several workers racing."""
+    with open(f"{path}.lock", "w") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        if os.path.exists(path):
+            return
+        model = AutoModelForCausalLM.from_pretrained(model_name)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        torch.save(model.state_dict(), tmp_path)
+        os.replace(tmp_path, path)
+
+
+@contextmanager
+def _meta_parameters():
+    """Create module parameters on the meta device while keeping buffers real.
+
+    Non-persistent buffers such as GPT-2's causal mask are not part of the state dict,
+    so they have to be materialized by the constructors as usual.
+    """
+    register_parameter = torch.nn.Module.register_parameter
+
+    def register_meta_parameter(module, name, param):
+        register_parameter(module, name, param)
+        if param is not None:
+            param = module._parameters[name]
+            module._parameters[name] = type(param)(param.to("meta"), requires_grad=param.requires_grad)
+
+    torch.nn.Module.register_parameter = register_meta_parameter
+    try:
+        yield
+    finally:
+        torch.nn.Module.register_parameter = register_parameter
+
+
+def load_shared_model(model_name: str, path: str):
+    """Build the model around memory-mapped weights.
+
+    Every worker maps the same file, so the weight pages live once in the page cache
+    (or in RAM when ``path`` is on /dev/shm) and are shared read-only between workers.
+    """
+    if not os.path.exists(path):
+        export_shared_weights(model_name, path)
+
+    config = AutoConfig.from_pretrained(model_name)
+    with _meta_parameters():
+        model = AutoModelForCausalLM.from_config(config)
+    model.load_state_dict(torch.load(path, mmap=True, weights_only=True), assign=True)
+    model.tie_weights()
+    if any(param.is_meta for param in model.parameters()):
+        raise RuntimeError(f"Shared weights at {path} do not cover every parameter of {model_name}")
+    return model
+
+
+def load_model(model_name: str):
+    if INFERENCE_SHARED_WEIGHTS_PATH:
+        return load_shared_model(model_name, INFERENCE_SHARED_WEIGHTS_PATH)
+    return AutoModelForCausalLM.from_pretrained(model_name)
+
+
+class TorchBackend:
+    """PyTorch eager backend: tokenizer plus causal LM, and the generation entry points
+    the inference pool calls. Other backends only change how ``self.model`` is prepared.
+
+    Importing this module pulls in torch and transformers, so the pool only imports it
+    from its warm-up job.
+    """
+
+    def __init__(self, model_name: str, timeout: float):
+        self.model_name = model_name
+        self.timeout = timeout
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        # GPT-2 has no pad token; left padding keeps every prompt adjacent to its continuation
+        self.tokenizer.pad_token = self.tokenizer.eos_token
+        self.tokenizer.padding_side = "left"
+        self.model = self.prepare_model(load_model(model_name).eval())
+
+    def prepare_model(self, model):
+        return model
+
+    def make_streamer(self, loop: asyncio.AbstractEventLoop, queue: asyncio.Queue) -> QueueStreamer:
+        return QueueStreamer(self.tokenizer, loop, queue)
+
+    def _tokenize(self, prompt: str, truncate_prompt_to: Optional[int]):
+        if truncate_prompt_to:
+            return self.tokenizer(prompt, return_tensors="pt", max_length=truncate_prompt_to, truncation=True)
+        return self.tokenizer(prompt, return_tensors="pt")
+
+    def generate_batch(self, prompts: List[str], max_length: int, truncate_prompt_to: Optional[int]) -> List[str]:
+        started = time.perf_counter()
+        if truncate_prompt_to:
+            inputs = self.tokenizer(
+                prompts, return_tensors="pt", padding=True, max_length=truncate_prompt_to, truncation=True
+            )
+        else:
+            inputs = self.tokenizer(prompts, return_tensors="pt", padding=True)
+
+        # max_length applies per prompt, so give each row the budget it would have had on its own
+        padded_length = inputs["input_ids"].shape[1]
+        prompt_lengths = inputs["attention_mask"].sum(dim=1).tolist()
+        budgets = [max(1, max_length - length) for length in prompt_lengths]
+
+        timing = _TimingCriteria()
+        tokenized = time.perf_counter()
+        output = self.model.generate(
+            **inputs,
+            max_new_tokens=max(budgets),
+            num_return_sequences=1,
+            pad_token_id=self.tokenizer.eos_token_id,
+            # Stop decoding on the worker itself once the request has timed out
+            max_time=self.timeout,
+            stopping_criteria=StoppingCriteriaList([timing]),
+        )
+        timing.observe("batch", started, tokenized, rows=len(prompts))
+        return [
+            self.tokenizer.decode(row[:padded_length + budget], skip_special_tokens=True)
+            for row, budget in zip(output, budgets)
+        ]
+
+    def generate_streaming(
+        self,
+        prompt: str,
+        max_length: int,
+        truncate_prompt_to: Optional[int],
+        streamer: TextStreamer,
+        cancelled: threading.Event,
+    ):
+        started = time.perf_counter()
+        inputs = self._tokenize(prompt, truncate_prompt_to)
+        timing = _TimingCriteria()
+        tokenized = time.perf_counter()
+        self.model.generate(
+            **inputs,
+            max_length=max_length,
+            num_return_sequences=1,
+            pad_token_id=self.tokenizer.eos_token_id,
+            max_time=self.timeout,
+            streamer=streamer,
+            stopping_criteria=StoppingCriteriaList([_CancelledCriteria(cancelled), timing]),
+        )
+        timing.observe("stream", started, tokenized)
+
+    @torch.no_grad()
+    def generate_cached(
+        self,
+        prompt: str,
+        max_length: int,
+        truncate_prompt_to: Optional[int],
+        kv_cache: KVCache,
+        cache_key: str,
+        streamer: Optional[TextStreamer] = None,
+        cancelled: Optional[threading.Event] = None,
+    ) -> str:
+        """Greedy decoding that starts from, and refreshes, the cached KV of ``cache_key``."""
+        deadline = time.monotonic() + self.timeout
+        started = time.perf_counter()
+        input_ids = self._tokenize(prompt, truncate_prompt_to)["input_ids"][0].tolist()
+        tokenized = time.perf_counter()
+        if streamer is not None:
+            streamer.put(torch.tensor([input_ids]))
+
+        hit = kv_cache.lookup(cache_key, input_ids)
+        if hit is not None:
+            prefix_length, past_key_values = hit
+        else:
+            prefix_length, past_key_values = 0, None
+
+        token_ids = list(input_ids)
+        to_feed = input_ids[prefix_length:]
+        prefill_done = None
+        for _ in range(max(1, max_length - len(input_ids))):
+            outputs = self.model(
+                input_ids=torch.tensor([to_feed]), past_key_values=past_key_values, use_cache=True
+            )
+            past_key_values = outputs.past_key_values
+            next_token = int(outputs.logits[0, -1].argmax())
+            token_ids.append(next_token)
+            if prefill_done is None:
+                prefill_done = time.perf_counter()
+            if streamer is not None:
+                streamer.put(torch.tensor([next_token]))
+            if next_token == self.tokenizer.eos_token_id or time.monotonic() > deadline:
+                break
+            if cancelled is not None and cancelled.is_set():
+                break
+            to_feed = [next_token]
+
+        finished = time.perf_counter()
+        observe_generation(
+            "cached", tokenized - started, prefill_done - tokenized, finished - prefill_done, len(token_ids) - len(input_ids)
+        )
+
+        # The last sampled token has not been fed through the model yet
+        kv_cache.store(cache_key, token_ids[:-1], past_key_values)
+        if streamer is not None:
+            streamer.end()
+        return self.tokenizer.decode(token_ids, skip_special_tokens=True)
+
+
+def _conv1d_to_linear(module: torch.nn.Module) -> torch.nn.Module:
+    """Replace GPT-2's Conv1D projections with equivalent nn.Linear layers.
+
+    Conv1D stores its weight as (in_features, out_features); dynamic quantization only
+    targets nn.Linear, so without this the transformer blocks would stay in fp32.
+    """
+    for name, child in module.named_children():
+        if isinstance(child, Conv1D):
+            in_features, out_features = child.weight.shape
+            linear = torch.nn.Linear(in_features, out_features)
+            linear.weight.data = child.weight.data.t().contiguous()
+            linear.bias.data = child.bias.data
+            setattr(module, name, linear)
+        else:
+            _conv1d_to_linear(child)
+    return module
+
+
+class DynamicInt8Backend(TorchBackend):
+    """Linear layers quantized to int8 weights with activations quantized on the fly.
+
+    Quantization produces new per-worker tensors, so shared weights only save the
+    fp32 copy that would otherwise be loaded before quantizing.
+    """
+
+    def prepare_model(self, model):
+        return torch.quantization.quantize_dynamic(_conv1d_to_linear(model), {torch.nn.Linear}, dtype=torch.qint8)
+
+
+class CompiledBackend(TorchBackend):
+    """Model forward compiled with ``torch.compile`` and dynamic shapes.
+
+    The first generations of each new shape pay the compilation cost.
+    """
+
+    def prepare_model(self, model):
+        model.forward = torch.compile(model.forward, dynamic=True)
+        return model
+
+
+BACKENDS: Dict[str, Type[TorchBackend]] = {
+    "eager": TorchBackend,
+    "int8": DynamicInt8Backend,
+    "compile": CompiledBackend,
+}
+
+
+def create_backend(name: str, model_name: str, timeout: float) -> TorchBackend:
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown inference backend '{name}'. Choose one of: {', '.join(BACKENDS)}")
+    if INFERENCE_TORCH_THREADS > 0:
+        torch.set_num_threads(INFERENCE_TORCH_THREADS)
+    return BACKENDS[name](model_name, timeout=timeout)
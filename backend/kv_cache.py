@@ -0,0 +1,120 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+
+# KV cache configuration
+KV_CACHE_MAX_BYTES = int(os.getenv("KV_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+KV_CACHE_MAX_ENTRY_BYTES = int(os.getenv("KV_CACHE_MAX_ENTRY_BYTES", str(64 * 1024 * 1024)))
+# Shorter shared prefixes (e.g. just "User:") save next to nothing and count as misses
+KV_CACHE_MIN_PREFIX_TOKENS = int(os.getenv("KV_CACHE_MIN_PREFIX_TOKENS", "16"))
+
+
+def past_nbytes(past_key_values) -> int:
+    return sum(tensor.element_size() * tensor.nelement() for layer in past_key_values for tensor in layer)
+
+
+def slice_past(past_key_values, length: int):
+    """Keep the first ``length`` positions of a (key, value) per-layer cache."""
+    return tuple(
+        tuple(tensor[:, :, :length, :] for tensor in layer)
+        for layer in past_key_values
+    )
+
+
+def common_prefix_length(a: Sequence[int], b: Sequence[int]) -> int:
+    length = 0
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        length += 1
+    return length
+
+
+class KVCache:
+    """Per-user cache of ``past_key_values`` for the last processed conversation.
+
+    Each key holds the token ids that were fed through the model together with their
+    attention key/value tensors. A lookup returns the cached tensors for the longest
+    common token prefix with the new input, so a new turn only prefills what was
+    appended since. Entries are evicted least-recently-used once the total byte
+    budget is exceeded.
+
+    The prompt only keeps the last ``CHAT_HISTORY_MAX_MESSAGES`` messages, so once a
+    conversation is longer than that its oldest turn drops out and the prefix no
+    longer matches; the cache then pays off for the first turns of a conversation only.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = KV_CACHE_MAX_BYTES,
+        max_entry_bytes: int = KV_CACHE_MAX_ENTRY_BYTES,
+        min_prefix_tokens: int = KV_CACHE_MIN_PREFIX_TOKENS,
+    ):
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = min(max_entry_bytes, max_bytes)
+        self.min_prefix_tokens = max(1, min_prefix_tokens)
+        self._entries: "OrderedDict[str, Tuple[List[int], Any, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes_used = 0
+        self.hits = 0
+        self.misses = 0
+        self.reused_tokens = 0
+        self.evictions = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def lookup(self, key: str, input_ids: Sequence[int]) -> Optional[Tuple[int, Any]]:
+        """Return ``(prefix_length, past_key_values)`` for the reusable prefix of ``input_ids``."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                token_ids, past, _ = entry
+                # At least one token has to be fed to get next-token logits
+                prefix_length = min(common_prefix_length(token_ids, input_ids), len(input_ids) - 1)
+                if prefix_length >= self.min_prefix_tokens:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    self.reused_tokens += prefix_length
+                    return prefix_length, slice_past(past, prefix_length)
+            self.misses += 1
+            return None
+
+    def store(self, key: str, token_ids: List[int], past_key_values) -> None:
+        nbytes = past_nbytes(past_key_values)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.bytes_used -= previous[2]
+            if nbytes > self.max_entry_bytes:
+                return
+            self._entries[key] = (list(token_ids), past_key_values, nbytes)
+            self.bytes_used += nbytes
+            while self.bytes_used > self.max_bytes and self._entries:
+                _, (_, _, evicted_bytes) = self._entries.popitem(last=False)
+                self.bytes_used -= evicted_bytes
+                self.evictions += 1
+
+    def invalidate(self, key: str) -> None:
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self.bytes_used -= entry[2]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes_used": self.bytes_used,
+                "max_bytes": self.max_bytes,
+                "min_prefix_tokens": self.min_prefix_tokens,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "reused_tokens": self.reused_tokens,
+                "evictions": self.evictions,
+            }
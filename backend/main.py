@@ -1,23 +1,40 @@
-from fastapi import FastAPI, Request, Depends, HTTPException, status
-from fastapi.responses import RedirectResponse, HTMLResponse
+from fastapi import FastAPI, Request, Depends, HTTPException, Query, status
+from fastapi.responses import RedirectResponse, HTMLResponse, StreamingResponse, JSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
-from pymongo import MongoClient, errors
+from pymongo import errors, ReturnDocument
 from starlette.config import Config
 from starlette.middleware.sessions import SessionMiddleware
 import urllib.parse
-import requests
 import jwt
+import httpx
 from datetime import datetime, timedelta
 import os
 from dotenv import load_dotenv
 from pydantic import BaseModel, Field, field_validator
 from typing import List, Optional, Dict, Any
 from bson import ObjectId
-from passlib.context import CryptContext
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from fastapi.openapi.utils import get_openapi
 import time
-from transformers import AutoModelForCausalLM, AutoTokenizer
+import json
+import secrets
+from contextlib import asynccontextmanager, contextmanager
+import asyncio
+from inference import InferencePool, InferenceQueueFull, InferenceTimeout, InferenceWarmingUp
+from response_cache import ResponseCache, RESPONSE_CACHE_SHARED
+from database import Database
+from cache import LRUCache
+from stats import DashboardStats
+from topics import TopicGraph
+from search import SEARCH_EMBEDDING_MODEL, SearchIndex, VectorIndex, load_embedder
+from grading import GradingDisabled, GradingEngine, GradingQueueFull
+import metrics
+import indexes
+from profiler import SamplingProfiler, ProfileHeaderMiddleware, ProfilerBusy, PROFILE_MAX_SECONDS
+from rate_limit import RateLimiter, RATE_LIMIT_BACKEND, create_backend as create_rate_limit_backend
+from pagination import PAGE_DEFAULT_LIMIT, PAGE_MAX_LIMIT, fetch_page, stream_ndjson
+from passwords import PasswordHasher, TooManyFailedAttempts
+from google_oauth import GoogleOAuthClient, InvalidIDToken, GOOGLE_AUTH_URL
 
 
 # Load and validate environment variables
@@ -37,11 +54,57 @@ for var, desc in required_env_vars.items():
 
 config = Config(".env")
 
+async def start_in_background(name: str, start):
+    try:
+        await start()
+    except Exception as e:
+        print(f"Error starting {name}: {str(e)}")
+
+async def start_search_index():
+    # Loading the embedding model takes seconds, so it runs on a thread; without it
+    # the index still serves BM25 matches
+    if SEARCH_EMBEDDING_MODEL:
+        try:
+            embedder = await asyncio.get_running_loop().run_in_executor(None, load_embedder)
+        except Exception as e:
+            print(f"Error loading embedding model '{SEARCH_EMBEDDING_MODEL}', semantic search is disabled: {str(e)}")
+            embedder = None
+        if embedder is not None:
+            search_index.vectors = VectorIndex(embedder)
+    await search_index.start()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await database.ping()  # Test connection
+    # Indexes are built by `python manage.py migrate`; this only warns about missing ones
+    await indexes.check(database)
+    if indexes.QUERY_AUDIT:
+        asyncio.create_task(indexes.report_query_audit(database))
+    # Load the model, search index and topic graph in the background so requests are
+    # served right away; until then chat has no grounding or topic suggestions
+    background = [
+        asyncio.create_task(inference_pool.warm_up()),
+        asyncio.create_task(start_in_background("topic graph", topic_graph.start)),
+        asyncio.create_task(start_in_background("search index", start_search_index)),
+    ]
+    await grading_engine.start()
+    yield
+    for task in background:
+        task.cancel()
+    topic_graph.stop()
+    search_index.stop()
+    await grading_engine.stop()
+    inference_pool.shutdown()
+    password_hasher.shutdown()
+    await google_oauth.aclose()
+    database.close()
+
 # Create FastAPI app instance at module level
 app = FastAPI(
     title="AI RubberDucker API",
     description="API for AI RubberDucker - A programming learning platform",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
@@ -59,26 +122,35 @@ app.add_middleware(
 # Session middleware for temporary storage
 app.add_middleware(SessionMiddleware, secret_key=os.getenv("JWT_SECRET_KEY"))
 
-# MongoDB connection with error handling
-try:
-    client = MongoClient(os.getenv('MONGODB_URL'), serverSelectionTimeoutMS=5000)
-    client.server_info()  # Test connection
-except errors.ServerSelectionTimeoutError:
-    raise Exception("Could not connect to MongoDB server")
-except errors.ConnectionFailure:
-    raise Exception("MongoDB connection failed")
+# Tags requests that opt into a header-mode profile; a no-op otherwise
+profiler = SamplingProfiler()
+app.add_middleware(ProfileHeaderMiddleware, profiler=profiler)
 
-db = client['airubberduckerdb']
+# Outermost, so request latency covers every other middleware
+app.add_middleware(metrics.MetricsMiddleware)
+
+# MongoDB connection (async driver; connectivity is checked in the lifespan)
+database = Database(os.getenv('MONGODB_URL'), event_listeners=[metrics.CommandMetrics()])
 
 # Collections
-users_collection = db['users']
-subscription_collection = db['subscription']
-chatbot_interactions_collection = db['chatbot_interactions']
-coding_exercises_collection = db['coding_exercises']
-user_feedback_collection = db['user_feedback']
-code_submissions_collection = db['code_submissions']
-study_materials_collection = db['study_materials']
-learning_paths_collection = db['learning_paths']
+users_collection = database.users
+subscription_collection = database.subscription
+chatbot_interactions_collection = database.chatbot_interactions
+coding_exercises_collection = database.coding_exercises
+user_feedback_collection = database.user_feedback
+code_submissions_collection = database.code_submissions
+study_materials_collection = database.study_materials
+learning_paths_collection = database.learning_paths
+response_cache_collection = database.response_cache
+
+# Pre-aggregated dashboard counters
+dashboard_stats = DashboardStats(database)
+topic_graph = TopicGraph(database)
+search_index = SearchIndex(database)
+grading_engine = GradingEngine(database, dashboard_stats)
+
+metrics.register_stats("grading", grading_engine.stats)
+metrics.register_stats("search", search_index.stats)
 
 # Constants
 GOOGLE_CLIENT_ID = os.getenv('GOOGLE_CLIENT_ID')
@@ -88,51 +160,22 @@ FRONTEND_URL = os.getenv('FRONTEND_URL', 'http://localhost:5173')
 SECRET_KEY = os.getenv("JWT_SECRET_KEY")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60
+USER_CACHE_TTL_SECONDS = int(os.getenv("USER_CACHE_TTL_SECONDS", "30"))
+USER_CACHE_MAX_ENTRIES = int(os.getenv("USER_CACHE_MAX_ENTRIES", "10000"))
+TOKEN_CACHE_MAX_ENTRIES = int(os.getenv("TOKEN_CACHE_MAX_ENTRIES", "10000"))
+# Also the prompt window: past this many messages the prompt's start moves every turn,
+# so the KV cache stops matching its prefix
+CHAT_HISTORY_MAX_MESSAGES = int(os.getenv("CHAT_HISTORY_MAX_MESSAGES", "10"))
+# Non-streamed chat turns that reuse the KV cache run one at a time instead of being
+# micro-batched; streamed turns always reuse it, as they never share a batch
+CHAT_KV_CACHE = os.getenv("CHAT_KV_CACHE", "false").lower() == "true"
+RETRIEVAL_TIMEOUT_SECONDS = float(os.getenv("RETRIEVAL_TIMEOUT_SECONDS", "1.0"))
+LOG_CHAT_STAGES = os.getenv("LOG_CHAT_STAGES", "true").lower() == "true"
+GROUNDING_SNIPPET_CHARS = int(os.getenv("GROUNDING_SNIPPET_CHARS", "200"))
 
 # Security
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-# Initialize collections with indexes
-def init_db():
-    try:
-        # Users collection
-        users_collection.create_index([("email", 1)], unique=True)
-        users_collection.create_index([("username", 1)], unique=True)
-        users_collection.create_index([("status", 1)])
-        
-        # Subscription collection
-        subscription_collection.create_index([("user_id", 1)])
-        subscription_collection.create_index([("plantype", 1)])
-        
-        # Chatbot Interactions collection
-        chatbot_interactions_collection.create_index([("user_id", 1)])
-        chatbot_interactions_collection.create_index([("timestamp", 1)])
-        
-        # Coding Exercises collection
-        coding_exercises_collection.create_index([("material_category", 1)])
-        coding_exercises_collection.create_index([("difficulty_level", 1)])
-        
-        # User Feedback collection
-        user_feedback_collection.create_index([("user_id", 1)])
-        user_feedback_collection.create_index([("feedback_timestamp", 1)])
-        
-        # Code Submissions collection
-        code_submissions_collection.create_index([("user_id", 1)])
-        code_submissions_collection.create_index([("exercise_id", 1)])
-        code_submissions_collection.create_index([("submission_date", 1)])
-        
-        # Study Materials collection
-        study_materials_collection.create_index([("category", 1)])
-        study_materials_collection.create_index([("difficulty_level", 1)])
-        study_materials_collection.create_index([("content_type", 1)])
-        
-        # Learning Paths collection
-        learning_paths_collection.create_index([("title", 1)], unique=True)
-        learning_paths_collection.create_index([("difficulty_level", 1)])
-    except errors.OperationFailure as e:
-        raise Exception(f"Failed to create indexes: {str(e)}")
-
-init_db()
+password_hasher = PasswordHasher()
+google_oauth = GoogleOAuthClient(GOOGLE_CLIENT_ID, GOOGLE_CLIENT_SECRET, GOOGLE_REDIRECT_URI)
 
 # Models with validation
 class UserBase(BaseModel):
@@ -178,6 +221,42 @@ class User(UserBase):
     class Config:
         from_attributes = True
 
+class UserSummary(BaseModel):
+    # Describes stored users as they are; UserBase's rules apply to input, and a
+    # document that predates them must not fail the whole admin listing
+    id: str
+    username: str = ""
+    email: str = ""
+    verified: bool = False
+    subscription_id: Optional[str] = None
+    interactioncount: int = 0
+    maxdailyinteractions: int = 3
+    preferences: str = ""
+    progress: str = ""
+    role: str = "user"
+    status: str = "active"
+    created_at: Optional[datetime] = None
+
+class UserPage(BaseModel):
+    items: List[UserSummary]
+    next_cursor: Optional[str] = None
+
+class LoginRequest(BaseModel):
+    email: str
+    password: str
+
+class RegisterRequest(BaseModel):
+    email: str = Field(..., pattern=r"^[a-zA-Z0-9._%+-]+@[a-zA-Z0-9.-]+\.[a-zA-Z]{2,}$")
+    password: str = Field(..., min_length=8)
+    firstName: Optional[str] = None
+    lastName: Optional[str] = None
+
+    @field_validator('password')
+    @classmethod
+    def validate_password_strength(cls, v: str) -> str:
+        validate_password(v)
+        return v
+
 class Subscription(BaseModel):
     id: str
     user_id: str
@@ -221,6 +300,11 @@ class CodeSubmission(BaseModel):
     score: Optional[int] = Field(None, ge=0, le=100)
     feedback: Optional[str] = None
 
+class SubmissionRequest(BaseModel):
+    exercise_id: str
+    code: str = Field(..., min_length=1, max_length=64 * 1024)
+    language: str = Field("python", pattern=r"^(python|javascript|java|c\+\+)$")
+
 class StudyMaterial(BaseModel):
     id: str
     title: str
@@ -274,18 +358,21 @@ def validate_password(password: str) -> None:
     if not any(c in "!@#$%^&*()_+-=[]{}|;:,.<>?" for c in password):
         raise ValueError("Password must contain at least one special character")
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
+async def verify_password(email: str, plain_password: str, hashed_password: Optional[str]) -> tuple:
+    """Returns (valid, replacement hash or None); see PasswordHasher.verify."""
     try:
-        return pwd_context.verify(plain_password, hashed_password)
+        return await password_hasher.verify(email, plain_password, hashed_password)
+    except TooManyFailedAttempts:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Password verification failed: {str(e)}"
         )
 
-def get_password_hash(password: str) -> str:
+async def get_password_hash(password: str) -> str:
     try:
-        return pwd_context.hash(password)
+        return await password_hasher.hash(password)
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -305,6 +392,25 @@ def create_access_token(data: dict) -> str:
             detail=f"Token creation failed: {str(e)}"
         )
 
+# Decoded JWT payloads, each kept until its own expiry
+token_cache = LRUCache(TOKEN_CACHE_MAX_ENTRIES)
+# Resolved user documents keyed by token subject (email)
+user_cache = LRUCache(USER_CACHE_MAX_ENTRIES, ttl_seconds=USER_CACHE_TTL_SECONDS)
+
+def decode_access_token(token: str) -> Dict[str, Any]:
+    payload = token_cache.get(token)
+    if payload is None:
+        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        if payload.get("exp"):
+            ttl = payload["exp"] - time.time()
+            if ttl > 0:
+                token_cache.set(token, payload, ttl_seconds=ttl)
+    return payload
+
+def invalidate_cached_user(email: Optional[str]) -> None:
+    if email:
+        user_cache.pop(email)
+
 async def get_current_user(token: str = Depends(oauth2_scheme)) -> Dict[str, Any]:
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -312,7 +418,7 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> Dict[str, Any
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = decode_access_token(token)
         email: str = payload.get("sub")
         if email is None:
             raise credentials_exception
@@ -320,61 +426,103 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> Dict[str, Any
     except jwt.JWTError:
         raise credentials_exception
     
+    user = user_cache.get(token_data.email)
+    if user is not None:
+        return dict(user)
+
     try:
-        user = users_collection.find_one({"email": token_data.email})
+        user = await users_collection.find_one({"email": token_data.email})
         if user is None:
             raise credentials_exception
         user["id"] = str(user["_id"])  # Convert ObjectId to string
-        return user
+        user_cache.set(token_data.email, user)
+        # Hand out a copy so callers cannot mutate the cached document
+        return dict(user)
     except errors.PyMongoError as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Database error: {str(e)}"
         )
 
-# Simple in-memory rate limiter
-class RateLimiter:
-    def __init__(self, times: int, minutes: int):
-        self.times = times
-        self.minutes = minutes
-        self.requests = {}
-
-    async def check(self, key: str):
-        current_time = time.time()
-        if key not in self.requests:
-            self.requests[key] = []
-        
-        # Remove old requests
-        self.requests[key] = [t for t in self.requests[key] if current_time - t < self.minutes * 60]
-        
-        if len(self.requests[key]) >= self.times:
-            raise HTTPException(
-                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                detail="Too many requests"
-            )
-        
-        self.requests[key].append(current_time)
+# Rate limiters (shared across workers with RATE_LIMIT_BACKEND=mongo)
+rate_limit_backend = create_rate_limit_backend(RATE_LIMIT_BACKEND, database.rate_limits)
+admin_users_limiter = RateLimiter(times=10, minutes=1, backend=rate_limit_backend, name="admin_users")
+admin_stats_limiter = RateLimiter(times=20, minutes=1, backend=rate_limit_backend, name="admin_stats")
+admin_status_limiter = RateLimiter(times=5, minutes=1, backend=rate_limit_backend, name="admin_status")
+# One profile runs at a time per worker anyway; this only caps repeated starts
+admin_profile_limiter = RateLimiter(times=5, minutes=1, backend=rate_limit_backend, name="admin_profile")
+# Daily chat quota, off unless enabled; the limit itself comes from the user's plan,
+# then from their maxdailyinteractions, then from CHAT_DAILY_LIMIT
+CHAT_DAILY_QUOTA_ENABLED = os.getenv("CHAT_DAILY_QUOTA_ENABLED", "false").lower() == "true"
+CHAT_DAILY_LIMIT = int(os.getenv("CHAT_DAILY_LIMIT", "3"))
+chat_daily_limiter = RateLimiter(times=CHAT_DAILY_LIMIT, minutes=24 * 60, backend=rate_limit_backend, name="chat_daily")
+plan_limit_cache = LRUCache(USER_CACHE_MAX_ENTRIES, ttl_seconds=60)
+
+async def get_daily_chat_limit(user: Dict[str, Any]) -> int:
+    """Active subscription's dailylimit, falling back to the user's maxdailyinteractions."""
+    limit = plan_limit_cache.get(user["id"])
+    if limit is None:
+        subscription = await subscription_collection.find_one(
+            {"user_id": user["id"], "is_active": True},
+            {"dailylimit": 1}
+        )
+        if subscription and subscription.get("dailylimit"):
+            limit = subscription["dailylimit"]
+        else:
+            limit = user.get("maxdailyinteractions", chat_daily_limiter.times)
+        plan_limit_cache.set(user["id"], limit)
+    return limit
+
+async def check_chat_quota(user: Optional[Dict[str, Any]]):
+    if not (CHAT_DAILY_QUOTA_ENABLED and user):
+        return
+    limit = await get_daily_chat_limit(user)
+    try:
+        await chat_daily_limiter.check(user["id"], limit=limit)
+    except HTTPException as e:
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=f"You have used all {limit} chat messages for today",
+            headers=e.headers
+        )
 
-# Initialize rate limiters
-admin_users_limiter = RateLimiter(times=10, minutes=1)
-admin_stats_limiter = RateLimiter(times=20, minutes=1)
-admin_status_limiter = RateLimiter(times=5, minutes=1)
+async def refund_chat_quota(user: Optional[Dict[str, Any]]):
+    """Chat turns that fail on our side (busy, timeout, error) do not count against the quota."""
+    if CHAT_DAILY_QUOTA_ENABLED and user:
+        try:
+            await chat_daily_limiter.refund(user["id"])
+        except errors.PyMongoError as e:
+            print(f"Error refunding chat quota: {str(e)}")
 
 # Admin routes with error handling
-@app.get("/api/admin/users", response_model=List[User])
-async def get_all_users(current_user: dict = Depends(get_current_user)):
-    await admin_users_limiter.check("admin_users")
+# Password hashes never leave the database in list responses
+USER_LIST_PROJECTION = {"password": 0}
+
+@app.get("/api/admin/users", response_model=UserPage)
+async def get_all_users(
+    limit: int = Query(PAGE_DEFAULT_LIMIT, ge=1, le=PAGE_MAX_LIMIT),
+    cursor: Optional[str] = None,
+    user_status: Optional[str] = Query(None, alias="status"),
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+    current_user: dict = Depends(get_current_user)
+):
+    await admin_users_limiter.check(current_user["id"])
     if current_user["role"] != "admin":
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Not authorized to access this resource"
         )
     
+    query = {"status": user_status} if user_status else {}
+    if format == "ndjson":
+        return StreamingResponse(
+            stream_ndjson(users_collection, query, USER_LIST_PROJECTION, cursor),
+            media_type="application/x-ndjson"
+        )
+
     try:
-        users = list(users_collection.find())
-        for user in users:
-            user["id"] = str(user["_id"])
-        return users
+        users, next_cursor = await fetch_page(users_collection, query, USER_LIST_PROJECTION, limit, cursor)
+        return {"items": users, "next_cursor": next_cursor}
     except errors.PyMongoError as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -383,7 +531,7 @@ async def get_all_users(current_user: dict = Depends(get_current_user)):
 
 @app.get("/api/admin/stats")
 async def get_admin_stats(current_user: dict = Depends(get_current_user)):
-    await admin_stats_limiter.check("admin_stats")
+    await admin_stats_limiter.check(current_user["id"])
     if current_user["role"] != "admin":
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -391,21 +539,8 @@ async def get_admin_stats(current_user: dict = Depends(get_current_user)):
         )
     
     try:
-        total_users = users_collection.count_documents({})
-        
-        active_sessions = chatbot_interactions_collection.count_documents({
-            "timestamp": {
-                "$gte": datetime.utcnow() - timedelta(minutes=30)
-            }
-        })
-        
-        code_submissions = code_submissions_collection.count_documents({})
-        
-        return {
-            "total_users": total_users,
-            "active_sessions": active_sessions,
-            "code_submissions": code_submissions
-        }
+        # Served from the pre-aggregated counters maintained by DashboardStats
+        return await dashboard_stats.admin()
     except errors.PyMongoError as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -418,7 +553,7 @@ async def update_user_status(
     status: str,
     current_user: dict = Depends(get_current_user)
 ):
-    await admin_status_limiter.check("admin_status")
+    await admin_status_limiter.check(current_user["id"])
     if current_user["role"] != "admin":
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
@@ -432,16 +567,18 @@ async def update_user_status(
         )
     
     try:
-        result = users_collection.update_one(
+        result = await users_collection.find_one_and_update(
             {"_id": ObjectId(user_id)},
-            {"$set": {"status": status}}
+            {"$set": {"status": status}},
+            projection={"email": 1}
         )
         
-        if result.modified_count == 0:
+        if result is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="User not found"
             )
+        invalidate_cached_user(result.get("email"))
         
         return {"message": f"User {user_id} status updated to {status}"}
     except errors.PyMongoError as e:
@@ -461,7 +598,7 @@ async def auth_google():
         "access_type": "offline",
         "prompt": "consent",
     }
-    url = f"https://accounts.google.com/o/oauth2/v2/auth?{urllib.parse.urlencode(params)}"
+    url = f"{GOOGLE_AUTH_URL}?{urllib.parse.urlencode(params)}"
     return RedirectResponse(url)
 
 @app.get("/auth/google/callback")
@@ -484,25 +621,12 @@ async def auth_google_callback(
         )
     
     try:
-        # Exchange code for tokens
-        token_data = {
-            "code": code,
-            "client_id": GOOGLE_CLIENT_ID,
-            "client_secret": GOOGLE_CLIENT_SECRET,
-            "redirect_uri": GOOGLE_REDIRECT_URI,
-            "grant_type": "authorization_code",
-        }
-        token_response = requests.post("https://oauth2.googleapis.com/token", data=token_data)
-        token_response.raise_for_status()
-        tokens = token_response.json()
-        
-        # Get user info
-        user_info_response = requests.get(
-            "https://www.googleapis.com/oauth2/v2/userinfo",
-            headers={"Authorization": f"Bearer {tokens['access_token']}"}
-        )
-        user_info_response.raise_for_status()
-        user_info = user_info_response.json()
+        # Exchange code for tokens; the ID token carries the profile, so no userinfo call is needed
+        tokens = await google_oauth.exchange_code(code)
+        if "id_token" in tokens:
+            user_info = await google_oauth.verify_id_token(tokens["id_token"])
+        else:
+            user_info = await google_oauth.user_info(tokens["access_token"])
         
         # Create or update user
         user_data = {
@@ -512,11 +636,12 @@ async def auth_google_callback(
             "created_at": datetime.utcnow()
         }
         
-        result = users_collection.update_one(
+        result = await users_collection.update_one(
             {"email": user_info["email"]},
             {"$set": user_data},
             upsert=True
         )
+        invalidate_cached_user(user_info["email"])
         
         # Generate tokens
         access_token = create_access_token({"sub": user_info["email"]})
@@ -532,11 +657,16 @@ async def auth_google_callback(
             "expires_in": ACCESS_TOKEN_EXPIRE_MINUTES * 60
         }
         
-    except requests.RequestException as e:
+    except httpx.HTTPError as e:
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             detail=f"Failed to communicate with Google: {str(e)}"
         )
+    except InvalidIDToken as e:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=f"Invalid Google ID token: {str(e)}"
+        )
     except errors.PyMongoError as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -572,21 +702,8 @@ async def refresh_token(
 @app.post("/api/auth/google")
 async def verify_google_token(token: str):
     try:
-        # Verify the token with Google
-        token_response = requests.get(
-            "https://www.googleapis.com/oauth2/v3/tokeninfo",
-            params={"access_token": token}
-        )
-        token_response.raise_for_status()
-        token_info = token_response.json()
-        
-        # Get user info
-        user_info_response = requests.get(
-            "https://www.googleapis.com/oauth2/v2/userinfo",
-            headers={"Authorization": f"Bearer {token}"}
-        )
-        user_info_response.raise_for_status()
-        user_info = user_info_response.json()
+        # ID tokens are verified locally against Google's keys; access tokens with Google
+        user_info = await google_oauth.verify_token(token)
         
         # Create or update user
         user_data = {
@@ -596,11 +713,12 @@ async def verify_google_token(token: str):
             "created_at": datetime.utcnow()
         }
         
-        result = users_collection.update_one(
+        result = await users_collection.update_one(
             {"email": user_info["email"]},
             {"$set": user_data},
             upsert=True
         )
+        invalidate_cached_user(user_info["email"])
         
         # Generate JWT tokens
         access_token = create_access_token({"sub": user_info["email"]})
@@ -614,7 +732,7 @@ async def verify_google_token(token: str):
                 "verified": True
             }
         }
-    except requests.RequestException as e:
+    except (httpx.HTTPError, InvalidIDToken) as e:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail=f"Failed to verify Google token: {str(e)}"
@@ -625,32 +743,124 @@ async def verify_google_token(token: str):
             detail=f"Database error: {str(e)}"
         )
 
+def auth_response(user: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "token": create_access_token({"sub": user["email"]}),
+        "token_type": "bearer",
+        "user": {
+            "email": user["email"],
+            "username": user.get("username", ""),
+            "verified": user.get("verified", False)
+        }
+    }
+
+def registration_username(request: RegisterRequest) -> str:
+    """The full name, else the email's local part, else the email; kept within UserBase's 3-50 characters."""
+    name = " ".join(part.strip() for part in [request.firstName, request.lastName] if part and part.strip())
+    for candidate in (name, request.email.split("@")[0], request.email):
+        candidate = candidate[:50].strip()
+        if len(candidate) >= 3:
+            return candidate
+    return fallback_username(request.email)
+
+def fallback_username(email: str) -> str:
+    """A username for when the derived one is taken; emails too long for one get a random suffix."""
+    return email if len(email) <= 50 else f"{email[:41]}-{secrets.token_hex(4)}"
+
+@app.post("/api/auth/register")
+async def register(request: RegisterRequest):
+    username = registration_username(request)
+    user = {
+        "email": request.email,
+        "username": username,
+        "password": await get_password_hash(request.password),
+        "verified": False,
+        "role": "user",
+        "status": "active",
+        "interactioncount": 0,
+        "maxdailyinteractions": 3,
+        "created_at": datetime.utcnow()
+    }
+    try:
+        try:
+            await users_collection.insert_one(user)
+        except errors.DuplicateKeyError as e:
+            if "username" not in (e.details or {}).get("keyPattern", {}):
+                raise
+            # Names are not unique between people; the email is
+            user.pop("_id", None)
+            user["username"] = fallback_username(request.email)
+            await users_collection.insert_one(user)
+    except errors.DuplicateKeyError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="An account with this email already exists"
+        )
+    except errors.PyMongoError as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Database error: {str(e)}"
+        )
+    return auth_response(user)
+
+@app.post("/api/auth/login")
+async def login(request: LoginRequest):
+    try:
+        user = await users_collection.find_one(
+            {"email": request.email},
+            {"email": 1, "username": 1, "verified": 1, "password": 1, "status": 1}
+        )
+    except errors.PyMongoError as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Database error: {str(e)}"
+        )
+
+    try:
+        # Google-only accounts have no password and are treated like unknown ones
+        valid, new_hash = await verify_password(request.email, request.password, (user or {}).get("password"))
+    except TooManyFailedAttempts as e:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Too many failed login attempts. Please try again later.",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    if not valid:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Incorrect email or password"
+        )
+    if user.get("status", "active") != "active":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Account is inactive"
+        )
+
+    if new_hash:
+        # Cost parameters changed since this hash was made; upgrade it transparently
+        await users_collection.update_one({"_id": user["_id"]}, {"$set": {"password": new_hash}})
+    return auth_response(user)
+
 @app.get("/api/dashboard/stats")
 async def get_dashboard_stats():
     try:
-        # Get user's learning sessions count
-        sessions_count = chatbot_interactions_collection.count_documents({})
+        # Counters are maintained incrementally by DashboardStats
+        counters = await dashboard_stats.dashboard()
         
-        # Get topics explored (unique topics from chatbot interactions)
-        topics = chatbot_interactions_collection.distinct("topic")
-        topics_count = len(topics)
+        # Get user's learning sessions count
+        sessions_count = counters["sessions_count"]
         
-        # Get new topics this week
-        week_ago = datetime.now() - timedelta(days=7)
-        new_topics = chatbot_interactions_collection.distinct("topic", {"timestamp": {"$gte": week_ago}})
-        new_topics_count = len(new_topics)
+        # Get topics explored and topics seen this week
+        topics_count = counters["topics_count"]
+        new_topics_count = counters["new_topics_count"]
         
         # Calculate learning progress
-        total_exercises = coding_exercises_collection.count_documents({})
-        completed_exercises = code_submissions_collection.count_documents({"status": "completed"})
+        total_exercises = counters["total_exercises"]
+        completed_exercises = counters["passed_submissions"]
         progress_percentage = (completed_exercises / total_exercises * 100) if total_exercises > 0 else 0
         
         # Calculate progress increase today
-        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-        exercises_today = code_submissions_collection.count_documents({
-            "status": "completed",
-            "submission_date": {"$gte": today}
-        })
+        exercises_today = counters["passed_today"]
         progress_increase = (exercises_today / total_exercises * 100) if total_exercises > 0 else 0
         
         return {
@@ -679,16 +889,20 @@ async def get_recent_activity(current_user: Optional[dict] = Depends(get_current
         # Get recent chatbot interactions if user is authenticated
         if current_user:
             try:
-                recent_chatbot = list(chatbot_interactions_collection.find(
+                # One capped history document per user; only its latest turn has a time
+                chat_log = await chatbot_interactions_collection.find_one(
                     {"user_id": str(current_user["_id"])},
-                    {"_id": 0, "question": 1, "timestamp": 1}
-                ).sort("timestamp", -1).limit(5))
-                
-                for chat in recent_chatbot:
+                    {"_id": 0, "history": 1, "last_interaction": 1}
+                )
+                questions = [
+                    message[len("User: "):] for message in (chat_log or {}).get("history", [])
+                    if message.startswith("User: ")
+                ]
+                if questions and chat_log.get("last_interaction"):
                     activities.append({
-                        "title": f"Chatbot Interaction: {chat['question'][:50]}...",
+                        "title": f"Chatbot Interaction: {questions[-1][:50]}...",
                         "status": "completed",
-                        "timestamp": chat["timestamp"]
+                        "timestamp": chat_log["last_interaction"]
                     })
             except Exception as e:
                 print(f"Error fetching chatbot interactions: {str(e)}")
@@ -696,10 +910,10 @@ async def get_recent_activity(current_user: Optional[dict] = Depends(get_current
         # Get recent code submissions if user is authenticated
         if current_user:
             try:
-                recent_submissions = list(code_submissions_collection.find(
+                recent_submissions = await code_submissions_collection.find(
                     {"user_id": str(current_user["_id"])},
                     {"_id": 0, "exercise_id": 1, "status": 1, "submission_date": 1}
-                ).sort("submission_date", -1).limit(5))
+                ).sort("submission_date", -1).limit(5).to_list(length=5)
                 
                 for sub in recent_submissions:
                     activities.append({
@@ -730,12 +944,23 @@ async def get_recent_activity(current_user: Optional[dict] = Depends(get_current
         )
 
 @app.get("/api/learning-paths")
-async def get_learning_paths(current_user: dict = Depends(get_current_user)):
+async def get_learning_paths(
+    limit: int = Query(PAGE_DEFAULT_LIMIT, ge=1, le=PAGE_MAX_LIMIT),
+    cursor: Optional[str] = None,
+    difficulty_level: Optional[str] = None,
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+    current_user: dict = Depends(get_current_user)
+):
+    query = {"difficulty_level": difficulty_level} if difficulty_level else {}
+    if format == "ndjson":
+        return StreamingResponse(
+            stream_ndjson(learning_paths_collection, query, None, cursor),
+            media_type="application/x-ndjson"
+        )
+
     try:
-        learning_paths = list(learning_paths_collection.find())
-        for path in learning_paths:
-            path["id"] = str(path["_id"])
-        return learning_paths
+        learning_paths, next_cursor = await fetch_page(learning_paths_collection, query, None, limit, cursor)
+        return {"items": learning_paths, "next_cursor": next_cursor}
     except errors.PyMongoError as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -745,7 +970,7 @@ async def get_learning_paths(current_user: dict = Depends(get_current_user)):
 @app.get("/api/learning-paths/{path_id}")
 async def get_learning_path(path_id: str, current_user: dict = Depends(get_current_user)):
     try:
-        path = learning_paths_collection.find_one({"_id": ObjectId(path_id)})
+        path = await learning_paths_collection.find_one({"_id": ObjectId(path_id)})
         if not path:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -759,13 +984,32 @@ async def get_learning_path(path_id: str, current_user: dict = Depends(get_curre
             detail=f"Failed to fetch learning path: {str(e)}"
         )
 
+# The full text is only returned by the detail endpoint
+STUDY_MATERIAL_LIST_PROJECTION = {"content_text": 0}
+
 @app.get("/api/study-materials")
-async def get_study_materials(current_user: dict = Depends(get_current_user)):
+async def get_study_materials(
+    limit: int = Query(PAGE_DEFAULT_LIMIT, ge=1, le=PAGE_MAX_LIMIT),
+    cursor: Optional[str] = None,
+    category: Optional[str] = None,
+    difficulty_level: Optional[str] = None,
+    content_type: Optional[str] = None,
+    format: str = Query("json", pattern="^(json|ndjson)$"),
+    current_user: dict = Depends(get_current_user)
+):
+    filters = {"category": category, "difficulty_level": difficulty_level, "content_type": content_type}
+    query = {field: value for field, value in filters.items() if value}
+    if format == "ndjson":
+        return StreamingResponse(
+            stream_ndjson(study_materials_collection, query, STUDY_MATERIAL_LIST_PROJECTION, cursor),
+            media_type="application/x-ndjson"
+        )
+
     try:
-        study_materials = list(study_materials_collection.find())
-        for material in study_materials:
-            material["id"] = str(material["_id"])
-        return study_materials
+        study_materials, next_cursor = await fetch_page(
+            study_materials_collection, query, STUDY_MATERIAL_LIST_PROJECTION, limit, cursor
+        )
+        return {"items": study_materials, "next_cursor": next_cursor}
     except errors.PyMongoError as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -775,7 +1019,7 @@ async def get_study_materials(current_user: dict = Depends(get_current_user)):
 @app.get("/api/study-materials/{material_id}")
 async def get_study_material(material_id: str, current_user: dict = Depends(get_current_user)):
     try:
-        material = study_materials_collection.find_one({"_id": ObjectId(material_id)})
+        material = await study_materials_collection.find_one({"_id": ObjectId(material_id)})
         if not material:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -791,8 +1035,165 @@ async def get_study_material(material_id: str, current_user: dict = Depends(get_
 
 # Chatbot configuration
 MODEL_NAME = "gpt2"
-tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
-model = AutoModelForCausalLM.from_pretrained(MODEL_NAME)
+inference_pool = InferencePool(
+    MODEL_NAME,
+    response_cache=ResponseCache(collection=response_cache_collection if RESPONSE_CACHE_SHARED else None)
+)
+metrics.register_stats("inference", inference_pool.stats)
+
+@app.post("/api/submissions", status_code=status.HTTP_202_ACCEPTED)
+async def create_submission(
+    request: SubmissionRequest,
+    current_user: dict = Depends(get_current_user)
+):
+    if not current_user:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Not authenticated"
+        )
+    if request.language != "python":
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Only Python submissions can be graded automatically"
+        )
+    if not grading_engine.enabled:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Automatic grading is disabled"
+        )
+    if not ObjectId.is_valid(request.exercise_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Exercise not found"
+        )
+
+    try:
+        exercise = await coding_exercises_collection.find_one(
+            {"_id": ObjectId(request.exercise_id)},
+            {"testcases": 1}
+        )
+        if not exercise:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Exercise not found"
+            )
+
+        submission = {
+            "user_id": current_user["id"],
+            "exercise_id": request.exercise_id,
+            "code": request.code,
+            "language": request.language,
+            "submission_date": datetime.utcnow(),
+            "status": "pending",
+            "score": None,
+            "feedback": None
+        }
+        result = await code_submissions_collection.insert_one(submission)
+        await dashboard_stats.record_submission(submission["submission_date"], "pending")
+    except errors.PyMongoError as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to save submission: {str(e)}"
+        )
+
+    try:
+        grading_engine.submit({**submission, "testcases": exercise.get("testcases")})
+    except GradingQueueFull:
+        # Stays pending; queued again by the next recovery pass
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="The grader is busy. Your submission was saved and will be graded later.",
+            headers={"Retry-After": "30"}
+        )
+    return {"id": str(result.inserted_id), "status": "pending"}
+
+@app.get("/api/submissions/{submission_id}")
+async def get_submission(submission_id: str, current_user: dict = Depends(get_current_user)):
+    if not current_user or not ObjectId.is_valid(submission_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Submission not found"
+        )
+    try:
+        submission = await code_submissions_collection.find_one(
+            {"_id": ObjectId(submission_id)},
+            {"code": 0}
+        )
+    except errors.PyMongoError as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to fetch submission: {str(e)}"
+        )
+    if not submission or (submission["user_id"] != current_user["id"] and current_user["role"] != "admin"):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Submission not found"
+        )
+    submission["id"] = str(submission.pop("_id"))
+    return submission
+
+@app.get("/api/admin/grading/stats")
+async def get_grading_stats(current_user: dict = Depends(get_current_user)):
+    if current_user["role"] != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not authorized to access this resource"
+        )
+    return grading_engine.stats()
+
+@app.post("/api/admin/profile")
+async def profile_worker(
+    seconds: float = Query(10, gt=0, le=PROFILE_MAX_SECONDS),
+    mode: str = Query("all", pattern="^(all|header)$"),
+    current_user: dict = Depends(get_current_user)
+):
+    """Sample this worker for ``seconds`` and return collapsed stacks (flamegraph.pl, speedscope).
+
+    ``mode=header`` only samples requests sent with the profile header. Only the worker
+    that serves this request is profiled.
+    """
+    await admin_profile_limiter.check(current_user["id"])
+    if current_user["role"] != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not authorized to access this resource"
+        )
+    try:
+        stacks = await profiler.profile(seconds, header_only=mode == "header")
+    except ProfilerBusy:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="A profile is already running on this worker"
+        )
+    return Response(
+        content=stacks,
+        media_type="text/plain",
+        headers={"Content-Disposition": f'attachment; filename="profile-{os.getpid()}-{int(time.time())}.collapsed"'}
+    )
+
+@app.get("/api/health")
+async def health():
+    return {"status": "ok"}
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    """Prometheus scrape endpoint; counters are per worker process."""
+    content, content_type = metrics.render()
+    return Response(content=content, media_type=content_type)
+
+@app.get("/api/ready")
+async def ready():
+    if inference_pool.ready:
+        return {"status": "ready", "model": MODEL_NAME, "load_seconds": inference_pool.load_seconds}
+    if inference_pool.load_error:
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={"status": "failed", "model": MODEL_NAME, "error": inference_pool.load_error}
+        )
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"status": "warming_up", "model": MODEL_NAME}
+    )
 
 # Chatbot models
 class ChatRequest(BaseModel):
@@ -807,59 +1208,23 @@ class ChatResponse(BaseModel):
     learning_resources: Optional[List[Dict[str, str]]] = None
 
 # Chatbot functions
-def search_learning_materials(topic: str, difficulty_level: str = None):
-    query = {"topic": topic}
-    if difficulty_level:
-        query["difficulty_level"] = difficulty_level
-    
-    materials = list(study_materials_collection.find(query).limit(3))
-    return [{
-        "title": m["title"],
-        "type": m["type"],
-        "url": m["url"],
-        "description": m["description"]
-    } for m in materials]
-
-def search_coding_exercises(topic: str, difficulty_level: str = None):
-    query = {"topic": topic}
-    if difficulty_level:
-        query["difficulty_level"] = difficulty_level
-    
-    exercises = list(coding_exercises_collection.find(query).limit(3))
-    return [{
-        "title": e["title"],
-        "description": e["description"],
-        "difficulty": e["difficulty_level"]
-    } for e in exercises]
+async def search_learning_materials(topic: str, difficulty_level: str = None):
+    return search_index.by_topic("study_materials", topic, difficulty_level)
+
+async def search_coding_exercises(topic: str, difficulty_level: str = None):
+    return search_index.by_topic("coding_exercises", topic, difficulty_level)
 
 def get_suggested_topics(current_topic: str = None):
-    if current_topic:
-        # Get related topics from learning paths
-        paths = learning_paths_collection.find({"topics": current_topic})
-        related_topics = set()
-        for path in paths:
-            related_topics.update(path["topics"])
-        related_topics.discard(current_topic)
-        return list(related_topics)[:5]
-    else:
-        # Get popular topics
-        topics = chatbot_interactions_collection.aggregate([
-            {"$group": {"_id": "$topic", "count": {"$sum": 1}}},
-            {"$sort": {"count": -1}},
-            {"$limit": 5}
-        ])
-        return [t["_id"] for t in topics]
+    # Related topics from learning paths, or popular topics; served from memory
+    return topic_graph.suggest(current_topic)
 
 def is_code(text: str) -> bool:
     """Check if the text contains code blocks or looks like code."""
     code_indicators = ['```', 'def ', 'class ', 'import ', 'function ', 'const ', 'let ', 'var ']
     return any(indicator in text for indicator in code_indicators)
 
-def provide_code_feedback(code: str) -> str:
-    """Analyze code using GPT model and provide detailed feedback."""
-    try:
-        # Prepare the prompt for code analysis
-        prompt = f"""Analyze this code and provide detailed feedback:
+def build_code_feedback_prompt(code: str) -> str:
+    return f"""Analyze this code and provide detailed feedback:
 {code}
 
 Please provide feedback on:
@@ -871,67 +1236,153 @@ Please provide feedback on:
 
 Format the response in a clear, structured way."""
 
+async def provide_code_feedback(code: str) -> str:
+    """Analyze code using GPT model and provide detailed feedback."""
+    try:
+        # Prepare the prompt for code analysis
+        prompt = build_code_feedback_prompt(code)
+
         # Generate response using the model
-        inputs = tokenizer(prompt, return_tensors="pt", max_length=512, truncation=True)
-        output = model.generate(**inputs, max_length=500, num_return_sequences=1)
-        feedback = tokenizer.decode(output[0], skip_special_tokens=True)
+        with metrics.GENERATION_LATENCY.labels("code_feedback").time():
+            feedback = await inference_pool.generate(prompt, max_length=500, truncate_prompt_to=512)
         
         return feedback
+    except (InferenceQueueFull, InferenceTimeout, InferenceWarmingUp):
+        raise
     except Exception as e:
         return f"Error analyzing code: {str(e)}"
 
-def generate_response(user_input: str, user_id: str, topic: str = None, difficulty_level: str = None):
-    # Get or create chat history for user
-    user_chat = chatbot_interactions_collection.find_one({"user_id": user_id})
-    if not user_chat:
-        chat_history = []
-    else:
-        chat_history = user_chat.get("history", [])
-    
-    chat_history.append(f"User: {user_input}")
+def format_learning_resources(learning_resources: List[Dict[str, str]]) -> str:
+    response = "Here are some resources that might help:\n"
+    for resource in learning_resources:
+        response += f"- {resource['title']}: {resource.get('description', '')}\n"
+    return response
+
+def build_chat_prompt(chat_history: List[str], grounding: Optional[List[Dict[str, Any]]] = None) -> str:
+    lines = list(chat_history)
+    if grounding:
+        # Just before the question, so earlier turns keep their cached KV prefix
+        lines[-1:-1] = ["Relevant material:"] + [
+            f"- {item['title']}: {(item.get('description') or '')[:GROUNDING_SNIPPET_CHARS]}"
+            for item in grounding
+        ]
+    return "\n".join(lines) + "\nAI:"
+
+async def load_chat_history(user_id: str) -> List[str]:
+    # $slice keeps the read to the last messages however long the stored log is
+    user_chat = await chatbot_interactions_collection.find_one(
+        {"user_id": user_id},
+        {"_id": 0, "history": {"$slice": -CHAT_HISTORY_MAX_MESSAGES}}
+    )
+    return user_chat.get("history", []) if user_chat else []
 
-    # Get learning materials and exercises
-    learning_resources = []
+@contextmanager
+def chat_stage(timings: Dict[str, float], name: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        timings[name] = elapsed * 1000
+        metrics.CHAT_STAGE.labels(name).observe(elapsed)
+
+def log_chat_stages(user_id: str, timings: Dict[str, float]):
+    if LOG_CHAT_STAGES:
+        print(f"Chat latency for {user_id}: " + ", ".join(f"{name}={ms:.1f}ms" for name, ms in timings.items()))
+
+async def retrieve(timings: Dict[str, float], name: str, lookup, default):
+    """Await one retrieval with a timeout; a slow or failed lookup yields ``default``."""
+    with chat_stage(timings, name):
+        try:
+            return await asyncio.wait_for(lookup, RETRIEVAL_TIMEOUT_SECONDS)
+        except (asyncio.TimeoutError, errors.PyMongoError) as e:
+            print(f"Chat retrieval '{name}' failed, continuing without it: {type(e).__name__} {str(e)}")
+            return default
+
+async def load_chat_context(user_input: str, user_id: str, topic: str = None, difficulty_level: str = None, timings: Optional[Dict[str, float]] = None):
+    """History, learning resources and grounding material fetched concurrently, plus suggested topics.
+
+    Grounding is the best free-text matches for the question from the search index;
+    it is only used when the topic has no learning resources of its own.
+    """
+    timings = timings if timings is not None else {}
+    lookups = {}
     if topic:
-        learning_resources.extend(search_learning_materials(topic, difficulty_level))
-        learning_resources.extend(search_coding_exercises(topic, difficulty_level))
+        lookups["materials"] = search_learning_materials(topic, difficulty_level)
+        lookups["exercises"] = search_coding_exercises(topic, difficulty_level)
+    # Code feedback never uses the history
+    if not is_code(user_input):
+        lookups["history"] = load_chat_history(user_id)
+        lookups["grounding"] = search_index.search(user_input, difficulty_level=difficulty_level)
+
+    results = dict(zip(lookups, await asyncio.gather(*(
+        retrieve(timings, name, lookup, []) for name, lookup in lookups.items()
+    ))))
+    learning_resources = results.get("materials", []) + results.get("exercises", [])
+
+    # Only free-form chat builds its prompt from the history
+    chat_history = [] if learning_resources else results.get("history", [])
+    chat_history.append(f"User: {user_input}")
+    grounding = [] if learning_resources else results.get("grounding", [])
+
+    return chat_history, learning_resources, get_suggested_topics(topic), grounding
+
+async def save_chat_turn(user_id: str, messages: List[str], topic: str = None, difficulty_level: str = None):
+    """Append this turn's messages to the user's capped log and return the stored history."""
+    # Atomic append: concurrent turns of the same user both land, oldest messages drop off
+    now = datetime.utcnow()
+    session_id = ObjectId()
+    user_chat = await chatbot_interactions_collection.find_one_and_update(
+        {"user_id": user_id},
+        {
+            "$push": {"history": {"$each": messages, "$slice": -CHAT_HISTORY_MAX_MESSAGES}},
+            "$set": {
+                "last_interaction": now,
+                "topic": topic,
+                "difficulty_level": difficulty_level
+            },
+            "$setOnInsert": {"session_id": session_id}
+        },
+        projection={"_id": 0, "history": 1, "session_id": 1},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    new_session = user_chat.get("session_id") == session_id
+    await dashboard_stats.record_chat(topic, now, new_session=new_session)
+    topic_graph.record(topic)
+
+    return user_chat["history"]
+
+async def generate_response(user_input: str, user_id: str, topic: str = None, difficulty_level: str = None):
+    timings: Dict[str, float] = {}
+    with chat_stage(timings, "retrieval"):
+        chat_history, learning_resources, suggested_topics, grounding = await load_chat_context(
+            user_input, user_id, topic, difficulty_level, timings
+        )
+    turn = [chat_history[-1]]
 
     # Generate response based on input type
     if is_code(user_input):
-        feedback = provide_code_feedback(user_input)
-        chat_history.append(f"AI: {feedback}")
+        with chat_stage(timings, "generation"):
+            feedback = await provide_code_feedback(user_input)
+        turn.append(f"AI: {feedback}")
         response = feedback
     else:
         # Try to find relevant learning materials
         if learning_resources:
-            response = "Here are some resources that might help:\n"
-            for resource in learning_resources:
-                response += f"- {resource['title']}: {resource.get('description', '')}\n"
+            response = format_learning_resources(learning_resources)
         else:
             # Use GPT-2 for general responses
-            input_text = "\n".join(chat_history) + "\nAI:"
-            inputs = tokenizer(input_text, return_tensors="pt")
-            output = model.generate(**inputs, max_length=150, pad_token_id=tokenizer.eos_token_id)
-            response = tokenizer.decode(output[0], skip_special_tokens=True)
-            chat_history.append(f"AI: {response}")
-
-    # Get suggested topics
-    suggested_topics = get_suggested_topics(topic)
-
-    # Update chat history in database
-    chat_history = chat_history[-10:]  # Limit history
-    chatbot_interactions_collection.update_one(
-        {"user_id": user_id},
-        {
-            "$set": {
-                "history": chat_history,
-                "last_interaction": datetime.utcnow(),
-                "topic": topic,
-                "difficulty_level": difficulty_level
-            }
-        },
-        upsert=True
-    )
+            input_text = build_chat_prompt(chat_history, grounding)
+            with chat_stage(timings, "generation"), metrics.GENERATION_LATENCY.labels("chat").time():
+                response = await inference_pool.generate(
+                    input_text, max_length=150, cache_key=user_id if CHAT_KV_CACHE else None
+                )
+            turn.append(f"AI: {response}")
+
+    with chat_stage(timings, "save"):
+        chat_history = await save_chat_turn(user_id, turn, topic, difficulty_level)
+    log_chat_stages(user_id, timings)
 
     return response, chat_history, suggested_topics, learning_resources
 
@@ -946,23 +1397,30 @@ async def chat(
         if not user_input:
             raise HTTPException(status_code=400, detail="Empty message")
 
+        await check_chat_quota(current_user)
+
         # Use a default user ID if not authenticated
         user_id = str(current_user["_id"]) if current_user else "anonymous"
         
         # Generate response
-        response, history, suggested_topics, learning_resources = generate_response(
-            user_input,
-            user_id,
-            request.topic,
-            request.difficulty_level
-        )
+        try:
+            response, history, suggested_topics, learning_resources = await generate_response(
+                user_input,
+                user_id,
+                request.topic,
+                request.difficulty_level
+            )
+        except Exception:
+            await refund_chat_quota(current_user)
+            raise
         
         # Update user interaction count if authenticated
         if current_user:
-            users_collection.update_one(
+            await users_collection.update_one(
                 {"_id": current_user["_id"]},
                 {"$inc": {"interactioncount": 1}}
             )
+            invalidate_cached_user(current_user.get("email"))
 
         return {
             "response": response,
@@ -972,6 +1430,23 @@ async def chat(
         }
     except HTTPException:
         raise
+    except InferenceQueueFull as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="The assistant is busy. Please try again shortly.",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    except InferenceWarmingUp as e:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="The assistant is warming up. Please try again shortly.",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    except InferenceTimeout:
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail="The assistant took too long to respond. Please try again."
+        )
     except Exception as e:
         print(f"Error in chat endpoint: {str(e)}")  # Log the error
         raise HTTPException(
@@ -979,6 +1454,130 @@ async def chat(
             detail="An error occurred while processing your request. Please try again."
         )
 
+@app.get("/api/admin/inference/stats")
+async def get_inference_stats(current_user: dict = Depends(get_current_user)):
+    if current_user["role"] != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Not authorized to access this resource"
+        )
+    
+    return inference_pool.stats()
+
+def sse_event(event: str, data: Any) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+# Streaming chatbot endpoint (Server-Sent Events)
+@app.post("/api/chat/stream")
+async def chat_stream(
+    request: ChatRequest,
+    current_user: Optional[dict] = Depends(get_current_user)
+):
+    user_input = request.message.strip()
+    if not user_input:
+        raise HTTPException(status_code=400, detail="Empty message")
+
+    await check_chat_quota(current_user)
+
+    user_id = str(current_user["_id"]) if current_user else "anonymous"
+
+    timings: Dict[str, float] = {}
+    try:
+        with chat_stage(timings, "retrieval"):
+            chat_history, learning_resources, suggested_topics, grounding = await load_chat_context(
+                user_input,
+                user_id,
+                request.topic,
+                request.difficulty_level,
+                timings
+            )
+        turn = [chat_history[-1]]
+
+        # Admit the generation before the response starts so a full queue is still a 503
+        if is_code(user_input):
+            chunks = await inference_pool.stream(
+                build_code_feedback_prompt(user_input), max_length=500, truncate_prompt_to=512
+            )
+        elif learning_resources:
+            chunks = None
+        else:
+            chunks = await inference_pool.stream(build_chat_prompt(chat_history, grounding), max_length=150, cache_key=user_id)
+    except InferenceQueueFull as e:
+        await refund_chat_quota(current_user)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="The assistant is busy. Please try again shortly.",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    except InferenceWarmingUp as e:
+        await refund_chat_quota(current_user)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="The assistant is warming up. Please try again shortly.",
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    except Exception as e:
+        print(f"Error in chat stream endpoint: {str(e)}")
+        await refund_chat_quota(current_user)
+        raise HTTPException(
+            status_code=500,
+            detail="An error occurred while processing your request. Please try again."
+        )
+
+    async def events():
+        try:
+            if chunks is None:
+                response = format_learning_resources(learning_resources)
+                yield sse_event("token", {"text": response})
+            else:
+                parts = []
+                with chat_stage(timings, "generation"):
+                    async for chunk in chunks:
+                        parts.append(chunk)
+                        yield sse_event("token", {"text": chunk})
+                response = "".join(parts)
+                turn.append(f"AI: {response}")
+
+            with chat_stage(timings, "save"):
+                history = await save_chat_turn(
+                    user_id,
+                    turn,
+                    request.topic,
+                    request.difficulty_level
+                )
+            log_chat_stages(user_id, timings)
+
+            if current_user:
+                await users_collection.update_one(
+                    {"_id": current_user["_id"]},
+                    {"$inc": {"interactioncount": 1}}
+                )
+                invalidate_cached_user(current_user.get("email"))
+
+            yield sse_event("done", {
+                "response": response,
+                "history": history,
+                "suggested_topics": suggested_topics,
+                "learning_resources": learning_resources
+            })
+        except InferenceTimeout:
+            await refund_chat_quota(current_user)
+            yield sse_event("error", {"detail": "The assistant took too long to respond. Please try again."})
+        except (InferenceQueueFull, InferenceWarmingUp):
+            # Admission is checked again when the stream starts
+            await refund_chat_quota(current_user)
+            yield sse_event("error", {"detail": "The assistant is busy. Please try again shortly."})
+        except Exception as e:
+            print(f"Error in chat stream endpoint: {str(e)}")
+            await refund_chat_quota(current_user)
+            yield sse_event("error", {"detail": "An error occurred while processing your request. Please try again."})
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="127.0.0.1", port=8000, reload=True)
\ No newline at end of file
@@ -0,0 +1,84 @@
+"""Maintenance commands for the AI RubberDucker backend.
+
+Usage (from the backend directory):
+    python manage.py migrate [--dry-run] [--drop-extra] [--merge-duplicates]
+    python manage.py audit-queries
+    python manage.py rebuild-stats
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+
+from dotenv import load_dotenv
+
+import indexes
+from database import Database
+from stats import DashboardStats
+
+
+async def migrate(database: Database, args):
+    try:
+        actions = await indexes.migrate(
+            database, drop_extra=args.drop_extra, dry_run=args.dry_run, merge_duplicates=args.merge_duplicates
+        )
+    except indexes.MergeRequired as e:
+        sys.exit(str(e))
+    if args.dry_run:
+        for action in actions:
+            print(indexes.describe(action))
+    if not actions:
+        print("Indexes are up to date")
+
+
+async def audit_queries(database: Database, args):
+    results = await indexes.audit_queries(database)
+    print(json.dumps(results, indent=2))
+    if any(result["collscan"] for result in results):
+        sys.exit(1)
+
+
+async def rebuild_stats(database: Database, args):
+    stats = DashboardStats(database)
+    result = await stats.rebuild()
+    print(json.dumps(result, indent=2, default=str))
+
+
+COMMANDS = {
+    "migrate": (migrate, "Create or update the indexes in indexes.INDEXES"),
+    "audit-queries": (audit_queries, "Explain each route's queries and fail on collection scans"),
+    "rebuild-stats": (rebuild_stats, "Recompute the dashboard counters from scratch"),
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="AI RubberDucker maintenance commands")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    for name, (_, help_text) in COMMANDS.items():
+        subparser = subparsers.add_parser(name, help=help_text)
+        if name == "migrate":
+            subparser.add_argument("--dry-run", action="store_true", help="only print the changes")
+            subparser.add_argument("--drop-extra", action="store_true", help="drop indexes not in the spec")
+            subparser.add_argument(
+                "--merge-duplicates",
+                action="store_true",
+                help="delete all but the newest chat history document per user before making user_id unique",
+            )
+    args = parser.parse_args()
+
+    load_dotenv()
+    database = Database(os.getenv("MONGODB_URL"))
+
+    async def run():
+        await database.ping()
+        try:
+            await COMMANDS[args.command][0](database, args)
+        finally:
+            database.close()
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    main()
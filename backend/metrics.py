@@ -0,0 +1,137 @@
+import time
+from typing import Any, Callable, Dict, Iterator, Tuple
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Gauge, Histogram, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+from pymongo import monitoring
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+DATABASE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+TOKENS_PER_SECOND_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+HTTP_REQUESTS = Counter("http_requests_total", "HTTP requests by route and status", ["method", "route", "status"])
+HTTP_LATENCY = Histogram(
+    "http_request_duration_seconds", "HTTP request latency, including streamed bodies",
+    ["method", "route"], buckets=LATENCY_BUCKETS,
+)
+HTTP_IN_PROGRESS = Gauge("http_requests_in_progress", "HTTP requests being served", ["method"])
+
+MONGODB_COMMAND_LATENCY = Histogram(
+    "mongodb_command_duration_seconds", "MongoDB command latency", ["command"], buckets=DATABASE_BUCKETS,
+)
+MONGODB_COMMAND_FAILURES = Counter("mongodb_command_failures_total", "Failed MongoDB commands", ["command"])
+
+INFERENCE_STAGE = Histogram(
+    "inference_stage_seconds", "Time spent per generation in tokenize, prefill and decode",
+    ["mode", "stage"], buckets=LATENCY_BUCKETS,
+)
+INFERENCE_TOKENS = Counter("inference_generated_tokens_total", "Generated tokens", ["mode"])
+INFERENCE_TOKENS_PER_SECOND = Histogram(
+    "inference_decode_tokens_per_second", "Decode throughput per generation",
+    ["mode"], buckets=TOKENS_PER_SECOND_BUCKETS,
+)
+GENERATION_LATENCY = Histogram(
+    "generation_duration_seconds", "End-to-end model generation time seen by the API",
+    ["kind"], buckets=LATENCY_BUCKETS,
+)
+CHAT_STAGE = Histogram("chat_stage_duration_seconds", "Chat turn latency per stage", ["stage"], buckets=LATENCY_BUCKETS)
+RATE_LIMIT_REJECTIONS = Counter("rate_limit_rejections_total", "Requests rejected by a rate limiter", ["limiter"])
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware: request counts, latency and in-flight requests per route.
+
+    The route label is the matched path template, so path parameters do not
+    multiply the series; unmatched paths share one label.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        in_progress = HTTP_IN_PROGRESS.labels(method)
+        in_progress.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            in_progress.dec()
+            route = getattr(scope.get("route"), "path", "unmatched")
+            HTTP_LATENCY.labels(method, route).observe(time.perf_counter() - start)
+            HTTP_REQUESTS.labels(method, route, str(status_code)).inc()
+
+
+class CommandMetrics(monitoring.CommandListener):
+    """pymongo command monitoring; pass to the client through ``event_listeners``."""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        MONGODB_COMMAND_LATENCY.labels(event.command_name).observe(event.duration_micros / 1e6)
+
+    def failed(self, event):
+        MONGODB_COMMAND_LATENCY.labels(event.command_name).observe(event.duration_micros / 1e6)
+        MONGODB_COMMAND_FAILURES.labels(event.command_name).inc()
+
+
+def observe_generation(mode: str, tokenize: float, prefill: float, decode: float, tokens: int):
+    """Record one generation; the first token comes out of prefill, the rest out of decode."""
+    INFERENCE_STAGE.labels(mode, "tokenize").observe(tokenize)
+    INFERENCE_STAGE.labels(mode, "prefill").observe(prefill)
+    INFERENCE_STAGE.labels(mode, "decode").observe(decode)
+    INFERENCE_TOKENS.labels(mode).inc(tokens)
+    if decode > 0 and tokens > 1:
+        INFERENCE_TOKENS_PER_SECOND.labels(mode).observe((tokens - 1) / decode)
+
+
+def _flatten(stats: Dict[str, Any], prefix: str) -> Iterator[Tuple[str, float]]:
+    for key, value in stats.items():
+        name = f"{prefix}_{key}"
+        if isinstance(value, dict):
+            yield from _flatten(value, name)
+        elif isinstance(value, (bool, int, float)):
+            yield name, float(value)
+
+
+class StatsCollector:
+    """Exposes the numeric fields of components' ``stats()`` dicts as gauges at scrape time."""
+
+    def __init__(self):
+        self.sources: Dict[str, Callable[[], Dict[str, Any]]] = {}
+
+    def collect(self):
+        for prefix, stats in list(self.sources.items()):
+            try:
+                values = list(_flatten(stats(), prefix))
+            except Exception as e:
+                print(f"Error collecting {prefix} stats: {str(e)}")
+                continue
+            for name, value in values:
+                yield GaugeMetricFamily(name, f"{prefix} stats: {name[len(prefix) + 1:]}", value=value)
+
+
+STATS = StatsCollector()
+REGISTRY.register(STATS)
+
+
+def register_stats(prefix: str, stats: Callable[[], Dict[str, Any]]):
+    STATS.sources[prefix] = stats
+
+
+def render() -> Tuple[bytes, str]:
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -0,0 +1,81 @@
+import json
+import os
+from datetime import datetime
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from fastapi import HTTPException, status
+
+
+# List endpoint configuration
+PAGE_DEFAULT_LIMIT = int(os.getenv("PAGE_DEFAULT_LIMIT", "50"))
+PAGE_MAX_LIMIT = int(os.getenv("PAGE_MAX_LIMIT", "200"))
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "500"))
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[ObjectId]:
+    if not cursor:
+        return None
+    try:
+        return ObjectId(cursor)
+    except (InvalidId, TypeError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid cursor"
+        )
+
+
+def serialize_document(document: Dict[str, Any]) -> Dict[str, Any]:
+    """Replace ``_id`` with a string ``id`` so the document is JSON-safe."""
+    document["id"] = str(document.pop("_id"))
+    return document
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+async def fetch_page(
+    collection,
+    query: Dict[str, Any],
+    projection: Optional[Dict[str, Any]],
+    limit: int,
+    cursor: Optional[str] = None,
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """One page ordered by ``_id`` plus the cursor of the next page (None on the last).
+
+    Keyset pagination: the next page starts after the last ``_id`` returned, so every
+    page is an index range scan no matter how deep the client has paged.
+    """
+    after = decode_cursor(cursor)
+    if after is not None:
+        query = {**query, "_id": {"$gt": after}}
+    documents = await collection.find(query, projection).sort("_id", 1).limit(limit + 1).to_list(length=limit + 1)
+    next_cursor = str(documents[limit - 1]["_id"]) if len(documents) > limit else None
+    return [serialize_document(document) for document in documents[:limit]], next_cursor
+
+
+def stream_ndjson(
+    collection,
+    query: Dict[str, Any],
+    projection: Optional[Dict[str, Any]],
+    cursor: Optional[str] = None,
+    batch_size: int = EXPORT_BATCH_SIZE,
+) -> AsyncIterator[str]:
+    """Every matching document as one JSON line, fetched ``batch_size`` at a time.
+
+    The cursor is validated here, before the response starts, so a bad cursor is
+    still a 400 rather than a truncated stream.
+    """
+    after = decode_cursor(cursor)
+    if after is not None:
+        query = {**query, "_id": {"$gt": after}}
+
+    async def lines() -> AsyncIterator[str]:
+        async for document in collection.find(query, projection).sort("_id", 1).batch_size(batch_size):
+            yield json.dumps(serialize_document(document), default=_json_default) + "\n"
+
+    return lines()
@@ -0,0 +1,120 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Optional, Tuple
+
+from passlib.context import CryptContext
+
+from cache import LRUCache
+
+
+# Password hashing configuration
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "2"))
+PASSWORD_HASH_MAX_CONCURRENCY = int(os.getenv("PASSWORD_HASH_MAX_CONCURRENCY", "8"))
+PASSWORD_MAX_FAILED_ATTEMPTS = int(os.getenv("PASSWORD_MAX_FAILED_ATTEMPTS", "5"))
+PASSWORD_LOCKOUT_SECONDS = int(os.getenv("PASSWORD_LOCKOUT_SECONDS", "900"))
+PASSWORD_TRACKED_ACCOUNTS = int(os.getenv("PASSWORD_TRACKED_ACCOUNTS", "100000"))
+
+# min_rounds makes hashes with a lower cost "need update", so raising BCRYPT_ROUNDS
+# upgrades existing hashes the next time their owner logs in
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS,
+)
+
+
+class TooManyFailedAttempts(Exception):
+    def __init__(self, retry_after: int):
+        super().__init__("Too many failed login attempts")
+        self.retry_after = retry_after
+
+
+# Executed in the worker processes; must stay module-level so they can be pickled
+def _hash(password: str) -> str:
+    return pwd_context.hash(password)
+
+
+def _verify_and_update(password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    return pwd_context.verify_and_update(password, hashed_password)
+
+
+class PasswordHasher:
+    """bcrypt in a process pool, so logins neither block the event loop nor share the GIL.
+
+    At most ``max_concurrency`` hashes are submitted at once; further callers wait
+    their turn on the loop. After ``max_failed_attempts`` wrong passwords an account
+    is refused without hashing until ``lockout_seconds`` have passed. Attempts still
+    being checked count towards that limit, so a burst of concurrent guesses cannot
+    all reach bcrypt before the first failure is recorded. Failure counts are kept
+    per process.
+    """
+
+    def __init__(
+        self,
+        workers: int = PASSWORD_HASH_WORKERS,
+        max_concurrency: int = PASSWORD_HASH_MAX_CONCURRENCY,
+        max_failed_attempts: int = PASSWORD_MAX_FAILED_ATTEMPTS,
+        lockout_seconds: int = PASSWORD_LOCKOUT_SECONDS,
+    ):
+        self.workers = workers
+        self.max_concurrency = max_concurrency
+        self.max_failed_attempts = max_failed_attempts
+        self.lockout_seconds = lockout_seconds
+        self._failures = LRUCache(PASSWORD_TRACKED_ACCOUNTS, ttl_seconds=lockout_seconds)
+        self._in_flight: Dict[str, int] = {}
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._dummy_hash: Optional[str] = None
+
+    async def _run(self, fn, *args):
+        if self._executor is None:
+            # spawn, not fork: the API process runs inference threads
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphore:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+
+    async def hash(self, password: str) -> str:
+        return await self._run(_hash, password)
+
+    async def verify(self, account: str, password: str, hashed_password: Optional[str]) -> Tuple[bool, Optional[str]]:
+        """Check ``password`` for ``account``; returns (valid, replacement hash or None).
+
+        Pass ``hashed_password=None`` for unknown accounts: a dummy hash is checked so
+        the response time does not reveal whether the account exists.
+        """
+        in_flight = self._in_flight.get(account, 0)
+        if self._failures.get(account, 0) + in_flight >= self.max_failed_attempts:
+            raise TooManyFailedAttempts(self.lockout_seconds)
+
+        self._in_flight[account] = in_flight + 1
+        try:
+            if hashed_password is None:
+                if self._dummy_hash is None:
+                    self._dummy_hash = await self.hash("not-a-real-password")
+                await self._run(_verify_and_update, password, self._dummy_hash)
+                valid, new_hash = False, None
+            else:
+                valid, new_hash = await self._run(_verify_and_update, password, hashed_password)
+        finally:
+            remaining = self._in_flight.pop(account) - 1
+            if remaining:
+                self._in_flight[account] = remaining
+
+        if valid:
+            self._failures.pop(account)
+        else:
+            # The lockout window restarts with every failure
+            self._failures.set(account, self._failures.get(account, 0) + 1)
+        return valid, new_hash
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
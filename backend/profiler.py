@@ -0,0 +1,133 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Dict, Optional, Set
+
+
+# Profiler configuration
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "10"))
+PROFILE_MAX_SECONDS = int(os.getenv("PROFILE_MAX_SECONDS", "60"))
+PROFILE_MAX_DEPTH = int(os.getenv("PROFILE_MAX_DEPTH", "100"))
+PROFILE_HEADER = os.getenv("PROFILE_HEADER", "x-profile")
+
+
+class ProfilerBusy(Exception):
+    pass
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    module = frame.f_globals.get("__name__", os.path.basename(code.co_filename))
+    return f"{module}:{code.co_name}"
+
+
+class SamplingProfiler:
+    """Wall-clock sampling profiler producing collapsed stacks for flamegraph tools.
+
+    A daemon thread reads every thread's current frame through
+    ``sys._current_frames()`` every ``PROFILE_INTERVAL_MS`` and counts the stacks; the
+    profiled code is not instrumented, so the overhead is one stack walk per thread per
+    sample. Work in the bcrypt and grading child processes is not visible, only the
+    time threads spend waiting on them.
+
+    In ``header`` mode only the event loop thread is sampled, and only while it runs
+    the task of a request carrying ``PROFILE_HEADER`` (see ``ProfileHeaderMiddleware``).
+    """
+
+    def __init__(self, interval_ms: float = PROFILE_INTERVAL_MS):
+        self.interval = interval_ms / 1000
+        self.samples: Counter = Counter()
+        self.sample_count = 0
+        self.header_only = False
+        self.marked_tasks: Set[asyncio.Task] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        self._lock = threading.Lock()
+
+    @property
+    def running(self) -> bool:
+        return self._lock.locked()
+
+    def _sample(self, own_thread: int, names: Dict[int, str]):
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own_thread:
+                continue
+            if self.header_only:
+                if thread_id != self._loop_thread or asyncio.current_task(self._loop) not in self.marked_tasks:
+                    continue
+            stack = []
+            while frame is not None and len(stack) < PROFILE_MAX_DEPTH:
+                stack.append(_frame_label(frame))
+                frame = frame.f_back
+            stack.append(names.get(thread_id, f"thread-{thread_id}"))
+            self.samples[";".join(reversed(stack))] += 1
+        self.sample_count += 1
+
+    def _run(self, deadline: float, stop: threading.Event):
+        own_thread = threading.get_ident()
+        names = {}
+        while time.monotonic() < deadline and not stop.is_set():
+            if self.sample_count % 100 == 0:
+                # Thread pools grow lazily; refresh their names now and then
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+            self._sample(own_thread, names)
+            stop.wait(self.interval)
+
+    async def profile(self, seconds: float, header_only: bool = False) -> str:
+        """Sample for ``seconds`` (capped at ``PROFILE_MAX_SECONDS``) and return collapsed stacks.
+
+        One profile runs at a time per process; a concurrent call raises ``ProfilerBusy``.
+        """
+        if not self._lock.acquire(blocking=False):
+            raise ProfilerBusy()
+        self.samples = Counter()
+        self.sample_count = 0
+        self.header_only = header_only
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        deadline = time.monotonic() + min(seconds, PROFILE_MAX_SECONDS)
+        stop = threading.Event()
+        thread = threading.Thread(target=self._run, args=(deadline, stop), name="profiler", daemon=True)
+        try:
+            thread.start()
+            while thread.is_alive():
+                await asyncio.sleep(0.1)
+            return self.collapsed()
+        finally:
+            # Also reached when the caller disconnects; the thread must not outlive the lock
+            stop.set()
+            if thread.is_alive():
+                thread.join()
+            self.header_only = False
+            self._lock.release()
+
+    def collapsed(self) -> str:
+        """One ``frame;frame;frame count`` line per distinct stack, root first."""
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+
+class ProfileHeaderMiddleware:
+    """Marks the tasks of requests carrying ``PROFILE_HEADER`` for a header-mode profile."""
+
+    def __init__(self, app, profiler: SamplingProfiler):
+        self.app = app
+        self.profiler = profiler
+        self.header = PROFILE_HEADER.lower().encode("latin-1")
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.profiler.header_only:
+            await self.app(scope, receive, send)
+            return
+        if not any(name == self.header for name, _ in scope["headers"]):
+            await self.app(scope, receive, send)
+            return
+
+        task = asyncio.current_task()
+        self.profiler.marked_tasks.add(task)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.profiler.marked_tasks.discard(task)
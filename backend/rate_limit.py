@@ -0,0 +1,145 @@
+import asyncio
+import math
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional, Tuple
+
+from fastapi import HTTPException, status
+from pymongo import ReturnDocument
+
+from metrics import RATE_LIMIT_REJECTIONS
+
+
+# Rate limiter configuration
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+
+
+def _window_position(window_seconds: float) -> Tuple[int, float]:
+    """Index of the current fixed window and how far into it we are (0..1)."""
+    now = time.time()
+    index = int(now // window_seconds)
+    return index, (now - index * window_seconds) / window_seconds
+
+
+def _estimate(previous: int, current: int, elapsed: float) -> float:
+    # Sliding window counter: the previous window counts in proportion to its overlap
+    return previous * (1 - elapsed) + current
+
+
+def _retry_after(previous: int, current: int, limit: int, elapsed: float, window_seconds: float) -> float:
+    if current + 1 > limit or previous == 0:
+        return window_seconds * (1 - elapsed)
+    needed = 1 - (limit - current - 1) / previous
+    return max(0.0, (needed - elapsed) * window_seconds)
+
+
+class MemoryRateLimitBackend:
+    """Per-process counters; bounded to ``max_keys`` with least-recently-used eviction."""
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._windows: "OrderedDict[str, list]" = OrderedDict()
+
+    async def hit(self, key: str, limit: int, window_seconds: float) -> Tuple[bool, float]:
+        index, elapsed = _window_position(window_seconds)
+        window_index, current, previous = self._windows.get(key, (index, 0, 0))
+        if window_index != index:
+            previous = current if window_index == index - 1 else 0
+            current = 0
+
+        if _estimate(previous, current, elapsed) + 1 > limit:
+            self._windows[key] = [index, current, previous]
+            return False, _retry_after(previous, current, limit, elapsed, window_seconds)
+
+        self._windows[key] = [index, current + 1, previous]
+        self._windows.move_to_end(key)
+        while len(self._windows) > self.max_keys:
+            self._windows.popitem(last=False)
+        return True, 0.0
+
+    async def refund(self, key: str, window_seconds: float):
+        index, _ = _window_position(window_seconds)
+        window = self._windows.get(key)
+        if window is not None and window[0] == index and window[1] > 0:
+            window[1] -= 1
+
+
+class MongoRateLimitBackend:
+    """Counters shared by every worker, one document per key and fixed window.
+
+    Documents are incremented atomically with ``$inc`` and removed by a TTL index on
+    ``expires_at`` once neither they nor their successor window are needed.
+    """
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def hit(self, key: str, limit: int, window_seconds: float) -> Tuple[bool, float]:
+        index, elapsed = _window_position(window_seconds)
+        current_id = f"{key}:{index}"
+        current_doc, previous_doc = await asyncio.gather(
+            self.collection.find_one_and_update(
+                {"_id": current_id},
+                {
+                    "$inc": {"count": 1},
+                    "$setOnInsert": {"expires_at": datetime.utcfromtimestamp((index + 2) * window_seconds)},
+                },
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            ),
+            self.collection.find_one({"_id": f"{key}:{index - 1}"}, {"count": 1}),
+        )
+        current = current_doc["count"]
+        previous = previous_doc["count"] if previous_doc else 0
+
+        if _estimate(previous, current, elapsed) > limit:
+            # Rejected requests do not consume quota
+            await self.collection.update_one({"_id": current_id}, {"$inc": {"count": -1}})
+            return False, _retry_after(previous, current - 1, limit, elapsed, window_seconds)
+        return True, 0.0
+
+    async def refund(self, key: str, window_seconds: float):
+        index, _ = _window_position(window_seconds)
+        await self.collection.update_one({"_id": f"{key}:{index}", "count": {"$gt": 0}}, {"$inc": {"count": -1}})
+
+
+def create_backend(name: str = RATE_LIMIT_BACKEND, collection=None):
+    if name == "mongo":
+        return MongoRateLimitBackend(collection)
+    if name == "memory":
+        return MemoryRateLimitBackend()
+    raise ValueError(f"Unknown rate limit backend '{name}'. Choose 'memory' or 'mongo'")
+
+
+class RateLimiter:
+    """Sliding-window-counter rate limiter with O(1) checks and a pluggable backend."""
+
+    def __init__(self, times: int, minutes: int, backend=None, name: str = ""):
+        self.times = times
+        self.minutes = minutes
+        self.backend = backend if backend is not None else MemoryRateLimitBackend()
+        self.name = name
+        self.rejections = 0
+
+    async def check(self, key: str, limit: Optional[int] = None):
+        allowed, retry_after = await self.backend.hit(
+            f"{self.name}:{key}", limit if limit is not None else self.times, self.minutes * 60
+        )
+        if not allowed:
+            self.rejections += 1
+            RATE_LIMIT_REJECTIONS.labels(self.name or "default").inc()
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many requests",
+                headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+            )
+
+    async def refund(self, key: str):
+        """Give back a request allowed by ``check``, e.g. one that failed for reasons of our own.
+
+        Only a request counted in the current window is refunded.
+        """
+        await self.backend.refund(f"{self.name}:{key}", self.minutes * 60)
@@ -0,0 +1,103 @@
+import hashlib
+import json
+import os
+import re
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from pymongo import errors
+
+from cache import LRUCache
+
+
+# Response cache configuration
+RESPONSE_CACHE_MAX_ENTRIES = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "1024"))
+RESPONSE_CACHE_TTL_SECONDS = int(os.getenv("RESPONSE_CACHE_TTL_SECONDS", str(24 * 60 * 60)))
+RESPONSE_CACHE_SHARED = os.getenv("RESPONSE_CACHE_SHARED", "false").lower() == "true"
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Ignore line-ending style, trailing spaces and surrounding blank lines."""
+    lines = prompt.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    return re.sub(r"\n{3,}", "\n\n", "\n".join(line.rstrip() for line in lines)).strip()
+
+
+class ResponseCache:
+    """Content-addressed cache of deterministic (greedy) generations.
+
+    Entries are keyed by a hash of the model, backend, generation parameters and
+    normalized prompt. Lookups go to an in-process LRU first and then, when a Motor
+    collection is given, to a shared MongoDB tier whose documents expire through a
+    TTL index on ``created_at``.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = RESPONSE_CACHE_MAX_ENTRIES,
+        ttl_seconds: int = RESPONSE_CACHE_TTL_SECONDS,
+        collection=None,
+    ):
+        self.ttl_seconds = ttl_seconds
+        self.collection = collection
+        self._local = LRUCache(max_entries, ttl_seconds=ttl_seconds)
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+
+    @staticmethod
+    def key(model_name: str, backend_name: str, params: Dict[str, Any], prompt: str) -> str:
+        material = json.dumps(
+            {"model": model_name, "backend": backend_name, "params": params, "prompt": normalize_prompt(prompt)},
+            sort_keys=True,
+        )
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    async def get(self, key: str) -> Optional[str]:
+        entry = self._local.get(key)
+        if entry is None and self.collection is not None:
+            try:
+                document = await self.collection.find_one({"_id": key})
+            except errors.PyMongoError as e:
+                print(f"Error reading shared response cache: {str(e)}")
+                document = None
+            if document is not None:
+                entry = (document["response"], document.get("generation_seconds", 0.0))
+                self._local.set(key, entry)
+                self.shared_hits += 1
+
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.saved_seconds += entry[1]
+        return entry[0]
+
+    async def put(self, key: str, response: str, generation_seconds: float) -> None:
+        self._local.set(key, (response, generation_seconds))
+        if self.collection is None:
+            return
+        try:
+            await self.collection.update_one(
+                {"_id": key},
+                {"$set": {
+                    "response": response,
+                    "generation_seconds": generation_seconds,
+                    "created_at": datetime.utcnow(),
+                }},
+                upsert=True,
+            )
+        except errors.PyMongoError as e:
+            print(f"Error writing shared response cache: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._local),
+            "shared": self.collection is not None,
+            "hits": self.hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "saved_inference_seconds": self.saved_seconds,
+        }
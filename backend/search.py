@@ -0,0 +1,348 @@
+import asyncio
+import heapq
+import math
+import os
+import re
+import threading
+from collections import Counter, defaultdict
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+from database import watch_changes
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+# Search configuration
+SEARCH_RESULTS = int(os.getenv("SEARCH_RESULTS", "3"))
+SEARCH_POLL_SECONDS = int(os.getenv("SEARCH_POLL_SECONDS", "300"))
+# e.g. sentence-transformers/all-MiniLM-L6-v2; empty disables the vector index
+SEARCH_EMBEDDING_MODEL = os.getenv("SEARCH_EMBEDDING_MODEL", "")
+BM25_K1 = 1.5
+BM25_B = 0.75
+RRF_K = 60
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "can", "do", "does", "for", "from", "how",
+    "i", "in", "is", "it", "me", "my", "of", "on", "or", "that", "the", "this", "to", "what",
+    "when", "where", "which", "why", "with", "you",
+}
+
+# Indexed fields and their weights, per collection
+SOURCES = {
+    "study_materials": {"title": 2, "description": 1, "content_text": 1},
+    "coding_exercises": {"title": 2, "exercise_title": 2, "description": 1, "exercise_description": 1},
+}
+
+DocumentKey = Tuple[str, str]
+
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in re.findall(r"[a-z0-9_+#]+", text.lower()) if token not in STOPWORDS]
+
+
+class BM25Index:
+    """Inverted index scored with Okapi BM25; documents can be added and removed one at a time."""
+
+    def __init__(self, k1: float = BM25_K1, b: float = BM25_B):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Dict[Hashable, int]] = defaultdict(dict)
+        self.lengths: Dict[Hashable, int] = {}
+        # Distinct terms per document, so removal only touches its own postings
+        self.terms: Dict[Hashable, List[str]] = {}
+        self.total_length = 0
+
+    def __len__(self) -> int:
+        return len(self.lengths)
+
+    def add(self, key: Hashable, tokens: List[str]):
+        self.remove(key)
+        frequencies = Counter(tokens)
+        for term, frequency in frequencies.items():
+            self.postings[term][key] = frequency
+        self.terms[key] = list(frequencies)
+        self.lengths[key] = len(tokens)
+        self.total_length += len(tokens)
+
+    def remove(self, key: Hashable):
+        if key not in self.lengths:
+            return
+        for term in self.terms.pop(key):
+            del self.postings[term][key]
+            if not self.postings[term]:
+                del self.postings[term]
+        self.total_length -= self.lengths.pop(key)
+
+    def search(self, query: str, k: int, accept: Optional[Callable[[Hashable], bool]] = None) -> List[Tuple[Hashable, float]]:
+        count = len(self.lengths)
+        if not count:
+            return []
+        average_length = self.total_length / count or 1
+        scores: Dict[Hashable, float] = defaultdict(float)
+        for term in set(tokenize(query)):
+            documents = self.postings.get(term)
+            if not documents:
+                continue
+            idf = math.log(1 + (count - len(documents) + 0.5) / (len(documents) + 0.5))
+            for key, frequency in documents.items():
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[key] / average_length)
+                scores[key] += idf * frequency * (self.k1 + 1) / (frequency + norm)
+        candidates = scores.items() if accept is None else ((key, score) for key, score in scores.items() if accept(key))
+        return heapq.nlargest(k, candidates, key=lambda item: item[1])
+
+
+class VectorIndex:
+    """Cosine-similarity search over unit vectors by a brute-force NumPy scan.
+
+    ``add``/``remove``/``search`` is the whole interface, so an ANN index (faiss,
+    hnswlib) can replace the scan once the corpus outgrows it.
+
+    ``add_many`` and ``search`` run in executor threads while ``remove`` runs on the
+    event loop, so the rows are guarded by a lock; embedding happens outside it.
+    """
+
+    def __init__(self, embed: Callable[[List[str]], Any]):
+        self.embed = embed
+        self.keys: List[Hashable] = []
+        self.positions: Dict[Hashable, int] = {}
+        self.matrix = None
+        self._lock = threading.Lock()
+
+    def add_many(self, items: List[Tuple[Hashable, str]]):
+        if not items:
+            return
+        vectors = np.asarray(self.embed([text for _, text in items]), dtype=np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True) + 1e-12
+        with self._lock:
+            new_rows = []
+            for (key, _), vector in zip(items, vectors):
+                position = self.positions.get(key)
+                if position is not None:
+                    self.matrix[position] = vector
+                    continue
+                self.positions[key] = len(self.keys)
+                self.keys.append(key)
+                new_rows.append(vector)
+            if new_rows:
+                # One copy per batch rather than one per row
+                rows = [self.matrix, np.stack(new_rows)] if self.matrix is not None else [np.stack(new_rows)]
+                self.matrix = np.vstack(rows)
+
+    def remove(self, key: Hashable):
+        with self._lock:
+            position = self.positions.pop(key, None)
+            if position is None:
+                return
+            # Move the last row into the hole so rows stay contiguous
+            last = len(self.keys) - 1
+            if position != last:
+                self.matrix[position] = self.matrix[last]
+                self.keys[position] = self.keys[last]
+                self.positions[self.keys[position]] = position
+            self.keys.pop()
+            self.matrix = self.matrix[:last]
+
+    def search(self, query: str, k: int, accept: Optional[Callable[[Hashable], bool]] = None) -> List[Tuple[Hashable, float]]:
+        if not self.keys:
+            return []
+        vector = np.asarray(self.embed([query])[0], dtype=np.float32)
+        with self._lock:
+            if not self.keys:
+                return []
+            scores = self.matrix @ (vector / (np.linalg.norm(vector) + 1e-12))
+            keys = list(self.keys)
+        order = np.argsort(-scores)
+        results = []
+        for position in order:
+            key = keys[position]
+            if accept is None or accept(key):
+                results.append((key, float(scores[position])))
+                if len(results) == k:
+                    break
+        return results
+
+
+def load_embedder(model_name: str = SEARCH_EMBEDDING_MODEL) -> Optional[Callable[[List[str]], Any]]:
+    if not model_name:
+        return None
+    try:
+        from sentence_transformers import SentenceTransformer
+    except ImportError:
+        print("sentence-transformers is not installed; semantic search is disabled")
+        return None
+    if np is None:
+        print("NumPy is not installed; semantic search is disabled")
+        return None
+    model = SentenceTransformer(model_name)
+    return lambda texts: model.encode(texts)
+
+
+def reciprocal_rank_fusion(*rankings: List[Tuple[Hashable, float]]) -> List[Hashable]:
+    scores: Dict[Hashable, float] = defaultdict(float)
+    for ranking in rankings:
+        for rank, (key, _) in enumerate(ranking):
+            scores[key] += 1 / (RRF_K + rank + 1)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+class SearchIndex:
+    """In-memory search over study materials and coding exercises.
+
+    Every document is tokenized into a BM25 index over its title, description and
+    content text; when an embedding model is configured, it is also embedded into a
+    vector index and both rankings are merged with reciprocal rank fusion. Topic and
+    difficulty filters and the result payloads live in memory too, so queries never
+    reach MongoDB. Change streams (or polling on standalone servers) keep the index
+    current.
+    """
+
+    def __init__(self, database, embedder: Optional[Callable[[List[str]], Any]] = None, poll_seconds: int = SEARCH_POLL_SECONDS):
+        self.database = database
+        self.poll_seconds = poll_seconds
+        self.bm25 = BM25Index()
+        self.vectors = VectorIndex(embedder) if embedder is not None else None
+        self.documents: Dict[DocumentKey, Dict[str, Any]] = {}
+        # Keys per (source, topic) in insertion order, for topic lookups without a scan
+        self.topics: Dict[Tuple[str, Optional[str]], Dict[DocumentKey, None]] = defaultdict(dict)
+        self._watchers: List[asyncio.Task] = []
+
+    @staticmethod
+    def _text(source: str, document: Dict[str, Any]) -> Tuple[List[str], str]:
+        """Weighted tokens for BM25 and plain text for embedding."""
+        tokens: List[str] = []
+        parts: List[str] = []
+        for field, weight in SOURCES[source].items():
+            value = document.get(field)
+            if isinstance(value, str) and value:
+                tokens.extend(tokenize(value) * weight)
+                parts.append(value)
+        return tokens, "\n".join(parts)
+
+    @staticmethod
+    def _result(source: str, document: Dict[str, Any]) -> Dict[str, Any]:
+        if source == "study_materials":
+            return {
+                "title": document.get("title"),
+                "type": document.get("type"),
+                "url": document.get("url"),
+                "description": document.get("description"),
+            }
+        return {
+            "title": document.get("title") or document.get("exercise_title"),
+            "description": document.get("description") or document.get("exercise_description"),
+            "difficulty": document.get("difficulty_level"),
+        }
+
+    def _index(self, source: str, document: Dict[str, Any]) -> Tuple[DocumentKey, str]:
+        key = (source, str(document["_id"]))
+        tokens, text = self._text(source, document)
+        self.bm25.add(key, tokens)
+        self._unlink_topic(key)
+        self.topics[(source, document.get("topic"))][key] = None
+        self.documents[key] = {
+            "topic": document.get("topic"),
+            "difficulty_level": document.get("difficulty_level"),
+            "result": self._result(source, document),
+        }
+        return key, text
+
+    def _unlink_topic(self, key: DocumentKey):
+        document = self.documents.get(key)
+        if document is None:
+            return
+        topic_key = (key[0], document["topic"])
+        keys = self.topics.get(topic_key)
+        if keys is not None:
+            keys.pop(key, None)
+            if not keys:
+                del self.topics[topic_key]
+
+    def _remove(self, key: DocumentKey):
+        self.bm25.remove(key)
+        self._unlink_topic(key)
+        self.documents.pop(key, None)
+        if self.vectors is not None:
+            self.vectors.remove(key)
+
+    async def _embed(self, items: List[Tuple[DocumentKey, str]]):
+        if self.vectors is not None and items:
+            await asyncio.get_running_loop().run_in_executor(None, self.vectors.add_many, items)
+
+    async def load(self, source: str):
+        seen = set()
+        items = []
+        async for document in self.database.db[source].find({}):
+            key, text = self._index(source, document)
+            seen.add(key)
+            items.append((key, text))
+        for key in [key for key in self.documents if key[0] == source and key not in seen]:
+            self._remove(key)
+        await self._embed(items)
+
+    async def _on_change(self, source: str, change: Dict[str, Any]):
+        if change["operationType"] == "delete":
+            self._remove((source, str(change["documentKey"]["_id"])))
+        elif change.get("fullDocument") is not None:
+            await self._embed([self._index(source, change["fullDocument"])])
+
+    def _accept(self, source: Optional[str], topic: Optional[str], difficulty_level: Optional[str]):
+        def accept(key: DocumentKey) -> bool:
+            document = self.documents.get(key)
+            return (
+                document is not None
+                and (source is None or key[0] == source)
+                and (topic is None or document["topic"] == topic)
+                and (difficulty_level is None or document["difficulty_level"] == difficulty_level)
+            )
+        return accept
+
+    def by_topic(self, source: str, topic: str, difficulty_level: Optional[str] = None, k: int = SEARCH_RESULTS) -> List[Dict[str, Any]]:
+        results = []
+        for key in self.topics.get((source, topic), ()):
+            document = self.documents[key]
+            if difficulty_level is None or document["difficulty_level"] == difficulty_level:
+                results.append(document["result"])
+                if len(results) == k:
+                    break
+        return results
+
+    async def search(
+        self,
+        query: str,
+        k: int = SEARCH_RESULTS,
+        source: Optional[str] = None,
+        topic: Optional[str] = None,
+        difficulty_level: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        accept = self._accept(source, topic, difficulty_level)
+        lexical = self.bm25.search(query, k, accept)
+        if self.vectors is None:
+            keys = [key for key, _ in lexical]
+        else:
+            semantic = await asyncio.get_running_loop().run_in_executor(None, self.vectors.search, query, k, accept)
+            keys = reciprocal_rank_fusion(lexical, semantic)[:k]
+        return [self.documents[key]["result"] for key in keys if key in self.documents]
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "documents": len(self.bm25),
+            "terms": len(self.bm25.postings),
+            "vectors": len(self.vectors.keys) if self.vectors is not None else None,
+        }
+
+    async def start(self):
+        for source in SOURCES:
+            await self.load(source)
+            self._watchers.append(asyncio.create_task(watch_changes(
+                self.database.db[source],
+                lambda change, source=source: self._on_change(source, change),
+                lambda source=source: self.load(source),
+                self.poll_seconds,
+            )))
+
+    def stop(self):
+        for watcher in self._watchers:
+            watcher.cancel()
@@ -0,0 +1,198 @@
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from pymongo import UpdateOne
+
+
+# Submission statuses that count as a passed exercise: the grader's "success", plus
+# "completed", the only status the dashboard counted before grading existed
+COMPLETED_SUBMISSION_STATUSES = ["success", "completed"]
+ACTIVE_SESSION_MINUTES = 30
+NEW_TOPICS_DAYS = 7
+
+
+def day_id(moment: datetime) -> str:
+    return f"day:{moment.strftime('%Y-%m-%d')}"
+
+
+def start_of_day(moment: datetime) -> datetime:
+    return moment.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+class DashboardStats:
+    """Pre-aggregated counters behind the dashboard and admin statistics.
+
+    ``dashboard_stats`` holds one ``totals`` document and one document per UTC day
+    (topics seen, interactions, submissions, completed submissions). Writers call the
+    ``record_*`` methods; readers fetch a fixed number of documents. The two figures
+    that describe current chat documents rather than events (topics in use and active
+    sessions) are read from ``chatbot_interactions`` through its ``topic`` and
+    ``last_interaction`` indexes instead.
+    """
+
+    def __init__(self, database):
+        self.collection = database.dashboard_stats
+        self.database = database
+
+    async def record_chat(self, topic: Optional[str], moment: datetime, new_session: bool):
+        day_update: Dict[str, Any] = {
+            "$inc": {"interactions": 1},
+            "$setOnInsert": {"date": start_of_day(moment)},
+        }
+        if topic:
+            day_update["$addToSet"] = {"topics": topic}
+        operations = [UpdateOne({"_id": day_id(moment)}, day_update, upsert=True)]
+        if new_session:
+            operations.append(UpdateOne({"_id": "totals"}, {"$inc": {"sessions": 1}}, upsert=True))
+        await self.collection.bulk_write(operations, ordered=False)
+
+    async def record_submission(self, submission_date: datetime, status: str = "pending"):
+        completed = 1 if status in COMPLETED_SUBMISSION_STATUSES else 0
+        await self.collection.bulk_write([
+            UpdateOne(
+                {"_id": "totals"},
+                {"$inc": {"code_submissions": 1, "completed_submissions": completed}},
+                upsert=True
+            ),
+            UpdateOne(
+                {"_id": day_id(submission_date)},
+                {
+                    "$inc": {"submissions": 1, "completed_submissions": completed},
+                    "$setOnInsert": {"date": start_of_day(submission_date)},
+                },
+                upsert=True
+            ),
+        ], ordered=False)
+
+    async def record_submission_status(self, submission_date: datetime, old_status: str, new_status: str):
+        await self.record_submission_statuses([(submission_date, old_status, new_status)])
+
+    async def record_submission_statuses(self, changes: List[Tuple[datetime, str, str]]):
+        """Apply many (submission_date, old_status, new_status) changes in one bulk write."""
+        total = 0
+        per_day: Dict[str, Tuple[datetime, int]] = {}
+        for submission_date, old_status, new_status in changes:
+            was_completed = old_status in COMPLETED_SUBMISSION_STATUSES
+            is_completed = new_status in COMPLETED_SUBMISSION_STATUSES
+            if was_completed == is_completed:
+                continue
+            delta = 1 if is_completed else -1
+            total += delta
+            day = day_id(submission_date)
+            per_day[day] = (submission_date, per_day.get(day, (submission_date, 0))[1] + delta)
+
+        operations = [
+            UpdateOne(
+                {"_id": day},
+                {
+                    "$inc": {"completed_submissions": delta},
+                    "$setOnInsert": {"date": start_of_day(submission_date)},
+                },
+                upsert=True
+            )
+            for day, (submission_date, delta) in per_day.items() if delta
+        ]
+        if total:
+            operations.append(UpdateOne({"_id": "totals"}, {"$inc": {"completed_submissions": total}}, upsert=True))
+        if operations:
+            await self.collection.bulk_write(operations, ordered=False)
+
+    async def dashboard(self) -> Dict[str, Any]:
+        now = datetime.utcnow()
+        ids = ["totals"] + [day_id(now - timedelta(days=i)) for i in range(NEW_TOPICS_DAYS)]
+        documents = {
+            doc["_id"]: doc
+            for doc in await self.collection.find({"_id": {"$in": ids}}).to_list(length=len(ids))
+        }
+        totals = documents.get("totals", {})
+        today = documents.get(day_id(now), {})
+
+        week_topics = set()
+        for document_id in ids[1:]:
+            week_topics.update(documents.get(document_id, {}).get("topics", []))
+
+        # Topics currently set on a chat document; a distinct scan of the topic index
+        topics = await self.database.chatbot_interactions.distinct("topic")
+        total_exercises = await self.database.coding_exercises.estimated_document_count()
+        return {
+            "sessions_count": totals.get("sessions", 0),
+            "topics_count": len([topic for topic in topics if topic]),
+            "new_topics_count": len(week_topics),
+            "total_exercises": total_exercises,
+            "passed_submissions": totals.get("completed_submissions", 0),
+            "passed_today": today.get("completed_submissions", 0),
+        }
+
+    async def admin(self) -> Dict[str, Any]:
+        totals = await self.collection.find_one({"_id": "totals"}) or {}
+        # Conversations with a turn in the window: a range count on last_interaction
+        active_since = datetime.utcnow() - timedelta(minutes=ACTIVE_SESSION_MINUTES)
+        return {
+            "total_users": await self.database.users.estimated_document_count(),
+            "active_sessions": await self.database.chatbot_interactions.count_documents(
+                {"last_interaction": {"$gte": active_since}}
+            ),
+            "code_submissions": totals.get("code_submissions", 0),
+        }
+
+    async def rebuild(self) -> Dict[str, Any]:
+        """Recompute every counter from the source collections.
+
+        Writes that happen while the rebuild runs may be lost; run it during a quiet
+        period or rerun it afterwards.
+        """
+        chats = self.database.chatbot_interactions
+        submissions = self.database.code_submissions
+
+        totals = {
+            "_id": "totals",
+            "sessions": await chats.count_documents({}),
+            "code_submissions": await submissions.count_documents({}),
+            "completed_submissions": await submissions.count_documents(
+                {"status": {"$in": COMPLETED_SUBMISSION_STATUSES}}
+            ),
+        }
+
+        days: Dict[str, Dict[str, Any]] = {}
+
+        def day(moment: datetime) -> Dict[str, Any]:
+            return days.setdefault(day_id(moment), {
+                "_id": day_id(moment),
+                "date": start_of_day(moment),
+                "topics": [],
+                "interactions": 0,
+                "submissions": 0,
+                "completed_submissions": 0,
+            })
+
+        async for row in chats.aggregate([
+            {"$match": {"last_interaction": {"$type": "date"}}},
+            {"$group": {
+                "_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$last_interaction"}},
+                "topics": {"$addToSet": "$topic"},
+                "interactions": {"$sum": 1},
+            }},
+        ]):
+            document = day(datetime.strptime(row["_id"], "%Y-%m-%d"))
+            document["topics"] = [topic for topic in row["topics"] if topic]
+            document["interactions"] = row["interactions"]
+
+        async for row in submissions.aggregate([
+            {"$match": {"submission_date": {"$type": "date"}}},
+            {"$group": {
+                "_id": {"$dateToString": {"format": "%Y-%m-%d", "date": "$submission_date"}},
+                "submissions": {"$sum": 1},
+                "completed_submissions": {"$sum": {
+                    "$cond": [{"$in": ["$status", COMPLETED_SUBMISSION_STATUSES]}, 1, 0]
+                }},
+            }},
+        ]):
+            document = day(datetime.strptime(row["_id"], "%Y-%m-%d"))
+            document["submissions"] = row["submissions"]
+            document["completed_submissions"] = row["completed_submissions"]
+
+        await self.collection.delete_many({})
+        await self.collection.insert_many([totals] + list(days.values()))
+
+        counters = {key: value for key, value in totals.items() if key != "_id"}
+        return {**counters, "days": len(days)}
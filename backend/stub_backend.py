@@ -0,0 +1,78 @@
+import asyncio
+import os
+import threading
+import time
+from typing import Iterator, List, Optional
+
+from kv_cache import KVCache
+
+
+# Simulated decode time per generated word; 0 measures pure serving overhead
+INFERENCE_STUB_TOKEN_MS = float(os.getenv("INFERENCE_STUB_TOKEN_MS", "0"))
+INFERENCE_STUB_TOKENS = int(os.getenv("INFERENCE_STUB_TOKENS", "20"))
+
+
+class StubStreamer:
+    def __init__(self, loop: asyncio.AbstractEventLoop, queue: asyncio.Queue):
+        self.loop = loop
+        self.queue = queue
+
+    def put(self, text: str):
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, text)
+
+
+class StubBackend:
+    """Canned responses with no model behind them (``INFERENCE_BACKEND=stub``).
+
+    Has the same entry points as ``TorchBackend`` but imports neither torch nor
+    transformers, so benchmarks can measure everything around the model. Output is
+    the prompt followed by ``INFERENCE_STUB_TOKENS`` words, one every
+    ``INFERENCE_STUB_TOKEN_MS`` milliseconds.
+    """
+
+    def __init__(self, model_name: str, timeout: float):
+        self.model_name = model_name
+        self.timeout = timeout
+
+    def make_streamer(self, loop: asyncio.AbstractEventLoop, queue: asyncio.Queue) -> StubStreamer:
+        return StubStreamer(loop, queue)
+
+    def _words(self, max_length: int, prompt: str, cancelled: Optional[threading.Event] = None) -> Iterator[str]:
+        for i in range(max(1, min(INFERENCE_STUB_TOKENS, max_length - len(prompt.split())))):
+            if cancelled is not None and cancelled.is_set():
+                return
+            if INFERENCE_STUB_TOKEN_MS > 0:
+                time.sleep(INFERENCE_STUB_TOKEN_MS / 1000)
+            yield f" word{i}"
+
+    def generate_batch(self, prompts: List[str], max_length: int, truncate_prompt_to: Optional[int]) -> List[str]:
+        return [prompt + "".join(self._words(max_length, prompt)) for prompt in prompts]
+
+    def generate_streaming(
+        self,
+        prompt: str,
+        max_length: int,
+        truncate_prompt_to: Optional[int],
+        streamer: StubStreamer,
+        cancelled: threading.Event,
+    ):
+        self.generate_cached(prompt, max_length, truncate_prompt_to, None, "", streamer, cancelled)
+
+    def generate_cached(
+        self,
+        prompt: str,
+        max_length: int,
+        truncate_prompt_to: Optional[int],
+        kv_cache: Optional[KVCache],
+        cache_key: str,
+        streamer: Optional[StubStreamer] = None,
+        cancelled: Optional[threading.Event] = None,
+    ) -> str:
+        parts = [prompt]
+        if streamer is not None:
+            streamer.put(prompt)
+        for word in self._words(max_length, prompt, cancelled):
+            parts.append(word)
+            if streamer is not None:
+                streamer.put(word)
+        return "".join(parts)
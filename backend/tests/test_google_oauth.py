@@ -0,0 +1,305 @@
+"""GoogleOAuthClient against a local stand-in for Google, served by httpx.MockTransport."""
+import asyncio
+import json
+import time
+
+import httpx
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from jose import jwk, jwt
+
+import google_oauth
+from google_oauth import GoogleOAuthClient, InvalidIDToken, JWKSCache
+
+
+CLIENT_ID = "client-id.apps.googleusercontent.com"
+
+
+class StandIn:
+    """Answers each URL with the queued responses in turn, the last one repeating."""
+
+    def __init__(self, routes):
+        self.routes = {url: list(responses) for url, responses in routes.items()}
+        self.calls = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        url = str(request.url).split("?")[0]
+        self.calls.append((request.method, url))
+        responses = self.routes[url]
+        response = responses.pop(0) if len(responses) > 1 else responses[0]
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    def count(self, url: str) -> int:
+        return sum(1 for _, called in self.calls if called == url)
+
+
+def make_client(stand_in: StandIn) -> GoogleOAuthClient:
+    http = httpx.AsyncClient(transport=httpx.MockTransport(stand_in))
+    return GoogleOAuthClient(CLIENT_ID, "secret", "http://localhost/callback", http_client=http)
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    """Backoff delays, recorded instead of slept; jitter returns its upper bound."""
+    delays = []
+
+    async def sleep(seconds):
+        delays.append(seconds)
+
+    monkeypatch.setattr(google_oauth.asyncio, "sleep", sleep)
+    monkeypatch.setattr(google_oauth.random, "uniform", lambda low, high: high)
+    monkeypatch.setattr(google_oauth, "HTTP_RETRIES", 2)
+    monkeypatch.setattr(google_oauth, "HTTP_RETRY_BACKOFF_SECONDS", 0.2)
+    return delays
+
+
+def test_get_retries_server_errors_with_exponential_backoff(sleeps):
+    url = google_oauth.GOOGLE_USERINFO_URL
+    stand_in = StandIn({url: [httpx.Response(503), httpx.Response(429), httpx.Response(200, json={"email": "a@example.com"})]})
+    client = make_client(stand_in)
+
+    assert run(client.user_info("token")) == {"email": "a@example.com"}
+    assert stand_in.count(url) == 3
+    assert sleeps == pytest.approx([0.2, 0.4])
+
+
+def test_backoff_is_jittered(monkeypatch, sleeps):
+    bounds = []
+    monkeypatch.setattr(google_oauth.random, "uniform", lambda low, high: bounds.append((low, high)) or 0)
+    url = google_oauth.GOOGLE_USERINFO_URL
+    client = make_client(StandIn({url: [httpx.Response(500), httpx.Response(200, json={})]}))
+
+    run(client.user_info("token"))
+    assert bounds == [(0, pytest.approx(0.2))]
+    assert sleeps == [0]
+
+
+def test_get_gives_up_after_the_last_retry(sleeps):
+    url = google_oauth.GOOGLE_USERINFO_URL
+    stand_in = StandIn({url: [httpx.Response(503)]})
+    client = make_client(stand_in)
+
+    with pytest.raises(httpx.HTTPStatusError):
+        run(client.user_info("token"))
+    assert stand_in.count(url) == 3
+
+
+def test_client_errors_are_not_retried(sleeps):
+    url = google_oauth.GOOGLE_USERINFO_URL
+    stand_in = StandIn({url: [httpx.Response(401)]})
+    client = make_client(stand_in)
+
+    with pytest.raises(httpx.HTTPStatusError):
+        run(client.user_info("token"))
+    assert stand_in.count(url) == 1
+    assert sleeps == []
+
+
+def test_post_is_not_retried_on_server_error(sleeps):
+    url = google_oauth.GOOGLE_TOKEN_URL
+    stand_in = StandIn({url: [httpx.Response(503), httpx.Response(200, json={"access_token": "t"})]})
+    client = make_client(stand_in)
+
+    # A retried POST could redeem the authorization code twice
+    with pytest.raises(httpx.HTTPStatusError):
+        run(client.exchange_code("code"))
+    assert stand_in.count(url) == 1
+
+
+def test_post_is_retried_when_the_connection_fails(sleeps):
+    url = google_oauth.GOOGLE_TOKEN_URL
+    stand_in = StandIn({url: [httpx.ConnectError("refused"), httpx.Response(200, json={"access_token": "t"})]})
+    client = make_client(stand_in)
+
+    assert run(client.exchange_code("code")) == {"access_token": "t"}
+    assert stand_in.count(url) == 2
+
+
+def test_access_token_verification_is_cached(sleeps):
+    tokeninfo, userinfo = google_oauth.GOOGLE_TOKENINFO_URL, google_oauth.GOOGLE_USERINFO_URL
+    stand_in = StandIn({
+        tokeninfo: [httpx.Response(200, json={"expires_in": "3599"})],
+        userinfo: [httpx.Response(200, json={"email": "a@example.com"})],
+    })
+    client = make_client(stand_in)
+
+    async def verify_twice():
+        return await client.verify_access_token("token"), await client.verify_access_token("token")
+
+    first, second = run(verify_twice())
+    assert first == second == {"email": "a@example.com"}
+    assert stand_in.count(tokeninfo) == 1
+    assert stand_in.count(userinfo) == 1
+
+
+def test_access_token_cache_never_outlives_the_token(sleeps):
+    tokeninfo, userinfo = google_oauth.GOOGLE_TOKENINFO_URL, google_oauth.GOOGLE_USERINFO_URL
+    stand_in = StandIn({
+        tokeninfo: [httpx.Response(200, json={"expires_in": "0"})],
+        userinfo: [httpx.Response(200, json={"email": "a@example.com"})],
+    })
+    client = make_client(stand_in)
+
+    async def verify_twice():
+        await client.verify_access_token("token")
+        await client.verify_access_token("token")
+
+    run(verify_twice())
+    assert stand_in.count(tokeninfo) == 2
+
+
+@pytest.fixture
+def signing_key(tmp_path):
+    """An RSA key, and a file:// JWKS URL publishing its public half as ``kid`` "test"."""
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    private_pem = private_key.private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    ).decode()
+    public_pem = private_key.public_key().public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+    ).decode()
+    public_jwk = {**jwk.construct(public_pem, "RS256").to_dict(), "kid": "test", "use": "sig"}
+    path = tmp_path / "jwks.json"
+    path.write_text(json.dumps({"keys": [public_jwk]}))
+    return private_pem, f"file://{path}"
+
+
+def id_token(private_pem: str, kid: str = "test", **claims) -> str:
+    now = int(time.time())
+    payload = {
+        "iss": "https://accounts.google.com",
+        "aud": CLIENT_ID,
+        "sub": "1234",
+        "email": "a@example.com",
+        "email_verified": True,
+        "name": "A",
+        "iat": now,
+        "exp": now + 3600,
+        **claims,
+    }
+    return jwt.encode(payload, private_pem, algorithm="RS256", headers={"kid": kid})
+
+
+def file_jwks_client(jwks_url: str, tmp_path) -> GoogleOAuthClient:
+    # Any HTTP request fails the test: a file:// key set must not touch the network
+    client = make_client(StandIn({}))
+    client.jwks = JWKSCache(client.http, url=jwks_url, cache_path=str(tmp_path / "cache.json"))
+    return client
+
+
+def test_id_token_is_verified_against_a_file_jwks(signing_key, tmp_path):
+    private_pem, jwks_url = signing_key
+    client = file_jwks_client(jwks_url, tmp_path)
+
+    profile = run(client.verify_token(id_token(private_pem)))
+    assert profile["email"] == "a@example.com"
+    assert profile["name"] == "A"
+    # Local key sets are not copied to the disk cache
+    assert not (tmp_path / "cache.json").exists()
+
+
+@pytest.mark.parametrize("claims", [
+    {"aud": "someone-else"},
+    {"iss": "https://evil.example.com"},
+    {"exp": int(time.time()) - 60},
+    {"email_verified": False},
+    {"email_verified": "false"},
+    {"email": ""},
+])
+def test_invalid_id_tokens_are_rejected(signing_key, tmp_path, claims):
+    private_pem, jwks_url = signing_key
+    client = file_jwks_client(jwks_url, tmp_path)
+
+    with pytest.raises(InvalidIDToken):
+        run(client.verify_id_token(id_token(private_pem, **claims)))
+
+
+def test_id_token_with_an_unknown_key_is_rejected(signing_key, tmp_path):
+    private_pem, jwks_url = signing_key
+    client = file_jwks_client(jwks_url, tmp_path)
+
+    with pytest.raises(InvalidIDToken):
+        run(client.verify_id_token(id_token(private_pem, kid="other")))
+
+
+def test_id_token_signed_by_another_key_is_rejected(signing_key, tmp_path):
+    _, jwks_url = signing_key
+    other_pem = rsa.generate_private_key(public_exponent=65537, key_size=2048).private_bytes(
+        serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+    ).decode()
+    client = file_jwks_client(jwks_url, tmp_path)
+
+    with pytest.raises(InvalidIDToken):
+        run(client.verify_id_token(id_token(other_pem)))
+
+
+def jwks_response(public_jwk, max_age=300):
+    return httpx.Response(200, json={"keys": [public_jwk]}, headers={"cache-control": f"public, max-age={max_age}"})
+
+
+def test_jwks_disk_cache_is_private_and_reloaded(tmp_path):
+    path = tmp_path / "jwks.json"
+    url = google_oauth.GOOGLE_JWKS_URL
+    http = httpx.AsyncClient(transport=httpx.MockTransport(StandIn({url: [jwks_response({"kid": "k", "kty": "RSA"})]})))
+    run(JWKSCache(http, url=url, cache_path=str(path)).refresh())
+
+    assert path.stat().st_mode & 0o777 == 0o600
+    reloaded = JWKSCache(http, url=url, cache_path=str(path))
+    assert list(reloaded.keys) == ["k"]
+    assert reloaded.expires_at <= time.time() + 300
+
+
+def planted_cache(path, **fields):
+    cached = {
+        "url": google_oauth.GOOGLE_JWKS_URL,
+        "fetched_at": time.time(),
+        "max_age": 300,
+        "keys": [{"kid": "forged", "kty": "RSA"}],
+        **fields,
+    }
+    path.write_text(json.dumps(cached))
+    path.chmod(0o600)
+
+
+def test_world_writable_jwks_cache_is_ignored(tmp_path):
+    path = tmp_path / "jwks.json"
+    planted_cache(path)
+    path.chmod(0o666)
+
+    assert JWKSCache(None, cache_path=str(path)).keys == {}
+
+
+@pytest.mark.skipif(google_oauth.os.getuid() != 0, reason="changing a file's owner needs root")
+def test_foreign_owned_jwks_cache_is_ignored(tmp_path):
+    path = tmp_path / "jwks.json"
+    planted_cache(path)
+    google_oauth.os.chown(path, 65534, 65534)
+
+    assert JWKSCache(None, cache_path=str(path)).keys == {}
+
+
+def test_jwks_cache_symlink_is_not_followed(tmp_path):
+    target = tmp_path / "elsewhere.json"
+    planted_cache(target)
+    (tmp_path / "jwks.json").symlink_to(target)
+
+    assert JWKSCache(None, cache_path=str(tmp_path / "jwks.json")).keys == {}
+
+
+def test_jwks_cache_lifetime_is_clamped(tmp_path):
+    path = tmp_path / "jwks.json"
+    planted_cache(path, max_age=10 ** 9, expires_at=10 ** 12)
+
+    cache = JWKSCache(None, cache_path=str(path))
+    assert cache.expires_at <= time.time() + google_oauth.JWKS_MAX_AGE_SECONDS
+
+    planted_cache(path, fetched_at=time.time() - 600, max_age=300)
+    assert JWKSCache(None, cache_path=str(path)).expires_at < time.time()
+
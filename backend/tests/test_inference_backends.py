@@ -0,0 +1,75 @@
+"""The int8 and compiled backends against eager, on a tiny randomly initialized GPT-2."""
+import copy
+
+import pytest
+
+torch = pytest.importorskip("torch")
+transformers = pytest.importorskip("transformers")
+from tokenizers import ByteLevelBPETokenizer
+
+from inference_backend import _conv1d_to_linear, create_backend
+
+
+PROMPTS = [
+    "User: What is a Python list comprehension?\nAI:",
+    "Analyze this code and provide detailed feedback:\ndef add(a, b):\n    return a + b\n",
+]
+
+
+@pytest.fixture(scope="module")
+def model_dir(tmp_path_factory):
+    """A 2-layer GPT-2 with a small byte-level BPE tokenizer, saved like a hub model."""
+    path = str(tmp_path_factory.mktemp("tiny-gpt2"))
+    bpe = ByteLevelBPETokenizer()
+    bpe.train_from_iterator(PROMPTS * 10, vocab_size=300, special_tokens=["<|endoftext|>"])
+    tokenizer = transformers.GPT2TokenizerFast(
+        tokenizer_object=bpe._tokenizer,
+        bos_token="<|endoftext|>",
+        eos_token="<|endoftext|>",
+        unk_token="<|endoftext|>",
+    )
+    tokenizer.save_pretrained(path)
+    torch.manual_seed(0)
+    config = transformers.GPT2Config(
+        vocab_size=len(tokenizer), n_positions=128, n_embd=64, n_layer=2, n_head=2, bos_token_id=0, eos_token_id=0
+    )
+    transformers.GPT2LMHeadModel(config).save_pretrained(path)
+    return path
+
+
+@pytest.fixture(scope="module")
+def eager(model_dir):
+    return create_backend("eager", model_dir, timeout=60)
+
+
+def logits(backend, prompt: str):
+    with torch.no_grad():
+        return backend.model(**backend.tokenizer(prompt, return_tensors="pt")).logits
+
+
+def test_conv1d_to_linear_keeps_the_outputs(eager):
+    linear = _conv1d_to_linear(copy.deepcopy(eager.model))
+    for prompt in PROMPTS:
+        with torch.no_grad():
+            converted = linear(**eager.tokenizer(prompt, return_tensors="pt")).logits
+        torch.testing.assert_close(converted, logits(eager, prompt))
+
+
+def test_int8_logits_stay_close_to_eager(model_dir, eager):
+    int8 = create_backend("int8", model_dir, timeout=60)
+    for prompt in PROMPTS:
+        reference, quantized = logits(eager, prompt), logits(int8, prompt)
+        assert (quantized - reference).abs().max() <= 0.05 * reference.abs().max()
+        assert (quantized.argmax(-1) == reference.argmax(-1)).float().mean() >= 0.9
+
+
+def test_compiled_logits_match_eager(model_dir, eager):
+    compiled = create_backend("compile", model_dir, timeout=60)
+    for prompt in PROMPTS:
+        torch.testing.assert_close(logits(compiled, prompt), logits(eager, prompt), atol=1e-4, rtol=1e-4)
+
+
+def test_batched_generation_matches_one_at_a_time(eager):
+    # Left padding must not change what each prompt generates
+    batched = eager.generate_batch(PROMPTS, 60, None)
+    assert batched == [eager.generate_batch([prompt], 60, None)[0] for prompt in PROMPTS]
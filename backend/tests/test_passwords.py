@@ -0,0 +1,60 @@
+"""PasswordHasher with the real bcrypt backend, through its process pool."""
+import asyncio
+
+import pytest
+
+from passlib.hash import bcrypt
+
+from passwords import BCRYPT_ROUNDS, PasswordHasher, TooManyFailedAttempts, pwd_context
+
+
+@pytest.fixture
+def hasher():
+    hasher = PasswordHasher(workers=1, max_failed_attempts=2)
+    yield hasher
+    hasher.shutdown()
+
+
+def test_hash_and_verify_in_the_pool(hasher):
+    async def scenario():
+        hashed = await hasher.hash("Correct-horse-1")
+        return hashed, await hasher.verify("a@example.com", "Correct-horse-1", hashed), \
+            await hasher.verify("b@example.com", "wrong", hashed)
+
+    hashed, valid, invalid = asyncio.run(scenario())
+    assert hashed.startswith("$2b$")
+    assert pwd_context.verify("Correct-horse-1", hashed)
+    assert valid == (True, None)
+    assert invalid == (False, None)
+
+
+def test_long_passwords_hash(hasher):
+    # bcrypt only looks at the first 72 bytes; hashing must not fail on longer input
+    password = "x" * 100
+    hashed = asyncio.run(hasher.hash(password))
+    assert pwd_context.verify(password, hashed)
+
+
+def test_unknown_accounts_are_checked_against_a_dummy_hash(hasher):
+    assert asyncio.run(hasher.verify("nobody@example.com", "anything", None)) == (False, None)
+
+
+def test_lockout_after_failed_attempts(hasher):
+    async def scenario():
+        hashed = await hasher.hash("Correct-horse-1")
+        for _ in range(2):
+            await hasher.verify("a@example.com", "wrong", hashed)
+        await hasher.verify("a@example.com", "Correct-horse-1", hashed)
+
+    with pytest.raises(TooManyFailedAttempts):
+        asyncio.run(scenario())
+
+
+def test_outdated_hashes_are_replaced():
+    weak = bcrypt.using(rounds=BCRYPT_ROUNDS - 1).hash("Correct-horse-1")
+    hasher = PasswordHasher(workers=1)
+    try:
+        valid, new_hash = asyncio.run(hasher.verify("a@example.com", "Correct-horse-1", weak))
+    finally:
+        hasher.shutdown()
+    assert valid and new_hash is not None and new_hash != weak
@@ -0,0 +1,127 @@
+import asyncio
+import heapq
+import os
+import time
+from collections import Counter, OrderedDict, defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional
+
+from database import watch_changes
+
+
+# Topic suggestion configuration
+TOPIC_SUGGESTIONS = int(os.getenv("TOPIC_SUGGESTIONS", "5"))
+TOPIC_POPULARITY_WINDOW_HOURS = int(os.getenv("TOPIC_POPULARITY_WINDOW_HOURS", "24"))
+TOPIC_GRAPH_POLL_SECONDS = int(os.getenv("TOPIC_GRAPH_POLL_SECONDS", "300"))
+
+
+def build_related_topics(paths: Iterable[Dict[str, Any]], limit: int = TOPIC_SUGGESTIONS) -> Dict[str, List[str]]:
+    """For every topic, the topics sharing the most learning paths with it (ties by name)."""
+    co_occurrence: Dict[str, Counter] = defaultdict(Counter)
+    for path in paths:
+        topics = {topic for topic in path.get("topics", []) if topic}
+        for topic in topics:
+            for other in topics:
+                if other != topic:
+                    co_occurrence[topic][other] += 1
+    return {
+        topic: [other for other, _ in sorted(counts.items(), key=lambda item: (-item[1], item[0]))[:limit]]
+        for topic, counts in co_occurrence.items()
+    }
+
+
+class TopicGraph:
+    """In-memory topic suggestions, answered without a database round trip.
+
+    Related topics are precomputed from ``learning_paths`` and reloaded when the
+    collection changes: through a change stream on replica sets, otherwise by polling
+    every ``poll_seconds``. Popular topics are chat counts over a rolling window of
+    hourly buckets, incremented by ``record`` as chats are saved and seeded from
+    ``chatbot_interactions`` at startup. Each worker counts its own chats.
+    """
+
+    def __init__(
+        self,
+        database,
+        window_hours: int = TOPIC_POPULARITY_WINDOW_HOURS,
+        poll_seconds: int = TOPIC_GRAPH_POLL_SECONDS,
+    ):
+        self.database = database
+        self.window_hours = window_hours
+        self.poll_seconds = poll_seconds
+        self.related: Dict[str, List[str]] = {}
+        self._buckets: "OrderedDict[int, Counter]" = OrderedDict()
+        self._totals: Counter = Counter()
+        self._popular: Optional[List[str]] = []
+        self._watcher: Optional[asyncio.Task] = None
+
+    @staticmethod
+    def _hour(moment: Optional[datetime] = None) -> int:
+        timestamp = (moment - datetime(1970, 1, 1)).total_seconds() if moment else time.time()
+        return int(timestamp // 3600)
+
+    async def load_paths(self):
+        paths = await self.database.learning_paths.find({}, {"topics": 1}).to_list(length=None)
+        self.related = build_related_topics(paths)
+
+    async def load_popular(self):
+        since = datetime.utcnow() - timedelta(hours=self.window_hours)
+        self._buckets.clear()
+        self._totals.clear()
+        async for row in self.database.chatbot_interactions.aggregate([
+            {"$match": {"last_interaction": {"$gte": since}, "topic": {"$nin": [None, ""]}}},
+            {"$group": {
+                "_id": {
+                    "topic": "$topic",
+                    "hour": {"$dateToString": {"format": "%Y-%m-%dT%H", "date": "$last_interaction"}},
+                },
+                "count": {"$sum": 1},
+            }},
+        ]):
+            hour = self._hour(datetime.strptime(row["_id"]["hour"], "%Y-%m-%dT%H"))
+            self._buckets.setdefault(hour, Counter())[row["_id"]["topic"]] += row["count"]
+            self._totals[row["_id"]["topic"]] += row["count"]
+        self._buckets = OrderedDict(sorted(self._buckets.items()))
+        self._popular = None
+
+    def _expire(self, hour: int):
+        while self._buckets and next(iter(self._buckets)) <= hour - self.window_hours:
+            _, counts = self._buckets.popitem(last=False)
+            self._totals.subtract(counts)
+            self._totals = +self._totals  # drop topics whose count reached zero
+            self._popular = None
+
+    def record(self, topic: Optional[str]):
+        if not topic:
+            return
+        hour = self._hour()
+        self._expire(hour)
+        self._buckets.setdefault(hour, Counter())[topic] += 1
+        self._totals[topic] += 1
+        self._popular = None
+
+    def popular(self) -> List[str]:
+        self._expire(self._hour())
+        if self._popular is None:
+            top = heapq.nlargest(TOPIC_SUGGESTIONS, self._totals.items(), key=lambda item: (item[1], item[0]))
+            self._popular = [topic for topic, _ in top]
+        return list(self._popular)
+
+    def suggest(self, topic: Optional[str] = None) -> List[str]:
+        if topic:
+            return list(self.related.get(topic, []))
+        return self.popular()
+
+    async def _on_path_change(self, change):
+        await self.load_paths()
+
+    async def start(self):
+        await self.load_paths()
+        await self.load_popular()
+        self._watcher = asyncio.create_task(watch_changes(
+            self.database.learning_paths, self._on_path_change, self.load_paths, self.poll_seconds
+        ))
+
+    def stop(self):
+        if self._watcher is not None:
+            self._watcher.cancel()
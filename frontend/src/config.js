@@ -13,6 +13,7 @@ export default {
             RECENT_ACTIVITY: '/api/dashboard/recent-activity'
         },
         CHAT: '/api/chat',
+        CHAT_STREAM: '/api/chat/stream',
         STUDY_MATERIALS: {
             LIST: '/api/study-materials',
             DETAIL: '/api/study-materials/:id'
@@ -47,6 +47,15 @@ const fadeIn = keyframes`
   to { opacity: 1; transform: translateY(0); }
 `;
 
+// Retry-After is in seconds; the daily quota can be hours away
+const formatWait = (seconds) => {
+  const totalMinutes = Math.max(1, Math.ceil(seconds / 60));
+  const hours = Math.floor(totalMinutes / 60);
+  const minutes = totalMinutes % 60;
+  if (!hours) return `${minutes} min`;
+  return minutes ? `${hours} h ${minutes} min` : `${hours} h`;
+};
+
 const Chatbot = () => {
   const [message, setMessage] = useState('');
   const [messages, setMessages] = useState(() => {
@@ -233,7 +242,7 @@ const Chatbot = () => {
     setIsLoading(true);
 
     try {
-      const response = await fetch(`${config.API_BASE_URL}${config.API_ENDPOINTS.CHAT}`, {
+      const response = await fetch(`${config.API_BASE_URL}${config.API_ENDPOINTS.CHAT_STREAM}`, {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
@@ -247,12 +256,15 @@ const Chatbot = () => {
       });
 
       if (!response.ok) {
-        const errorData = await response.json();
-        throw new Error(errorData.detail || 'Failed to send message');
+        const errorData = await response.json().catch(() => ({}));
+        const error = new Error(errorData.detail || 'Failed to send message');
+        if (response.status === 429) {
+          // Daily chat quota used up
+          error.retryAfter = Number(response.headers.get('Retry-After')) || null;
+        }
+        throw error;
       }
 
-      const data = await response.json();
-      
       // Update the user message status
       setMessages((prev) =>
         prev.map((msg) =>
@@ -260,21 +272,66 @@ const Chatbot = () => {
         )
       );
 
-      // Add bot's response
-      const botMessage = {
-        id: Date.now() + 1,
-        text: data.response,
+      // Add an empty bot message and fill it in as tokens arrive
+      const botMessageId = Date.now() + 1;
+      setMessages((prev) => [...prev, {
+        id: botMessageId,
+        text: '',
         sender: 'bot',
         timestamp: new Date().toISOString(),
-        suggested_topics: data.suggested_topics,
-        learning_resources: data.learning_resources
-      };
+      }]);
+      setIsLoading(false);
 
-      setMessages((prev) => [...prev, botMessage]);
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      let data = null;
+
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        // Server-Sent Events are separated by a blank line
+        const events = buffer.split('\n\n');
+        buffer = events.pop();
+        for (const rawEvent of events) {
+          const lines = rawEvent.split('\n');
+          const event = lines.find((line) => line.startsWith('event: '))?.slice(7);
+          const payload = JSON.parse(lines.find((line) => line.startsWith('data: '))?.slice(6) || '{}');
+
+          if (event === 'token') {
+            setMessages((prev) =>
+              prev.map((msg) =>
+                msg.id === botMessageId ? { ...msg, text: msg.text + payload.text } : msg
+              )
+            );
+          } else if (event === 'done') {
+            data = payload;
+          } else if (event === 'error') {
+            throw new Error(payload.detail || 'Failed to send message');
+          }
+        }
+      }
 
-      // Update current topic if suggested
-      if (data.suggested_topics && data.suggested_topics.length > 0) {
-        setCurrentTopic(data.suggested_topics[0]);
+      if (data) {
+        setMessages((prev) =>
+          prev.map((msg) =>
+            msg.id === botMessageId
+              ? {
+                  ...msg,
+                  text: data.response,
+                  suggested_topics: data.suggested_topics,
+                  learning_resources: data.learning_resources
+                }
+              : msg
+          )
+        );
+
+        // Update current topic if suggested
+        if (data.suggested_topics && data.suggested_topics.length > 0) {
+          setCurrentTopic(data.suggested_topics[0]);
+        }
       }
     } catch (error) {
       // Update the user message status to error
@@ -284,13 +341,25 @@ const Chatbot = () => {
         )
       );
 
-      toast({
-        title: 'Error',
-        description: error.message,
-        status: 'error',
-        duration: 5000,
-        isClosable: true,
-      });
+      if (error.retryAfter !== undefined) {
+        toast({
+          title: 'Daily chat limit reached',
+          description: error.retryAfter
+            ? `${error.message}. You can chat again in ${formatWait(error.retryAfter)}.`
+            : `${error.message}. Please try again later.`,
+          status: 'warning',
+          duration: 9000,
+          isClosable: true,
+        });
+      } else {
+        toast({
+          title: 'Error',
+          description: error.message,
+          status: 'error',
+          duration: 5000,
+          isClosable: true,
+        });
+      }
     } finally {
       setIsLoading(false);
     }
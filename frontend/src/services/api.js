@@ -33,6 +33,18 @@ api.interceptors.response.use(
     }
 );
 
+// Follows next_cursor until every page has been fetched
+const getAllPages = async (url) => {
+    const items = [];
+    let cursor = null;
+    do {
+        const response = await api.get(url, { params: { cursor } });
+        items.push(...response.data.items);
+        cursor = response.data.next_cursor;
+    } while (cursor);
+    return items;
+};
+
 export const getDashboardStats = async () => {
     try {
         const response = await api.get(config.API_ENDPOINTS.DASHBOARD.STATS);
@@ -55,8 +67,7 @@ export const getRecentActivity = async () => {
 
 export const getLearningPaths = async () => {
     try {
-        const response = await api.get(config.API_ENDPOINTS.LEARNING_PATHS.LIST);
-        return response.data;
+        return await getAllPages(config.API_ENDPOINTS.LEARNING_PATHS.LIST);
     } catch (error) {
         console.error('Error fetching learning paths:', error);
         throw error;
@@ -65,8 +76,7 @@ export const getLearningPaths = async () => {
 
 export const getStudyMaterials = async () => {
     try {
-        const response = await api.get(config.API_ENDPOINTS.STUDY_MATERIALS.LIST);
-        return response.data;
+        return await getAllPages(config.API_ENDPOINTS.STUDY_MATERIALS.LIST);
     } catch (error) {
         console.error('Error fetching study materials:', error);
         throw error;
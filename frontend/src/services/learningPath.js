@@ -20,10 +20,17 @@ api.interceptors.request.use(
     }
 );
 
+// Follows next_cursor until every page has been fetched
 export const getLearningPaths = async () => {
   try {
-    const response = await api.get(config.API_ENDPOINTS.LEARNING_PATHS.LIST);
-    return response.data;
+    const paths = [];
+    let cursor = null;
+    do {
+      const response = await api.get(config.API_ENDPOINTS.LEARNING_PATHS.LIST, { params: { cursor } });
+      paths.push(...response.data.items);
+      cursor = response.data.next_cursor;
+    } while (cursor);
+    return paths;
   } catch (error) {
     console.error('Error fetching learning paths:', error);
     if (error.response?.status === 401) {
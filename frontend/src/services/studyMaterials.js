@@ -3,14 +3,22 @@ import config from '../config';
 
 const API_URL = config.API_BASE_URL;
 
-export const getStudyMaterials = async () => {
+// Follows next_cursor until every page has been fetched
+export const getStudyMaterials = async (filters = {}) => {
   try {
-    const response = await axios.get(`${API_URL}/api/study-materials`, {
-      headers: {
-        'Authorization': `Bearer ${localStorage.getItem('token')}`
-      }
-    });
-    return response.data;
+    const materials = [];
+    let cursor = null;
+    do {
+      const response = await axios.get(`${API_URL}/api/study-materials`, {
+        headers: {
+          'Authorization': `Bearer ${localStorage.getItem('token')}`
+        },
+        params: { ...filters, cursor }
+      });
+      materials.push(...response.data.items);
+      cursor = response.data.next_cursor;
+    } while (cursor);
+    return materials;
   } catch (error) {
     console.error('Error fetching study materials:', error);
     throw error;